@@ -0,0 +1,64 @@
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+import torch
+
+from evaluate import discover_pairs
+from models.adapter_training import AdapterTrainer
+from models.registry import registry
+from utils.feature_cache import FeatureCache
+
+
+def main(audio_dir="data/audio", text_dir="data/text", epochs=2, batch_size=8, accumulation_steps=2, limit=None):
+    pairs = discover_pairs(audio_dir, text_dir, "whisper_adapter")[:limit]
+    paths = [audio for audio, _ in pairs]
+    texts = [Path(text).read_text().strip() for _, text in pairs]
+    model, processor, adapter = registry.get("whisper_adapter")
+    initial = {name: value.clone() for name, value in adapter.state_dict().items()}
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        def new_trainer():
+            # Fresh adapter weights and optimizer state for each run
+            adapter.load_state_dict(initial)
+            return AdapterTrainer(model, processor, adapter, cache=FeatureCache(cache_dir), batch_size=batch_size,
+                                  accumulation_steps=accumulation_steps)
+
+        print("\nfull forward pass every step:")
+        full = new_trainer().train(paths, texts, epochs, use_cache=False)
+        print("\ncached frozen-encoder activations:")
+        trainer = new_trainer()
+        cached = trainer.train(paths, texts, epochs, use_cache=True)
+
+        # Same loss either way, up to the float16 activation cache
+        batch = list(range(min(batch_size, len(paths))))
+        activations = trainer.cache_activations([paths[i] for i in batch])
+        labels = trainer._pad_labels(trainer._labels([texts[i] for i in batch]))
+        with torch.no_grad():
+            cached_loss = trainer.loss_from_activations(
+                torch.from_numpy(np.stack(activations).astype(np.float32)), labels).item()
+            full_loss = trainer.loss_from_features(trainer._input_features([paths[i] for i in batch]), labels).item()
+        print(f"first batch loss: full forward {full_loss:.5f}, cached activations {cached_loss:.5f}")
+
+    full_epoch = np.mean([h["seconds"] for h in full])
+    cached_epoch = np.mean([h["seconds"] for h in cached if h["epoch"] > 0])
+    caching = cached[0]["seconds"]
+    print(f"\nmean epoch: full {full_epoch:.2f} s, cached {cached_epoch:.2f} s "
+          f"({cached_epoch / full_epoch:.1%} of full, one-off caching {caching:.2f} s)")
+    print(f"break-even after {caching / max(full_epoch - cached_epoch, 1e-9):.1f} epoch(s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Adapter epoch time with and without cached encoder activations")
+    parser.add_argument("--audio-dir", default="data/audio")
+    parser.add_argument("--text-dir", default="data/text")
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--accumulation-steps", type=int, default=2)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+    main(args.audio_dir, args.text_dir, args.epochs, args.batch_size, args.accumulation_steps, args.limit)
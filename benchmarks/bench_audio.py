@@ -0,0 +1,54 @@
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+import soundfile as sf
+import torch
+import torchaudio
+
+from utils.audio import load_audio
+
+
+def legacy_load(audio_path):
+    """
+    The per-module loader used before utils.audio: float64 decode and a new
+    Resample kernel on every call.
+    """
+    speech, sr = sf.read(audio_path)
+    speech = torch.tensor(speech, dtype=torch.float32)
+    if len(speech.shape) > 1:
+        speech = torch.mean(speech, dim=1)
+    if sr != 16000:
+        speech = torchaudio.transforms.Resample(sr, 16000)(speech)
+    return speech.numpy()
+
+
+def ms_per_minute(loader, path, seconds, repeats):
+    loader(path)  # warm up caches and the OS page cache
+    start = time.perf_counter()
+    for _ in range(repeats):
+        loader(path)
+    return 1000 * (time.perf_counter() - start) / repeats / (seconds / 60)
+
+
+def main(seconds=60, repeats=5):
+    rng = np.random.default_rng(0)
+    print(f"{'format':<16} {'legacy ms/min':>14} {'utils.audio ms/min':>19} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for sr, channels in [(16000, 1), (22050, 1), (44100, 2), (48000, 2)]:
+            path = f"{tmp}/clip_{sr}_{channels}.wav"
+            audio = 0.1 * rng.standard_normal((seconds * sr, channels)).astype(np.float32)
+            sf.write(path, audio, sr, subtype="PCM_16")
+
+            legacy = ms_per_minute(legacy_load, path, seconds, repeats)
+            shared = ms_per_minute(load_audio, path, seconds, repeats)
+            label = f"{sr} Hz x{channels}"
+            print(f"{label:<16} {legacy:>14.1f} {shared:>19.1f} {legacy / shared:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
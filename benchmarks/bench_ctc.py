@@ -0,0 +1,86 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+import torch
+
+from models.ctc import CTCBeamDecoder, CTCDecoder
+from utils.alignment import LETTER_LEXICON, parse_vocab_set
+from utils.metrics import compute_error_rates
+
+FRAMES_PER_SECOND = 50  # 20 ms logit frames, as for wav2vec2-style encoders
+VOCAB_SET_LETTER = "Q B M Z A T H X L C P V G N E R S I U D W O Y F J K"
+
+
+def make_vocab():
+    phones = sorted({p for prons in LETTER_LEXICON.values() for pron in prons for p in pron.split()})
+    return ["<PAD>", "<UNK>"] + phones
+
+
+def simulate(letters, labels, noise, confusion, rng):
+    """
+    Synthetic phone-recognizer output for a read letter sequence: each phoneme
+    peaks for a few frames between blanks, with Gaussian noise and a chance
+    that a frame's peak lands on a wrong phoneme instead.
+    """
+    phonemes = [p for letter in letters for p in LETTER_LEXICON[letter][0].split()]
+    rows = []
+    for phoneme in phonemes:
+        for token in [labels.index(phoneme)] * rng.integers(2, 5) + [0] * rng.integers(1, 4):
+            if token != 0 and rng.random() < confusion:
+                token = rng.integers(2, len(labels))
+            row = noise * rng.standard_normal(len(labels))
+            row[token] += 4.0
+            rows.append(row)
+    return " ".join(phonemes), torch.tensor(np.array(rows), dtype=torch.float32)
+
+
+def run(name, decode, batch, refs, frame_lengths, seconds):
+    start = time.perf_counter()
+    hyps = decode(batch, frame_lengths)
+    elapsed = time.perf_counter() - start
+    per = np.mean(compute_error_rates(zip(refs, hyps), unit="phoneme"))
+    print(f"{name:<28} {per:>6.3f} {1000 * elapsed / seconds:>12.2f}")
+
+
+def main(num_utterances=64, letters_per_utterance=12, noise=0.8, confusion=0.15, beam_widths=(4, 8, 16, 32)):
+    rng = np.random.default_rng(0)
+    labels = make_vocab()
+    bank = parse_vocab_set(VOCAB_SET_LETTER)
+
+    refs, logits = [], []
+    for _ in range(num_utterances):
+        letters = list(rng.choice(bank, letters_per_utterance))
+        ref, utterance_logits = simulate(letters, labels, noise, confusion, rng)
+        refs.append(ref)
+        logits.append(utterance_logits)
+
+    frame_lengths = [len(x) for x in logits]
+    batch = torch.nn.utils.rnn.pad_sequence(logits, batch_first=True)
+    seconds = sum(frame_lengths) / FRAMES_PER_SECOND
+    print(f"{num_utterances} utterances, {seconds:.0f} s of simulated audio, noise={noise}, confusion={confusion}")
+    print(f"{'decoder':<28} {'PER':>6} {'ms/s audio':>12}")
+
+    greedy = CTCDecoder(labels, 0, skip_tokens={"<PAD>", "<UNK>"})
+    run("greedy", greedy.decode_text, batch, refs, frame_lengths, seconds)
+
+    for beam_width in beam_widths:
+        for mode, constrain, use_bank in [("beam", False, False), ("beam+bank bias", False, True),
+                                          ("beam+bank constrained", True, True)]:
+            decoder = CTCBeamDecoder.from_decoder(greedy, beam_width=beam_width, constrain=constrain)
+            trie = decoder.lexicon_trie(bank, LETTER_LEXICON) if use_bank else None
+            run(f"{mode} (w={beam_width})", lambda b, n: decoder.decode_text(b, n, trie), batch, refs,
+                frame_lengths, seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CTC decoding accuracy vs decode time on simulated phone posteriors")
+    parser.add_argument("--utterances", type=int, default=64)
+    parser.add_argument("--noise", type=float, default=0.8)
+    parser.add_argument("--confusion", type=float, default=0.15)
+    args = parser.parse_args()
+    main(args.utterances, noise=args.noise, confusion=args.confusion)
@@ -0,0 +1,64 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ensemble import Ensemble
+from models.registry import WAVEFORM_BACKENDS, get_transcribe_function
+
+
+def main(backends=("hubert", "wav2vec2", "huper", "whisper"), audio_dir="data/audio", limit=None, threads=None):
+    paths = [str(path) for path in sorted(Path(audio_dir).glob("*.wav"))][:limit]
+    if not paths:
+        print(f"no .wav files in {audio_dir}")
+        return
+
+    with Ensemble(backends, threads) as ensemble:
+        ensemble.load()
+        ensemble.transcribe(paths[0])  # warm-up
+
+        # One backend after another, each decoding the file itself
+        sequential = {name: 0.0 for name in backends}
+        expected = []
+        start = time.perf_counter()
+        for path in paths:
+            outputs = {}
+            for name in backends:
+                backend_start = time.perf_counter()
+                outputs[name] = get_transcribe_function(name)(path)
+                sequential[name] += time.perf_counter() - backend_start
+            expected.append(outputs)
+        sequential_seconds = time.perf_counter() - start
+
+        # One decode per clip, backends concurrently
+        concurrent = {name: 0.0 for name in backends}
+        decode_seconds, mismatches = 0.0, 0
+        start = time.perf_counter()
+        for path, outputs in zip(paths, expected):
+            result = ensemble.transcribe(path)
+            decode_seconds += result["decode_seconds"]
+            for name, backend in result["backends"].items():
+                concurrent[name] += backend["seconds"]
+                mismatches += backend["transcription"] != outputs[name]
+        ensemble_seconds = time.perf_counter() - start
+
+    print(f"{len(paths)} clips, threads per backend: {ensemble.threads}")
+    print(f"{'backend':<16} {'sequential s':>13} {'ensemble s':>11}")
+    for name in backends:
+        print(f"{name:<16} {sequential[name]:>13.2f} {concurrent[name]:>11.2f}")
+    print(f"{'total wall':<16} {sequential_seconds:>13.2f} {ensemble_seconds:>11.2f} "
+          f"({sequential_seconds / ensemble_seconds:.2f}x, shared decode {decode_seconds:.2f} s)")
+    print(f"transcriptions differing from the sequential run: {mismatches}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ensemble wall time against running each backend on its own")
+    parser.add_argument("--backends", nargs="+", default=["hubert", "wav2vec2", "huper", "whisper"],
+                        choices=sorted(WAVEFORM_BACKENDS))
+    parser.add_argument("--audio-dir", default="data/audio")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads per backend in the ensemble")
+    args = parser.parse_args()
+    main(args.backends, args.audio_dir, args.limit, args.threads)
@@ -0,0 +1,77 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+import torch
+
+from benchmarks.bench_ctc import FRAMES_PER_SECOND, VOCAB_SET_LETTER, make_vocab, simulate
+from models.ctc import CTCForcedAligner
+from utils.alignment import parse_vocab_set
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def starts(phones):
+    return [round(phone.start * FRAMES_PER_SECOND) for phone in phones]
+
+
+def main(lengths=(10, 50, 200), batch_size=8, bands=(None, 100, 20), noise=0.8, confusion=0.15):
+    rng = np.random.default_rng(0)
+    labels = make_vocab()
+    bank = parse_vocab_set(VOCAB_SET_LETTER)
+
+    print(f"{'letters':>7} {'band':>5} {'ms/audio s':>11} {'batched':>9} {'pointers MB':>12} {'same path':>10}")
+    for num_letters in lengths:
+        refs, clips = [], []
+        for _ in range(batch_size):
+            ref, logits = simulate(list(rng.choice(bank, num_letters)), labels, noise, confusion, rng)
+            refs.append(ref.split())
+            clips.append(logits)
+        frame_lengths = [len(clip) for clip in clips]
+        batch = torch.nn.utils.rnn.pad_sequence(clips, batch_first=True)
+        seconds = sum(frame_lengths) / FRAMES_PER_SECOND
+
+        exact = None
+        for band in bands:
+            aligner = CTCForcedAligner(labels, 0, skip_tokens={"<PAD>", "<UNK>"}, band=band)
+            one_by_one, sequential = timed(lambda: [aligner.align(clip[None], [ref])[0]
+                                                    for clip, ref in zip(clips, refs)])
+            together, batched = timed(lambda: aligner.align(batch, refs, frame_lengths))
+            assert [starts(a) for a in one_by_one] == [starts(a) for a in together]
+
+            states = 2 * max(len(ref) for ref in refs) + 1
+            width = states if band is None else min(states, 2 * band + 1)
+            pointer_mb = len(refs) * max(frame_lengths) * width / 2 ** 20
+            exact = exact or [starts(a) for a in together]
+            same = np.mean([starts(a) == e for a, e in zip(together, exact)])
+            print(f"{num_letters:>7} {str(band):>5} {1000 * sequential / seconds:>11.2f} "
+                  f"{1000 * batched / seconds:>9.2f} {pointer_mb:>12.2f} {same:>10.0%}")
+
+    try:
+        import torchaudio.functional as F
+    except ImportError:
+        return
+    clip, ref = clips[0], refs[0]
+    aligner = CTCForcedAligner(labels, 0, skip_tokens={"<PAD>", "<UNK>"}, band=None)
+    targets = torch.tensor([aligner.token_ids(ref)])
+    path, _ = F.forced_align(torch.log_softmax(clip, -1)[None], targets, blank=0)
+    reference_starts = [span.start for span in F.merge_tokens(path[0], torch.zeros(len(clip)))]
+    print(f"\nunbanded path equals torchaudio.functional.forced_align: "
+          f"{reference_starts == starts(aligner.align(clip[None], [ref])[0])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CTC forced alignment: time, memory and banding on synthetic logits")
+    parser.add_argument("--lengths", nargs="+", type=int, default=[10, 50, 200], help="Letters read per clip")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--bands", nargs="+", default=["none", "100", "20"], help="Band half-widths ('none': unbanded)")
+    args = parser.parse_args()
+    main(args.lengths, args.batch_size, [None if band == "none" else int(band) for band in args.bands])
@@ -0,0 +1,122 @@
+import argparse
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from evaluate import PHONEME_BACKENDS, discover_pairs, score
+from models.inference import INFERENCE_MODES, MODE_ENV
+from utils.metrics import compute_per, compute_wer
+
+
+def run_mode(backend, mode, audio_paths, repeats):
+    """
+    Loads one backend in one inference mode and transcribes every clip.
+    Runs in a fresh process, so peak memory and one-off costs (tracing,
+    export, compilation) belong to this mode alone.
+    """
+    os.environ[MODE_ENV] = f"{backend}={mode}"
+    from models.registry import get_transcribe_function, registry
+
+    try:
+        start = time.perf_counter()
+        registry.get(backend)
+        load_seconds = time.perf_counter() - start
+
+        transcribe = get_transcribe_function(backend)
+        start = time.perf_counter()
+        transcribe(audio_paths[0])  # first call: lazy compilation happens here
+        first_seconds = time.perf_counter() - start
+
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        for _ in range(repeats):
+            transcriptions = [transcribe(path) for path in audio_paths]
+        cpu_seconds = (time.process_time() - cpu_start) / repeats
+        wall_seconds = (time.perf_counter() - wall_start) / repeats
+    except Exception as exc:
+        return {"error": f"{type(exc).__name__}: {exc}"}
+
+    return {
+        "load_seconds": load_seconds,
+        "first_seconds": first_seconds,
+        "cpu_seconds": cpu_seconds,
+        "wall_seconds": wall_seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "transcriptions": transcriptions,
+    }
+
+
+def error_rate(backend, references, hypotheses):
+    metric = "per" if backend in PHONEME_BACKENDS else "wer"
+    rates = [score(backend, ref, hyp).get(metric) for ref, hyp in zip(references, hypotheses)]
+    rates = [rate for rate in rates if rate is not None]
+    return metric, sum(rates) / len(rates) if rates else float("nan")
+
+
+def drift(backend, baseline, hypotheses):
+    """
+    Mean WER/PER of a mode's transcriptions against the fp32 ones.
+    """
+    compute = compute_per if backend in PHONEME_BACKENDS else compute_wer
+    rates = [compute(base, hyp) for base, hyp in zip(baseline, hypotheses) if base.split()]
+    return sum(rates) / len(rates) if rates else 0.0
+
+
+def main(backends=("hubert", "wav2vec2", "huper", "whisper"), modes=INFERENCE_MODES, audio_dir="data/audio",
+         text_dir="data/text", limit=None, repeats=1, tolerance=0.01):
+    from utils.audio import duration_seconds
+
+    for backend in backends:
+        pairs = discover_pairs(audio_dir, text_dir, backend)[:limit]
+        if not pairs:
+            print(f"{backend}: no clips with references in {audio_dir} / {text_dir}")
+            continue
+        audio_paths = [audio for audio, _ in pairs]
+        references = [Path(ref).read_text().strip() for _, ref in pairs]
+        audio_seconds = sum(duration_seconds(path) for path in audio_paths)
+
+        results = {}
+        for mode in ("fp32",) + tuple(m for m in modes if m != "fp32"):
+            with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+                results[mode] = pool.submit(run_mode, backend, mode, audio_paths, repeats).result()
+
+        baseline = results["fp32"].get("transcriptions")
+        print(f"\n{backend}: {len(pairs)} clips, {audio_seconds:.1f} s of audio")
+        print(f"{'mode':<12} {'load s':>7} {'first s':>8} {'CPU s/audio s':>14} {'wall s/audio s':>15} "
+              f"{'peak MB':>8} {'error':>7} {'vs fp32':>8}")
+        candidates = []
+        for mode, result in results.items():
+            if "error" in result:
+                print(f"{mode:<12} {result['error']}")
+                continue
+            metric, rate = error_rate(backend, references, result["transcriptions"])
+            changed = drift(backend, baseline, result["transcriptions"]) if baseline else float("nan")
+            cpu_rtf = result["cpu_seconds"] / audio_seconds
+            print(f"{mode:<12} {result['load_seconds']:>7.2f} {result['first_seconds']:>8.2f} {cpu_rtf:>14.3f} "
+                  f"{result['wall_seconds'] / audio_seconds:>15.3f} {result['peak_rss_mb']:>8.0f} "
+                  f"{metric}={rate:.3f} {changed:>8.3f}")
+            candidates.append((mode, rate, cpu_rtf))
+
+        # Cheapest mode whose error rate stays within tolerance of fp32
+        fp32_rate = next((rate for mode, rate, _ in candidates if mode == "fp32"), None)
+        if fp32_rate is not None:
+            acceptable = [(cpu, mode) for mode, rate, cpu in candidates if rate <= fp32_rate + tolerance]
+            print(f"best within {tolerance:.3f} of fp32: {min(acceptable)[1]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency, memory and accuracy drift of each inference mode")
+    parser.add_argument("--backends", nargs="+", default=["hubert", "wav2vec2", "huper", "whisper"])
+    parser.add_argument("--modes", nargs="+", default=list(INFERENCE_MODES), choices=INFERENCE_MODES)
+    parser.add_argument("--audio-dir", default="data/audio")
+    parser.add_argument("--text-dir", default="data/text")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Allowed error-rate increase over fp32")
+    args = parser.parse_args()
+    main(args.backends, args.modes, args.audio_dir, args.text_dir, args.limit, args.repeats, args.tolerance)
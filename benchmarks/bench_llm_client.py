@@ -0,0 +1,59 @@
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from llm_client import AsyncLLMClient
+from main import align_many, get_LLM_messages
+from mock_llm_server import serve
+
+VOCAB_SET_LETTER = "Q B M Z A T H X L C P V G N E R S I U D W O Y F J K"
+
+
+def make_items(num_students):
+    """
+    One letter-task item per student, each with a distinct prediction.
+    """
+    ground_truth = "K Y UW B IY EH M Z IY EY"
+    return [("letter", VOCAB_SET_LETTER, ground_truth, f"K Y UW B IY EH N Z IY EY {i}") for i in range(num_students)]
+
+
+def main(num_students=40, latency=0.5, rate_limit_rate=0.05, error_rate=0.05, max_concurrency=16):
+    server, base_url = serve(latency=latency, rate_limit_rate=rate_limit_rate, error_rate=error_rate)
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    items = make_items(num_students)
+    print(f"{num_students} students, mock latency {latency}s, "
+          f"{rate_limit_rate:.0%} rate-limited, {error_rate:.0%} server errors")
+
+    # Sequential baseline: what chat_completion in main.py does, one request at a time
+    client = AsyncLLMClient(max_concurrency=1, base_url=base_url, backoff_base=0.1)
+    start = time.perf_counter()
+    sequential = [align_many([item], client)[0] for item in items]
+    sequential_seconds = time.perf_counter() - start
+    print(f"sequential:          {sequential_seconds:6.2f} s  {client.stats()}")
+
+    client = AsyncLLMClient(max_concurrency=max_concurrency, requests_per_minute=6000, base_url=base_url,
+                            backoff_base=0.1)
+    start = time.perf_counter()
+    replies = align_many(items, client)
+    concurrent_seconds = time.perf_counter() - start
+    print(f"align_many (x{max_concurrency}):   {concurrent_seconds:6.2f} s  {client.stats()}")
+
+    # The mock echoes the end of each prompt, so replies must line up with their items
+    in_order = all(reply.endswith(get_LLM_messages(*item)[-1]["content"][-80:]) for reply, item in zip(replies, items))
+    print(f"replies in input order: {in_order}, same as sequential: {replies == sequential}")
+    print(f"speedup: {sequential_seconds / concurrent_seconds:.1f}x")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sequential vs concurrent LLM alignment against a local mock API")
+    parser.add_argument("--students", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    main(args.students, args.latency, max_concurrency=args.concurrency)
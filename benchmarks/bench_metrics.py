@@ -0,0 +1,93 @@
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.metrics import compute_cer, compute_error_rates, compute_per, compute_wer
+
+
+def legacy_distance(ref, hyp):
+    """
+    The original full-matrix DP, kept here as the reference implementation.
+    """
+    dp = [[0] * (len(hyp) + 1) for _ in range(len(ref) + 1)]
+    for i in range(len(ref) + 1):
+        dp[i][0] = i
+    for j in range(len(hyp) + 1):
+        dp[0][j] = j
+    for i in range(1, len(ref) + 1):
+        for j in range(1, len(hyp) + 1):
+            if ref[i - 1] == hyp[j - 1]:
+                dp[i][j] = dp[i - 1][j - 1]
+            else:
+                dp[i][j] = min(dp[i - 1][j - 1], dp[i][j - 1], dp[i - 1][j]) + 1
+    return dp[len(ref)][len(hyp)]
+
+
+VOCAB = ["the", "bear", "grizzly", "ran", "up", "hill", "to", "eat", "fish", "in", "river", "big", "brown"]
+
+
+def make_passage(num_words, rng):
+    return " ".join(rng.choice(VOCAB) for _ in range(num_words))
+
+
+def corrupt(passage, error_rate, rng):
+    """
+    Simulates a child's reading: random substitutions, deletions and insertions.
+    """
+    words = []
+    for word in passage.split():
+        r = rng.random()
+        if r < error_rate / 3:
+            words.append(rng.choice(VOCAB))
+        elif r < 2 * error_rate / 3:
+            continue
+        elif r < error_rate:
+            words.extend([word, rng.choice(VOCAB)])
+        else:
+            words.append(word)
+    return " ".join(words)
+
+
+def check_identical(rng, trials=200):
+    for _ in range(trials):
+        ref = make_passage(rng.randint(1, 40), rng)
+        hyp = corrupt(ref, 0.3, rng)
+        assert compute_wer(ref, hyp) == legacy_distance(ref.split(), hyp.split()) / len(ref.split())
+        assert compute_cer(ref, hyp) == legacy_distance(list(ref), list(hyp)) / len(ref)
+        assert compute_per(ref, hyp) == compute_wer(ref, hyp)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    rng = random.Random(0)
+    check_identical(rng)
+    print("Results identical to the full-matrix DP.\n")
+
+    print(f"{'words':>6} {'legacy ms/pair':>15} {'engine ms/pair':>15} {'batch ms/pair':>14} {'speedup':>8}")
+    for num_words in (100, 300, 1000):
+        reference = make_passage(num_words, rng)
+        hypotheses = [corrupt(reference, 0.2, rng) for _ in range(50)]
+        pairs = [(reference, hyp) for hyp in hypotheses]
+        # The legacy DP is quadratic in pure Python; two pairs are enough to time it
+        legacy_pairs = pairs[:2]
+
+        _, legacy_time = timed(lambda: [legacy_distance(list(r), list(h)) / len(r) for r, h in legacy_pairs])
+        _, engine_time = timed(lambda: [compute_cer(r, h) for r, h in pairs])
+        _, batch_time = timed(lambda: compute_error_rates(pairs, unit="char"))
+
+        legacy_ms = 1000 * legacy_time / len(legacy_pairs)
+        engine_ms = 1000 * engine_time / len(pairs)
+        batch_ms = 1000 * batch_time / len(pairs)
+        print(f"{num_words:>6} {legacy_ms:>15.2f} {engine_ms:>15.3f} {batch_ms:>14.3f} {legacy_ms / batch_ms:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import argparse
+import importlib
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models.registry import BACKENDS, get_transcribe_function, registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time, cold and warm transcription latency per backend.")
+    parser.add_argument("--audio", default="data/audio/multitudes_WRE_grizzlybear_short.wav")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS))
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = []
+    for name in args.backends:
+        start = time.perf_counter()
+        importlib.import_module(BACKENDS[name][0])
+        import_seconds = time.perf_counter() - start
+
+        transcribe = get_transcribe_function(name)
+
+        start = time.perf_counter()
+        transcribe(args.audio)
+        cold_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            transcribe(args.audio)
+        warm_seconds = (time.perf_counter() - start) / args.repeats
+
+        rows.append((name, import_seconds, registry.stats()[name]["load_seconds"], cold_seconds, warm_seconds))
+
+    print(f"\n{'backend':<16} {'import (s)':>10} {'load (s)':>9} {'cold call (s)':>14} {'warm call (s)':>14}")
+    for name, import_seconds, load_seconds, cold_seconds, warm_seconds in rows:
+        print(f"{name:<16} {import_seconds:>10.2f} {load_seconds:>9.2f} {cold_seconds:>14.2f} {warm_seconds:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
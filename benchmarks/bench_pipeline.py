@@ -0,0 +1,76 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from evaluate import discover_pairs
+from pipeline import STAGES, get_connection, run_worker, stage_stats, start_workers, submit
+
+
+def parse_workers(spec):
+    """
+    "transcribe=2,align=4" -> {"transcribe": 2, "score": 1, "align": 4}
+    """
+    counts = dict.fromkeys(STAGES, 1)
+    for part in filter(None, spec.split(",")):
+        stage, count = part.split("=")
+        counts[stage] = int(count)
+    return counts
+
+
+def main(backend="huper", audio_dir="data/audio", text_dir="data/text", task=None, vocab_set=None,
+         workers="", redis_url=None, fake=False, limit=None, lexicon=None):
+    connection = get_connection(redis_url, fake=fake)
+    counts = parse_workers(workers)
+    pairs = discover_pairs(audio_dir, text_dir, backend)[:limit]
+
+    start = time.perf_counter()
+    for audio_path, reference_path in pairs:
+        submit(connection, audio_path, backend, Path(reference_path).read_text().strip(), task, vocab_set,
+               lexicon=lexicon)
+    submit_seconds = time.perf_counter() - start
+    # Resubmitting must not enqueue anything new
+    repeated = sum(len(submit(connection, audio, backend, Path(ref).read_text().strip(), task, vocab_set,
+                              lexicon=lexicon)["enqueued"])
+                   for audio, ref in pairs)
+    print(f"{len(pairs)} clips submitted in {submit_seconds:.2f} s; resubmitting enqueued {repeated} new jobs")
+
+    # Drain one stage at a time so each stage's throughput is measured on its own
+    for stage in STAGES:
+        start = time.perf_counter()
+        if fake:
+            run_worker((stage,), connection, burst=True, logging_level="WARNING")  # fakeredis lives in this process: one worker
+        else:
+            start_workers(stage, counts[stage], redis_url, burst=True, logging_level="WARNING")
+        print(f"{stage:<10} drained in {time.perf_counter() - start:6.2f} s "
+              f"({1 if fake else counts[stage]} worker(s))")
+
+    print(f"{'stage':<10} {'finished':>8} {'failed':>6} {'mean s':>8} {'jobs/s':>8}")
+    for stage, stats in stage_stats(connection).items():
+        rate = stats.get("jobs_per_second")
+        print(f"{stage:<10} {stats['finished']:>8} {stats['failed']:>6} {stats.get('mean_seconds', 0):>8.3f} "
+              f"{rate if rate is not None else float('nan'):>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage throughput of the Redis/RQ pipeline")
+    parser.add_argument("--backend", default="huper")
+    parser.add_argument("--audio-dir", default="data/audio")
+    parser.add_argument("--text-dir", default="data/text")
+    parser.add_argument("--task", choices=["word", "letter"], default=None)
+    parser.add_argument("--vocab-set", default=None)
+    parser.add_argument("--lexicon", default=None, help="JSON file {word: pronunciation(s)} (word task)")
+    parser.add_argument("--workers", default="", help='Workers per stage, e.g. "transcribe=2,align=4"')
+    parser.add_argument("--redis-url", default=None)
+    parser.add_argument("--fake", action="store_true", help="Use an in-process fakeredis server")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+    lexicon = None
+    if args.lexicon:
+        with open(args.lexicon) as f:
+            lexicon = json.load(f)
+    main(args.backend, args.audio_dir, args.text_dir, args.task, args.vocab_set, args.workers, args.redis_url,
+         args.fake, args.limit, lexicon)
@@ -0,0 +1,71 @@
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from prompts import PROMPT_STYLES, build_prompts, count_tokens
+from utils.alignment import LETTER_LEXICON
+
+VOCAB_SET_LETTER = "Q B M Z A T H X L C P V G N E R S I U D W O Y F J K"
+
+
+def make_reading(num_letters, error_rate, rng):
+    """
+    A letter-naming reading: reference phonemes and a prediction with dropped phonemes.
+    """
+    letters = [rng.choice(list(LETTER_LEXICON)) for _ in range(num_letters)]
+    ref = [p for letter in letters for p in LETTER_LEXICON[letter][0].split()]
+    hyp = [p for p in ref if rng.random() > error_rate]
+    return " ".join(ref), " ".join(hyp)
+
+
+def time_llm(prompts, repeats):
+    """
+    Seconds per request against the configured API (OPENAI_API_KEY / OPENAI_BASE_URL),
+    bypassing the response cache so every call reaches the server.
+    """
+    from llm_cache import set_default_cache
+    from main import SYSTEM_MESSAGE, chat_completion
+
+    set_default_cache(None)
+    latencies = []
+    for _ in range(repeats):
+        for prompt in prompts:
+            start = time.perf_counter()
+            chat_completion([{"role": "system", "content": SYSTEM_MESSAGE}, {"role": "user", "content": prompt}])
+            latencies.append(time.perf_counter() - start)
+    return sum(latencies) / len(latencies)
+
+
+def main(lengths=(26, 104, 260), max_tokens=1000, live=False, repeats=3):
+    rng = random.Random(0)
+    print(f"token budget for split prompts: {max_tokens}")
+    header = f"{'letters':>7} {'style':<8} {'tokens':>7} {'build ms':>9} {'split':>6} {'max split tokens':>17}"
+    print(header + (f" {'LLM s/request':>14}" if live else ""))
+
+    for num_letters in lengths:
+        ref, hyp = make_reading(num_letters, 0.1, rng)
+        for style in PROMPT_STYLES:
+            start = time.perf_counter()
+            (prompt,) = build_prompts("letter", VOCAB_SET_LETTER, ref, hyp, style)
+            build_ms = 1000 * (time.perf_counter() - start)
+            split = build_prompts("letter", VOCAB_SET_LETTER, ref, hyp, style, max_tokens=max_tokens)
+
+            line = (f"{num_letters:>7} {style:<8} {count_tokens(prompt):>7} {build_ms:>9.2f} {len(split):>6} "
+                    f"{max(count_tokens(p) for p in split):>17}")
+            if live:
+                line += f" {time_llm([prompt], repeats):>14.2f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prompt size and latency for each prompt style")
+    parser.add_argument("--max-tokens", type=int, default=1000)
+    parser.add_argument("--live", action="store_true",
+                        help="Also time requests against the API (or a mock via OPENAI_BASE_URL)")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    main(max_tokens=args.max_tokens, live=args.live, repeats=args.repeats)
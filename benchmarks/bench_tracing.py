@@ -0,0 +1,67 @@
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils import tracing
+from utils.metrics import compute_wer
+
+
+def per_call(function, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls
+
+
+def empty_span():
+    with tracing.span("bench", audio_seconds=1.0):
+        pass
+
+
+def main(calls=200000, audio=None, backend="hubert"):
+    tracing.disable()
+    baseline = per_call(lambda: None, calls)
+    disabled = per_call(empty_span, calls)
+    with tempfile.NamedTemporaryFile(suffix=".jsonl") as f:
+        tracing.enable()
+        in_memory = per_call(empty_span, calls // 10)
+        tracing.enable(f.name)
+        to_file = per_call(empty_span, calls // 10)
+        tracing.disable()
+    print(f"empty span, tracing off:       {(disabled - baseline) * 1e9:8.0f} ns per span")
+    print(f"empty span, in memory:         {(in_memory - baseline) * 1e9:8.0f} ns per span")
+    print(f"empty span, JSON lines file:   {(to_file - baseline) * 1e9:8.0f} ns per span")
+
+    reference = "the quick brown fox jumps over the lazy dog " * 20
+    hypothesis = reference.replace("fox", "box")
+    off = per_call(lambda: compute_wer(reference, hypothesis), calls // 20)
+    tracing.enable()
+    on = per_call(lambda: compute_wer(reference, hypothesis), calls // 20)
+    tracing.disable()
+    print(f"compute_wer (180 words):       off {off * 1e6:.1f} us, on {on * 1e6:.1f} us")
+
+    if audio:
+        from models.registry import get_transcribe_function, registry
+
+        registry.get(backend)
+        transcribe = get_transcribe_function(backend)
+        transcribe(audio)
+        off = per_call(lambda: transcribe(audio), 5)
+        tracer = tracing.enable()
+        on = per_call(lambda: transcribe(audio), 5)
+        tracing.disable()
+        print(f"{backend} transcription:         off {off * 1e3:.1f} ms, on {on * 1e3:.1f} ms")
+        print(tracing.format_summary(tracer.summary()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cost of tracing spans when off, in memory and written to a file")
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--audio", default=None, help="Also time a transcription with tracing off and on")
+    parser.add_argument("--backend", default="hubert")
+    args = parser.parse_args()
+    main(args.calls, args.audio, args.backend)
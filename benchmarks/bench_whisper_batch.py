@@ -0,0 +1,39 @@
+import argparse
+import glob
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models import whisper_model, whisper_model_with_adapter
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whisper latency and real-time factor per batch size.")
+    parser.add_argument("--audio", nargs="+", default=sorted(glob.glob("data/audio/*.wav")))
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--num-beams", type=int, default=1)
+    parser.add_argument("--max-new-tokens", type=int, default=None)
+    parser.add_argument("--adapter", action="store_true", help="Benchmark Whisper + adapter")
+    args = parser.parse_args()
+
+    module = whisper_model_with_adapter if args.adapter else whisper_model
+    # Warm up so model loading is not counted in the first batch size
+    module.transcribe_batch(args.audio[:1])
+
+    print(f"{'batch size':>10} {'batches':>8} {'mean latency (s)':>17} {'RTF':>7}")
+    for batch_size in args.batch_sizes:
+        _, stats = module.transcribe_batch(
+            args.audio,
+            batch_size=batch_size,
+            num_beams=args.num_beams,
+            max_new_tokens=args.max_new_tokens,
+            return_stats=True,
+        )
+        latency = sum(s["latency_seconds"] for s in stats)
+        audio_seconds = sum(s["audio_seconds"] for s in stats)
+        print(f"{batch_size:>10} {len(stats):>8} {latency / len(stats):>17.2f} {latency / audio_seconds:>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import json
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+def post_audio(url, audio):
+    request = urllib.request.Request(url, data=audio, headers={"Content-Type": "audio/wav"}, method="POST")
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=300) as response:
+        json.loads(response.read())
+    return time.perf_counter() - start
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_level(url, audio, concurrency, requests_per_client):
+    """
+    concurrency clients, each sending requests_per_client requests back to back.
+    """
+    total = concurrency * requests_per_client
+    with ThreadPoolExecutor(concurrency) as pool:
+        start = time.perf_counter()
+        latencies = list(pool.map(lambda _: post_audio(url, audio), range(total)))
+        elapsed = time.perf_counter() - start
+    return latencies, total / elapsed
+
+
+def main(server="http://127.0.0.1:8000", backend="hubert", audio_path="data/audio/word.wav",
+         levels=(1, 4, 16, 32), requests_per_client=4):
+    audio = Path(audio_path).read_bytes()
+    url = f"{server}/transcribe/{backend}"
+    post_audio(url, audio)  # warm-up: model load and first-call overheads
+
+    print(f"{backend} at {server}, {audio_path}")
+    print(f"{'clients':>7} {'requests':>8} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'req/s':>7}")
+    for concurrency in levels:
+        latencies, throughput = run_level(url, audio, concurrency, requests_per_client)
+        print(f"{concurrency:>7} {len(latencies):>8} {1000 * percentile(latencies, 0.5):>8.0f} "
+              f"{1000 * percentile(latencies, 0.95):>8.0f} {1000 * statistics.mean(latencies):>8.0f} "
+              f"{throughput:>7.2f}")
+
+    with urllib.request.urlopen(f"{server}/health") as response:
+        print(json.loads(response.read())["batchers"].get(backend))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency and throughput of server.py under concurrent clients")
+    parser.add_argument("--server", default="http://127.0.0.1:8000")
+    parser.add_argument("--backend", default="hubert")
+    parser.add_argument("--audio", default="data/audio/word.wav")
+    parser.add_argument("--levels", default="1,4,16,32", help="Comma-separated client counts")
+    parser.add_argument("--requests-per-client", type=int, default=4)
+    args = parser.parse_args()
+    main(args.server, args.backend, args.audio, [int(n) for n in args.levels.split(",")], args.requests_per_client)
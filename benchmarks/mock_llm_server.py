@@ -0,0 +1,97 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockChatHandler(BaseHTTPRequestHandler):
+    """
+    Minimal stand-in for the OpenAI chat completions endpoint. Replies after
+    a fixed latency and fails a configurable share of requests with 429 (with
+    Retry-After) or 500, so clients can be exercised without an API key.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        with server.lock:
+            server.requests += 1
+        time.sleep(server.latency)
+
+        roll = server.rng.random()
+        if roll < server.rate_limit_rate:
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                            {"Retry-After": str(server.retry_after)})
+            return
+        if roll < server.rate_limit_rate + server.error_rate:
+            self._send_json(500, {"error": {"message": "Internal server error"}})
+            return
+
+        # Echo the end of the prompt so callers can check replies come back in order
+        content = request["messages"][-1]["content"]
+        reply = f"MOCK REPLY: {content[-80:]}"
+        self._send_json(200, {
+            "id": f"chatcmpl-mock-{server.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(content) // 4, "completion_tokens": len(reply) // 4,
+                      "total_tokens": (len(content) + len(reply)) // 4},
+        })
+
+
+def serve(port=0, latency=0.5, rate_limit_rate=0.0, error_rate=0.0, retry_after=0.2, seed=0):
+    """
+    Starts the mock server on a background thread.
+
+    Returns:
+        (server, base_url): call server.shutdown() when done; pass base_url
+        to AsyncLLMClient or set it as OPENAI_BASE_URL.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockChatHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.rate_limit_rate = rate_limit_rate
+    server.error_rate = error_rate
+    server.retry_after = retry_after
+    server.rng = random.Random(seed)
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of the OpenAI chat completions API")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, base_url = serve(args.port, args.latency, args.rate_limit_rate, args.error_rate)
+    print(f"Mock API at {base_url} (export OPENAI_BASE_URL={base_url} OPENAI_API_KEY=mock)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
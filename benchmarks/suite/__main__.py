@@ -0,0 +1,105 @@
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from benchmarks.suite import results as result_files
+from benchmarks.suite.runners import bench_alignment, bench_backend, bench_metrics, offline_environment
+from benchmarks.suite.workloads import write_synthetic_clips
+
+SUITES = ("metrics", "alignment", "backends")
+DEFAULT_BACKENDS = ["hubert", "wav2vec2", "huper", "whisper"]
+
+
+def run(args) -> dict:
+    if not args.online:
+        offline_environment()
+    from evaluate import discover_pairs
+
+    config = {key: value for key, value in vars(args).items() if key not in ("command", "func")}
+    output = {"meta": {**result_files.environment(), "config": config}, "results": {}}
+    results = output["results"]
+
+    if "metrics" in args.suites:
+        print("metrics...")
+        results["metrics"] = bench_metrics(args.metric_lengths, repeats=args.repeats, seed=args.seed)
+    if "alignment" in args.suites:
+        print("alignment...")
+        results["alignment"] = bench_alignment(args.alignment_lengths, repeats=args.repeats, seed=args.seed)
+    if "backends" in args.suites:
+        results["backends"] = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            synthetic = write_synthetic_clips(tmp, args.synthetic_seconds, seed=args.seed)
+            for backend in args.backends:
+                samples = discover_pairs(args.audio_dir, args.text_dir, backend)[:args.limit]
+                clips = synthetic + [audio for audio, _ in samples]
+                print(f"{backend}: {len(synthetic)} synthetic + {len(samples)} sample clip(s)...")
+                results["backends"][backend] = bench_backend(backend, clips, samples, args.batch_sizes,
+                                                             args.repeats, args.threads, args.seed)
+                if "error" in results["backends"][backend]:
+                    print(f"  {results['backends'][backend]['error']}")
+
+    result_files.save(output, args.output)
+    print(f"Saved results to {args.output}")
+    if args.baseline:
+        return check(result_files.load(args.baseline), output, args.tolerance, args.accuracy_tolerance,
+                     args.min_delta_ms)
+    return output
+
+
+def check(baseline, current, tolerance, accuracy_tolerance, min_delta_ms) -> dict:
+    rows = result_files.compare(baseline, current, tolerance, accuracy_tolerance, min_delta_ms)
+    print(result_files.format_comparison(rows))
+    regressions = [row for row in rows if row["regression"]]
+    print(f"\n{len(regressions)} regression(s) in {len(rows)} compared measurement(s)")
+    if regressions:
+        sys.exit(1)
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite",
+                                     description="Reproducible benchmarks of the metrics, alignment and backends.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks and save the results as JSON")
+    run_parser.add_argument("--suites", nargs="+", default=list(SUITES), choices=SUITES)
+    run_parser.add_argument("--backends", nargs="+", default=DEFAULT_BACKENDS)
+    run_parser.add_argument("--audio-dir", default="data/audio", help="Sample clips (with references: accuracy)")
+    run_parser.add_argument("--text-dir", default="data/text")
+    run_parser.add_argument("--limit", type=int, default=None, help="Sample clips per backend")
+    run_parser.add_argument("--synthetic-seconds", nargs="+", type=float, default=[2.0, 5.0, 10.0],
+                            help="Durations of the synthetic clips")
+    run_parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 2, 4, 8])
+    run_parser.add_argument("--metric-lengths", nargs="+", type=int, default=[10, 100, 1000])
+    run_parser.add_argument("--alignment-lengths", nargs="+", type=int, default=[5, 20, 80])
+    run_parser.add_argument("--repeats", type=int, default=3, help="Timed repeats per measurement (median)")
+    run_parser.add_argument("--threads", type=int, default=None, help="Torch threads per backend process")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--online", action="store_true", help="Allow model downloads (default: local cache only)")
+    run_parser.add_argument("--output", default="benchmarks/results/latest.json")
+    run_parser.add_argument("--baseline", default=None, help="Compare against this result file afterwards")
+    run_parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative slowdown")
+    run_parser.add_argument("--accuracy-tolerance", type=float, default=0.01, help="Allowed WER/PER increase")
+    run_parser.add_argument("--min-delta-ms", type=float, default=0.1, help="Ignore smaller timing changes")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="Flag regressions of a result file against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative slowdown")
+    compare_parser.add_argument("--accuracy-tolerance", type=float, default=0.01, help="Allowed WER/PER increase")
+    compare_parser.add_argument("--min-delta-ms", type=float, default=0.1, help="Ignore smaller timing changes")
+    compare_parser.set_defaults(func=lambda args: check(result_files.load(args.baseline),
+                                                        result_files.load(args.current),
+                                                        args.tolerance, args.accuracy_tolerance,
+                                                        args.min_delta_ms))
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
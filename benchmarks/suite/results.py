@@ -0,0 +1,138 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Accuracy results compared by absolute difference; everything else relatively
+ACCURACY_KEYS = ("wer", "cer", "per")
+
+
+def environment() -> dict:
+    """
+    Where and with what the results were measured.
+    """
+    import numpy
+    import torch
+
+    try:
+        import transformers
+        transformers_version = transformers.__version__
+    except ImportError:
+        transformers_version = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=10,
+                                cwd=Path(__file__).parent).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "torch": torch.__version__,
+        "transformers": transformers_version,
+    }
+
+
+def save(results: dict, path: str):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    """
+    {"backends": {"hubert": {"rtf": 0.1}}} -> {"backends.hubert.rtf": 0.1}
+    for every numeric leaf, plus "<path>.error" for failed entries.
+    """
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+        elif key == "error" and value:
+            flat[path] = value
+    return flat
+
+
+def _higher_is_better(key: str) -> bool:
+    return key.endswith("per_second")
+
+
+def _milliseconds(key: str, value: float):
+    """
+    A timing result in milliseconds (None for non-timing results).
+    """
+    name = key.rsplit(".", 1)[-1]
+    if name.endswith("_seconds"):
+        return 1000 * value
+    if name.startswith("ms_") or "_ms_" in name:
+        return value
+    return None
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.1, accuracy_tolerance: float = 0.01,
+            min_delta_ms: float = 0.1) -> list:
+    """
+    Compares every measurement present in both result files.
+
+    A timing, memory or real-time-factor result regresses when it is more
+    than tolerance (relative) worse than the baseline; throughput
+    ("*_per_second") when it is that much lower; WER/CER/PER when it rises by
+    more than accuracy_tolerance (absolute). Timings that moved by less than
+    min_delta_ms are never flagged, since sub-0.1 ms results are mostly
+    noise. An entry that fails now but did not in the baseline is always a
+    regression.
+
+    Returns:
+        list[dict]: {"key", "baseline", "current", "change", "regression"}
+        per compared measurement; change is relative (absolute for accuracy)
+    """
+    old, new = flatten(baseline.get("results", baseline)), flatten(current.get("results", current))
+    rows = []
+    for key in sorted(new):
+        if key.endswith(".error"):
+            if key not in old:
+                rows.append({"key": key, "baseline": None, "current": new[key], "change": None, "regression": True})
+            continue
+        if key not in old:
+            continue
+        before, after = old[key], new[key]
+        if key.rsplit(".", 1)[-1] in ACCURACY_KEYS:
+            change = after - before
+            regression = change > accuracy_tolerance
+        else:
+            change = (after - before) / before if before else 0.0
+            regression = change < -tolerance if _higher_is_better(key) else change > tolerance
+            if regression and _milliseconds(key, before) is not None:
+                regression = _milliseconds(key, after) - _milliseconds(key, before) >= min_delta_ms
+        rows.append({"key": key, "baseline": before, "current": after, "change": change, "regression": regression})
+    return rows
+
+
+def format_comparison(rows: list, only_changes: bool = False) -> str:
+    lines = [f"{'measurement':<56} {'baseline':>12} {'current':>12} {'change':>9}"]
+    for row in rows:
+        if only_changes and not row["regression"]:
+            continue
+        if row["change"] is None:
+            lines.append(f"{row['key']:<56} {'':>12} {str(row['current'])[:40]}  REGRESSION")
+            continue
+        accuracy = row["key"].rsplit(".", 1)[-1] in ACCURACY_KEYS
+        change = f"{row['change']:+.3f}" if accuracy else f"{row['change']:+.1%}"
+        flag = "  REGRESSION" if row["regression"] else ""
+        lines.append(f"{row['key']:<56} {row['baseline']:>12.4g} {row['current']:>12.4g} {change:>9}{flag}")
+    return "\n".join(lines)
@@ -0,0 +1,147 @@
+import os
+import random
+import resource
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+from benchmarks.suite.workloads import letter_readings, passage_pairs
+
+
+def median_seconds(function, repeats):
+    """
+    Median wall time of repeats calls (after one untimed warm-up call).
+    """
+    function()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def bench_metrics(lengths=(10, 100, 1000), pairs=50, repeats=5, seed=0) -> dict:
+    """
+    utils.metrics on synthetic readings: milliseconds per pair for the
+    per-pair functions and the batched compute_error_rates, per passage length.
+    """
+    from utils.metrics import compute_cer, compute_error_rates, compute_per, compute_wer
+
+    results = {}
+    for num_words in lengths:
+        readings = passage_pairs(num_words, pairs, seed=seed + num_words)
+        row = {}
+        for name, compute in (("wer", compute_wer), ("cer", compute_cer), ("per", compute_per)):
+            seconds = median_seconds(lambda: [compute(ref, hyp) for ref, hyp in readings], repeats)
+            row[f"{name}_ms_per_pair"] = 1000 * seconds / pairs
+        for unit in ("word", "char"):
+            seconds = median_seconds(lambda: compute_error_rates(readings, unit=unit), repeats)
+            row[f"batch_{unit}_ms_per_pair"] = 1000 * seconds / pairs
+        results[f"{num_words}_words"] = row
+    return results
+
+
+def bench_alignment(lengths=(5, 20, 80), readings=20, repeats=5, seed=0) -> dict:
+    """
+    utils.alignment.align_phonemes on letter-task readings: milliseconds per
+    reading, per number of letters read.
+    """
+    from utils.alignment import align_phonemes
+
+    results = {}
+    for num_letters in lengths:
+        inputs = letter_readings(num_letters, readings, seed=seed + num_letters)
+        seconds = median_seconds(lambda: [align_phonemes("letter", *reading) for reading in inputs], repeats)
+        results[f"{num_letters}_letters"] = {"ms_per_reading": 1000 * seconds / readings}
+    return results
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_backend(backend, clips, samples, batch_sizes, repeats, threads, seed):
+    """
+    Measures one backend in a fresh process, so its import, load and peak
+    memory are its own.
+    """
+    import numpy as np
+    import torch
+
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    if threads:
+        torch.set_num_threads(threads)
+
+    from utils.audio import duration_seconds
+
+    results = {}
+    try:
+        start = time.perf_counter()
+        from models.registry import get_batch_transcribe_function, get_transcribe_function, registry
+        transcribe = get_transcribe_function(backend)
+        results["import_seconds"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        registry.get(backend)
+        results["load_seconds"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        transcribe(clips[0])
+        results["first_call_seconds"] = time.perf_counter() - start
+
+        # Warm latency: median per clip, real-time factor over all clips
+        per_clip = [median_seconds(lambda: transcribe(path), repeats) for path in clips]
+        audio_seconds = sum(duration_seconds(path) for path in clips)
+        results["warm_ms_per_clip"] = 1000 * statistics.median(per_clip)
+        results["rtf"] = sum(per_clip) / audio_seconds
+
+        transcribe_batch = get_batch_transcribe_function(backend)
+        batch_clips = [clips[i % len(clips)] for i in range(max(batch_sizes))]
+        results["batch"] = {}
+        for batch_size in batch_sizes:
+            batch = batch_clips[:batch_size]
+            seconds = median_seconds(lambda: transcribe_batch(batch), repeats)
+            results["batch"][str(batch_size)] = {"clips_per_second": batch_size / seconds}
+
+        if samples:
+            from evaluate import score
+
+            metric = None
+            rates = []
+            for audio_path, reference_path in samples:
+                scores = score(backend, Path(reference_path).read_text().strip(), transcribe(audio_path))
+                metric = metric or next(iter(scores), None)
+                if metric and scores.get(metric) is not None:
+                    rates.append(scores[metric])
+            if rates:
+                results[metric] = sum(rates) / len(rates)
+    except Exception as exc:
+        results["error"] = f"{type(exc).__name__}: {exc}"
+    results["peak_rss_mb"] = _peak_rss_mb()
+    return results
+
+
+def bench_backend(backend, clips, samples=(), batch_sizes=(1, 2, 4, 8), repeats=3, threads=None, seed=0) -> dict:
+    """
+    One backend: import, load and first-call (cold start) seconds, median
+    warm latency per clip, real-time factor, clips per second at each batch
+    size, peak RSS and, when samples ((audio, reference) pairs) are given,
+    mean WER or PER against the references.
+    """
+    with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(_run_backend, backend, list(clips), list(samples), tuple(batch_sizes), repeats,
+                           threads, seed).result()
+
+
+def offline_environment():
+    """
+    Makes HuggingFace libraries load models from the local cache only, so a
+    run never downloads anything (a missing model is reported as an error).
+    """
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
@@ -0,0 +1,87 @@
+import random
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+from utils.alignment import LETTER_LEXICON
+
+SAMPLE_RATE = 16000
+VOCAB = ["the", "bear", "grizzly", "ran", "up", "hill", "to", "eat", "fish", "in", "river", "big", "brown"]
+LETTERS = sorted(LETTER_LEXICON)
+
+
+def corrupt(tokens, error_rate, rng):
+    """
+    Random substitutions, deletions and insertions, like a child's reading.
+    """
+    out = []
+    for token in tokens:
+        r = rng.random()
+        if r < error_rate / 3:
+            out.append(rng.choice(VOCAB))
+        elif r < 2 * error_rate / 3:
+            continue
+        elif r < error_rate:
+            out.extend([token, rng.choice(VOCAB)])
+        else:
+            out.append(token)
+    return out
+
+
+def passage_pairs(num_words, count, error_rate=0.2, seed=0):
+    """
+    count (reference, hypothesis) readings of one passage of num_words words.
+    """
+    rng = random.Random(seed)
+    reference = [rng.choice(VOCAB) for _ in range(num_words)]
+    return [(" ".join(reference), " ".join(corrupt(reference, error_rate, rng))) for _ in range(count)]
+
+
+def letter_readings(num_letters, count, error_rate=0.2, seed=0):
+    """
+    Letter-task alignment inputs: (vocab_set, ground_truth, prediction) with
+    the reference given as bank letters and the prediction as phonemes of a
+    misread copy.
+    """
+    rng = random.Random(seed)
+    readings = []
+    for _ in range(count):
+        letters = [rng.choice(LETTERS) for _ in range(num_letters)]
+        read = []
+        for letter in letters:
+            r = rng.random()
+            if r < error_rate / 2:
+                read.append(rng.choice(LETTERS))
+            elif r >= error_rate:
+                read.append(letter)
+        prediction = " ".join(LETTER_LEXICON[letter][0] for letter in read)
+        readings.append((" ".join(LETTERS), " ".join(letters), prediction))
+    return readings
+
+
+def synthetic_clip(seconds, seed=0):
+    """
+    Deterministic speech-like 16 kHz signal: a gliding harmonic voice,
+    amplitude-modulated at a syllable rate, over low-level noise.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 120 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    syllables = 0.5 * (1 + np.sin(2 * np.pi * 4 * t + rng.uniform(0, 2 * np.pi)))
+    audio = 0.1 * voice * syllables + 0.005 * rng.standard_normal(len(t))
+    return audio.astype(np.float32)
+
+
+def write_synthetic_clips(directory, durations, seed=0):
+    """
+    Writes one synthetic clip per duration (seconds) and returns their paths.
+    """
+    paths = []
+    for index, seconds in enumerate(durations):
+        path = Path(directory) / f"synthetic_{index:02d}_{seconds:g}s.wav"
+        sf.write(path, synthetic_clip(seconds, seed + index), SAMPLE_RATE, subtype="PCM_16")
+        paths.append(str(path))
+    return paths
@@ -0,0 +1,162 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import torch
+
+from evaluate import PHONEME_BACKENDS, normalize_text
+from models.registry import WAVEFORM_BACKENDS, get_waveform_transcribe_function, registry
+from utils.audio import load_audio
+from utils.rover import rover
+from utils.tracing import span
+
+
+class Ensemble:
+    def __init__(self, backends, threads_per_backend=None):
+        """
+        Runs several backends on the same clip: the audio is decoded once and
+        the backends run concurrently in a thread pool, each capped at its
+        own number of torch intra-op threads so they share the CPU instead of
+        oversubscribing it.
+
+        Args:
+            backends (list[str]): Backend names (see models.registry.WAVEFORM_BACKENDS)
+            threads_per_backend (int | dict): Torch threads per backend, or a
+                {backend: threads} mapping (default: the CPU count split evenly)
+        """
+        unknown = [name for name in backends if name not in WAVEFORM_BACKENDS]
+        if unknown:
+            raise KeyError(f"Unknown model backend: {', '.join(unknown)}")
+        self.backends = list(backends)
+        default = max(1, (os.cpu_count() or 1) // len(self.backends))
+        if isinstance(threads_per_backend, dict):
+            self.threads = {name: threads_per_backend.get(name, default) for name in self.backends}
+        else:
+            self.threads = dict.fromkeys(self.backends, threads_per_backend or default)
+        self._functions = {name: get_waveform_transcribe_function(name) for name in self.backends}
+        self._pool = ThreadPoolExecutor(len(self.backends), thread_name_prefix="ensemble")
+
+    def load(self) -> dict:
+        """
+        Loads every backend (concurrently) so later calls time inference only.
+
+        Returns:
+            dict: Load seconds per backend
+        """
+        def load_one(name):
+            torch.set_num_threads(self.threads[name])
+            start = time.perf_counter()
+            registry.get(name)
+            return time.perf_counter() - start
+
+        futures = {name: self._pool.submit(load_one, name) for name in self.backends}
+        return {name: future.result() for name, future in futures.items()}
+
+    def _run(self, name, waveform):
+        # torch.set_num_threads only affects the calling thread
+        torch.set_num_threads(self.threads[name])
+        start = time.perf_counter()
+        try:
+            with span("ensemble.backend", backend=name, threads=self.threads[name]):
+                transcription, error = self._functions[name](waveform), None
+        except Exception as exc:
+            transcription, error = "", f"{type(exc).__name__}: {exc}"
+        result = {"transcription": transcription, "seconds": time.perf_counter() - start}
+        if error:
+            result["error"] = error
+        return result
+
+    def transcribe(self, audio_path: str, combine: bool = False) -> dict:
+        """
+        Transcribes one clip with every backend.
+
+        Args:
+            audio_path (str): Audio file, decoded once for all backends
+            combine (bool): Also ROVER-vote over the backends' outputs: phoneme
+                backends over ARPAbet phonemes, text backends over normalized
+                words. Votes are only taken within a group of two or more.
+
+        Returns:
+            dict: {"backends": {name: {"transcription", "seconds"[, "error"]}},
+            "decode_seconds", "backend_seconds" (sum over backends),
+            "wall_seconds" (decode included)[, "rover": {"phoneme", "word"}]}
+        """
+        start = time.perf_counter()
+        waveform = load_audio(audio_path)
+        decode_seconds = time.perf_counter() - start
+
+        futures = {name: self._pool.submit(self._run, name, waveform) for name in self.backends}
+        results = {name: future.result() for name, future in futures.items()}
+        output = {
+            "audio": str(audio_path),
+            "backends": results,
+            "decode_seconds": decode_seconds,
+            "backend_seconds": sum(result["seconds"] for result in results.values()),
+            "wall_seconds": time.perf_counter() - start,
+        }
+        if combine:
+            output["rover"] = self.combine(results)
+        return output
+
+    def combine(self, results: dict) -> dict:
+        """
+        ROVER votes per unit group, in backend order (ties favour earlier backends).
+        """
+        groups = {"phoneme": [], "word": []}
+        for name in self.backends:
+            result = results[name]
+            if result.get("error"):
+                continue
+            if name in PHONEME_BACKENDS:
+                groups["phoneme"].append(result["transcription"].upper().split())
+            else:
+                groups["word"].append(normalize_text(result["transcription"]).split())
+        return {unit: " ".join(rover(hypotheses)) for unit, hypotheses in groups.items() if len(hypotheses) > 1}
+
+    def close(self):
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe clips with several backends at once from one decode.")
+    parser.add_argument("--backends", nargs="+", required=True, choices=sorted(WAVEFORM_BACKENDS))
+    parser.add_argument("--audio", nargs="*", default=[], help="Audio files")
+    parser.add_argument("--audio-dir", default=None, help="Also transcribe every .wav in this directory")
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads per backend")
+    parser.add_argument("--rover", action="store_true", help="ROVER-vote over the backends' outputs")
+    parser.add_argument("--json", action="store_true", help="Print one JSON object per clip")
+    args = parser.parse_args()
+
+    paths = list(args.audio)
+    if args.audio_dir:
+        paths += [str(path) for path in sorted(Path(args.audio_dir).glob("*.wav"))]
+    if not paths:
+        parser.error("no audio given (--audio or --audio-dir)")
+
+    with Ensemble(args.backends, args.threads) as ensemble:
+        for name, seconds in ensemble.load().items():
+            print(f"loaded {name} in {seconds:.2f} s ({ensemble.threads[name]} thread(s))")
+        for path in paths:
+            result = ensemble.transcribe(path, combine=args.rover)
+            if args.json:
+                print(json.dumps(result))
+                continue
+            print(f"\n{path}: decode {result['decode_seconds']:.2f} s, wall {result['wall_seconds']:.2f} s, "
+                  f"backends {result['backend_seconds']:.2f} s summed")
+            for name, backend in result["backends"].items():
+                print(f"  {name:<16} {backend['seconds']:6.2f} s  {backend.get('error') or backend['transcription']}")
+            for unit, text in result.get("rover", {}).items():
+                print(f"  {'rover/' + unit:<16} {'':>8}  {text}")
+
+
+if __name__ == "__main__":
+    main()
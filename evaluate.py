@@ -0,0 +1,237 @@
+import argparse
+import csv
+import importlib.util
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from pathlib import Path
+
+from models.registry import BACKENDS
+from utils.metrics import compute_cer, compute_per, compute_wer
+
+# Backends that output ARPAbet phonemes instead of words; they are scored by
+# PER against a phoneme reference ({stem}.phn) instead of the text transcript.
+PHONEME_BACKENDS = {"huper"}
+
+FIELDS = ["clip", "backend", "audio_seconds", "transcribe_seconds", "reference", "hypothesis",
+          "wer", "cer", "per", "error"]
+
+
+def discover_pairs(audio_dir, text_dir, backend):
+    """
+    Finds every {stem}.wav in audio_dir with a reference in text_dir:
+    {stem}.txt for text backends, {stem}.phn for phoneme backends.
+
+    Returns:
+        list[tuple[str, str]]: (audio path, reference path), sorted by name
+    """
+    suffix = ".phn" if backend in PHONEME_BACKENDS else ".txt"
+    pairs = []
+    for audio_path in sorted(Path(audio_dir).glob("*.wav")):
+        reference_path = Path(text_dir) / f"{audio_path.stem}{suffix}"
+        if reference_path.exists():
+            pairs.append((str(audio_path), str(reference_path)))
+    return pairs
+
+
+def normalize_text(text):
+    """
+    Lowercases and drops punctuation (keeping apostrophes) so WER/CER count
+    reading errors, not formatting differences between models.
+    """
+    text = re.sub(r"[^\w\s']", " ", text.lower())
+    return " ".join(text.split())
+
+
+def score(backend, reference, hypothesis):
+    if backend in PHONEME_BACKENDS:
+        reference, hypothesis = reference.upper(), hypothesis.upper()
+        return {"per": compute_per(reference, hypothesis) if reference.split() else None}
+    reference, hypothesis = normalize_text(reference), normalize_text(hypothesis)
+    if not reference:
+        return {}
+    return {"wer": compute_wer(reference, hypothesis), "cer": compute_cer(reference, hypothesis)}
+
+
+def load_done(output_path):
+    """
+    Clips already scored in an earlier (possibly interrupted) run. Rows that
+    recorded an error are retried.
+    """
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, newline="") as f:
+        return {(row["clip"], row["backend"]) for row in csv.DictReader(f) if not row["error"]}
+
+
+def _init_worker(threads):
+    """
+    Runs once in each worker process: caps intra-op threads so workers do
+    not oversubscribe the CPU. The backend itself is loaded lazily by the
+    model registry on the first clip, so each worker holds one copy.
+    """
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    import torch
+
+    torch.set_num_threads(threads)
+
+
+def _transcribe(backend, audio_path):
+    """
+    Transcribes one clip in a worker; errors are returned, not raised, so one
+    bad file does not stop the run.
+    """
+    from models.registry import get_transcribe_function
+    from utils.audio import duration_seconds
+    from utils.tracing import span
+
+    start = time.perf_counter()
+    try:
+        with span("evaluate.clip", backend=backend, clip=Path(audio_path).name):
+            hypothesis = get_transcribe_function(backend)(audio_path)
+        error = ""
+    except Exception as exc:
+        hypothesis, error = "", f"{type(exc).__name__}: {exc}"
+    elapsed = time.perf_counter() - start
+    try:
+        seconds = duration_seconds(audio_path)
+    except Exception:
+        seconds = None
+    return hypothesis, error, seconds, elapsed
+
+
+def evaluate(backend, audio_dir="data/audio", text_dir="data/text", output="results.csv", workers=1,
+             threads_per_worker=None, limit=None, parquet=None):
+    """
+    Transcribes every clip with a reference and appends one scored row per
+    clip to the output CSV as soon as it finishes. Re-running with the same
+    output skips clips that were already scored, so an interrupted run
+    resumes where it stopped.
+
+    Args:
+        backend (str): One of models.registry.BACKENDS
+        audio_dir (str): Directory of {stem}.wav files
+        text_dir (str): Directory of {stem}.txt (or .phn) references
+        output (str): CSV file to append results to
+        workers (int): Worker processes, each with its own copy of the model
+        threads_per_worker (int): torch threads per worker
+            (default: CPU count divided by workers)
+        limit (int): Only evaluate the first N clips
+        parquet (str): Also write all results to this Parquet file at the end
+
+    Returns:
+        dict: Clip counts and mean error rates for this backend
+    """
+    if backend not in BACKENDS:
+        raise KeyError(f"Unknown model backend: {backend}")
+    if parquet:
+        check_parquet_support()  # fail before the run, not after it
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // max(workers, 1))
+
+    pairs = discover_pairs(audio_dir, text_dir, backend)[:limit]
+    done = load_done(output)
+    todo = [(audio, ref) for audio, ref in pairs if (Path(audio).name, backend) not in done]
+    print(f"{backend}: {len(pairs)} clips, {len(pairs) - len(todo)} already scored, {len(todo)} to run "
+          f"on {workers} worker(s) x {threads} thread(s)")
+
+    new_file = not os.path.exists(output)
+    with open(output, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        if new_file:
+            writer.writeheader()
+            f.flush()
+
+        def record(audio_path, reference_path, result):
+            hypothesis, error, seconds, elapsed = result
+            reference = Path(reference_path).read_text().strip()
+            row = {"clip": Path(audio_path).name, "backend": backend, "audio_seconds": seconds,
+                   "transcribe_seconds": round(elapsed, 3), "reference": reference,
+                   "hypothesis": hypothesis, "error": error}
+            if not error:
+                row.update(score(backend, reference, hypothesis))
+            writer.writerow(row)
+            f.flush()  # each finished clip survives a crash
+            status = error or " ".join(f"{k}={row[k]:.3f}" for k in ("wer", "cer", "per") if row.get(k) is not None)
+            print(f"{row['clip']}: {status}")
+
+        if workers <= 1:
+            _init_worker(threads)
+            for audio_path, reference_path in todo:
+                record(audio_path, reference_path, _transcribe(backend, audio_path))
+        else:
+            # spawn: fresh interpreters, so no torch thread pools are inherited from a fork
+            with ProcessPoolExecutor(workers, mp_context=get_context("spawn"), initializer=_init_worker,
+                                     initargs=(threads,)) as pool:
+                futures = {pool.submit(_transcribe, backend, audio): (audio, ref) for audio, ref in todo}
+                for future in as_completed(futures):
+                    record(*futures[future], future.result())
+
+    summary = summarize(output, backend)
+    if parquet:
+        write_parquet(output, parquet)
+    return summary
+
+
+def _latest_rows(output_path):
+    """
+    One row per (clip, backend): the last one written, so retried clips
+    replace their failed attempts.
+    """
+    with open(output_path, newline="") as f:
+        return list({(row["clip"], row["backend"]): row for row in csv.DictReader(f)}.values())
+
+
+def summarize(output_path, backend):
+    rows = [row for row in _latest_rows(output_path) if row["backend"] == backend]
+    summary = {"clips": len(rows), "errors": sum(1 for row in rows if row["error"])}
+    for metric in ("wer", "cer", "per"):
+        values = [float(row[metric]) for row in rows if row[metric]]
+        if values:
+            summary[metric] = sum(values) / len(values)
+    return summary
+
+
+def check_parquet_support():
+    """
+    Raises ImportError naming the packages write_parquet needs but cannot import.
+    """
+    missing = [name for name in ("pandas",) if importlib.util.find_spec(name) is None]
+    if importlib.util.find_spec("pyarrow") is None and importlib.util.find_spec("fastparquet") is None:
+        missing.append("pyarrow")
+    if missing:
+        raise ImportError(f"Writing Parquet needs {' and '.join(missing)}: pip install {' '.join(missing)}")
+
+
+def write_parquet(output_path, parquet_path):
+    import pandas as pd
+
+    pd.DataFrame(_latest_rows(output_path), columns=FIELDS).to_parquet(parquet_path, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe and score every clip in data/audio against data/text.")
+    parser.add_argument("--backend", required=True, choices=sorted(BACKENDS))
+    parser.add_argument("--audio-dir", default="data/audio")
+    parser.add_argument("--text-dir", default="data/text")
+    parser.add_argument("--output", default="results.csv", help="CSV appended to as clips finish (resumable)")
+    parser.add_argument("--parquet", default=None, help="Also write the results to this Parquet file")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes, one model copy each")
+    parser.add_argument("--threads-per-worker", type=int, default=None)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+    if args.parquet:
+        try:
+            check_parquet_support()
+        except ImportError as exc:
+            parser.error(str(exc))
+
+    summary = evaluate(args.backend, args.audio_dir, args.text_dir, args.output, args.workers,
+                       args.threads_per_worker, args.limit, args.parquet)
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Set to a file path to cache LLM replies across runs
+CACHE_PATH_ENV = "BAIR_LLM_CACHE"
+CACHE_TTL_ENV = "BAIR_LLM_CACHE_TTL"  # seconds
+CACHE_SIZE_ENV = "BAIR_LLM_CACHE_MB"
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2
+
+
+class ResponseCache:
+    def __init__(self, path: str, ttl_seconds: Optional[float] = None, max_bytes: Optional[int] = DEFAULT_MAX_BYTES):
+        """
+        SQLite-backed cache of chat completion replies.
+
+        Entries are keyed by a hash of the model name, temperature and the
+        full message list (system message and rendered prompt), so any change
+        to prompts.py produces new keys. Entries older than ttl_seconds are
+        treated as misses; when the stored replies exceed max_bytes, least
+        recently used entries are deleted. Safe to share between threads and
+        processes.
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT, "
+                "created REAL, accessed REAL, size INTEGER)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    @staticmethod
+    def key(model: str, temperature: float, messages: List[Dict[str, str]],
+            response_format: Optional[dict] = None) -> str:
+        request = {"model": model, "temperature": temperature, "messages": messages}
+        if response_format:
+            # Free-text and JSON-mode replies to the same messages are different entries
+            request["response_format"] = response_format
+        payload = json.dumps(request, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, model: str, response: str):
+        now = time.time()
+        size = len(response.encode())
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created, accessed, size) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, now, now, size),
+            )
+            if self.max_bytes is not None:
+                self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def purge_expired(self) -> int:
+        """
+        Deletes expired entries, returning how many were removed.
+        """
+        if self.ttl_seconds is None:
+            return 0
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_seconds,))
+            return cursor.rowcount
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self), "bytes": self.size_bytes()}
+
+
+_default_cache = None
+_default_cache_checked = False
+
+
+def get_default_cache() -> Optional[ResponseCache]:
+    """
+    The process-wide cache, configured from BAIR_LLM_CACHE (a file path),
+    BAIR_LLM_CACHE_TTL and BAIR_LLM_CACHE_MB. Returns None when caching is
+    not enabled.
+    """
+    global _default_cache, _default_cache_checked
+    if not _default_cache_checked:
+        _default_cache_checked = True
+        path = os.environ.get(CACHE_PATH_ENV)
+        if path:
+            ttl = os.environ.get(CACHE_TTL_ENV)
+            max_mb = os.environ.get(CACHE_SIZE_ENV)
+            max_bytes = int(float(max_mb) * 1024 ** 2) if max_mb else DEFAULT_MAX_BYTES
+            _default_cache = ResponseCache(path, float(ttl) if ttl else None, max_bytes)
+    return _default_cache
+
+
+def set_default_cache(cache: Optional[ResponseCache]):
+    """
+    Enables (or with None, disables) the process-wide cache.
+    """
+    global _default_cache, _default_cache_checked
+    _default_cache = cache
+    _default_cache_checked = True
@@ -0,0 +1,227 @@
+import asyncio
+import os
+import random
+import time
+from typing import Dict, List, Optional
+
+from llm_cache import ResponseCache, get_default_cache
+from utils.tracing import span
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Async token bucket: refills at rate tokens per second up to capacity
+        (default: one second's worth). Waiters are served in arrival order.
+
+        A request larger than the bucket waits for a full bucket and then
+        takes the bucket into debt, which later requests wait to pay back, so
+        the long-run rate never exceeds rate however large the requests.
+        """
+        self.rate = rate
+        self.capacity = max(capacity or rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1):
+        # Waiting for more than the bucket holds would never end; the excess becomes debt instead
+        needed = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= needed:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((needed - self._tokens) / self.rate)
+
+
+def estimate_tokens(messages: List[Dict[str, str]]) -> int:
+    """
+    Rough prompt size (about four characters per token), for rate limiting.
+    """
+    return sum(len(message["content"]) for message in messages) // 4 + 1
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    return getattr(exc, "status_code", None)
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, asyncio.TimeoutError):
+        return True
+    if _status_code(exc) is not None:
+        return _status_code(exc) in RETRYABLE_STATUS
+
+    import openai
+
+    return isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError))
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    """
+    Seconds the server asked us to wait (Retry-After header), if any.
+    """
+    response = getattr(exc, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class AsyncLLMClient:
+    def __init__(self, model: str = DEFAULT_MODEL, temperature: float = 0.7, max_concurrency: int = 8,
+                 requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 max_retries: int = 5, timeout: float = 60.0, backoff_base: float = 1.0,
+                 backoff_max: float = 30.0, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 cache: Optional[ResponseCache] = None):
+        """
+        Concurrent chat-completion client for scoring many students at once.
+
+        Args:
+            model (str): Chat model name
+            temperature (float): Sampling temperature
+            max_concurrency (int): Requests in flight at once
+            requests_per_minute (float): Request rate limit (None: unlimited)
+            tokens_per_minute (float): Estimated prompt-token rate limit (None: unlimited)
+            max_retries (int): Retries after timeouts, rate limits and server errors
+            timeout (float): Seconds allowed per attempt
+            backoff_base (float): First retry delay; doubles each retry, with jitter
+            backoff_max (float): Longest retry delay
+            api_key (str): Defaults to OPENAI_API_KEY
+            base_url (str): Alternative endpoint, e.g. a local mock server
+                (defaults to OPENAI_BASE_URL, then the OpenAI API)
+            cache (ResponseCache): Replies to reuse instead of calling the API
+                (default: the process-wide cache from llm_cache, if enabled)
+        """
+        self.model = model
+        self.temperature = temperature
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.cache = cache
+
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self._client = None
+        self._loop = None
+
+    def _bind(self):
+        """
+        Creates the OpenAI client and the asyncio primitives for the running
+        event loop (each asyncio.run call gets a fresh loop).
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        from openai import AsyncOpenAI
+
+        api_key = self.api_key or os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            raise RuntimeError(
+                "Missing OPENAI_API_KEY. Set it in your shell, e.g. export OPENAI_API_KEY=..."
+            )
+        # Retries and timeouts are handled here, so the SDK's own are disabled
+        self._client = AsyncOpenAI(api_key=api_key, base_url=self.base_url, max_retries=0, timeout=self.timeout)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._request_bucket = TokenBucket(self.requests_per_minute / 60) if self.requests_per_minute else None
+        self._token_bucket = TokenBucket(self.tokens_per_minute / 60) if self.tokens_per_minute else None
+        self._loop = loop
+
+    async def _throttle(self, messages):
+        if self._request_bucket is not None:
+            await self._request_bucket.acquire()
+        if self._token_bucket is not None:
+            await self._token_bucket.acquire(estimate_tokens(messages))
+
+    def _backoff(self, attempt: int, exc: BaseException) -> float:
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            return retry_after
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _cache(self) -> Optional[ResponseCache]:
+        return self.cache if self.cache is not None else get_default_cache()
+
+    async def chat_completion(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Sends one chat request, retrying transient failures. Cached replies
+        are returned without a network call. The sqlite cache is read and
+        written on worker threads, so a slow or locked cache does not stall
+        the other requests on the event loop.
+        """
+        cache = self._cache()
+        if cache is not None:
+            key = cache.key(self.model, self.temperature, messages)
+            reply = await asyncio.to_thread(cache.get, key)
+            if reply is None:
+                reply = await self._request(messages)
+                await asyncio.to_thread(cache.put, key, self.model, reply)
+            return reply
+        return await self._request(messages)
+
+    async def _request(self, messages: List[Dict[str, str]]) -> str:
+        self._bind()
+        attempt = 0
+        with span("llm.request", model=self.model) as s:
+            if s.recording:
+                s.set(tokens=estimate_tokens(messages))
+            while True:
+                await self._throttle(messages)
+                try:
+                    async with self._semaphore:
+                        self.requests += 1
+                        response = await asyncio.wait_for(
+                            self._client.chat.completions.create(
+                                model=self.model,
+                                messages=messages,
+                                temperature=self.temperature,
+                            ),
+                            self.timeout,
+                        )
+                except Exception as exc:
+                    if attempt >= self.max_retries or not _is_retryable(exc):
+                        self.failures += 1
+                        raise
+                    self.retries += 1
+                    s.set(retries=attempt + 1)
+                    await asyncio.sleep(self._backoff(attempt, exc))
+                    attempt += 1
+                    continue
+                return response.choices[0].message.content
+
+    async def chat_completions(self, conversations: List[List[Dict[str, str]]],
+                               return_exceptions: bool = False) -> List:
+        """
+        Sends many chat requests concurrently; replies are in input order.
+        Identical conversations are sent once. With return_exceptions, a
+        failed request yields its exception instead of aborting the rest.
+        """
+        unique = {}
+        for messages in conversations:
+            unique.setdefault(ResponseCache.key(self.model, self.temperature, messages), messages)
+        replies = await asyncio.gather(
+            *(self.chat_completion(messages) for messages in unique.values()),
+            return_exceptions=return_exceptions,
+        )
+        by_key = dict(zip(unique, replies))
+        return [by_key[ResponseCache.key(self.model, self.temperature, messages)] for messages in conversations]
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "retries": self.retries, "failures": self.failures}
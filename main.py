@@ -1,64 +1,278 @@
+import argparse
+import asyncio
 import os
 
-from openai import OpenAI
-from prompts import get_word_prompt, get_letter_prompt
+from llm_cache import get_default_cache
+from llm_client import AsyncLLMClient
+from prompts import PROMPT_STYLES, build_prompt, build_prompts, count_tokens, get_json_prompt, get_json_requery_prompt
+from structured_output import find_disagreements, parse_reply, phoneme_alignment, to_word_alignment
+from utils.alignment import EMPTY, AlignmentReport, align_phonemes
+from utils.tracing import span
 
-api_key = os.environ.get("OPENAI_API_KEY")
-if not api_key:
-    raise RuntimeError(
-        "Missing OPENAI_API_KEY. Set it in your shell, e.g. export OPENAI_API_KEY=..."
-    )
+_client = None
+
+
+def get_client():
+    """
+    Creates the OpenAI client on first use, so the local alignment path
+    never needs an API key.
+    """
+    global _client
+    if _client is None:
+        from openai import OpenAI
+
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            raise RuntimeError(
+                "Missing OPENAI_API_KEY. Set it in your shell, e.g. export OPENAI_API_KEY=..."
+            )
+        _client = OpenAI(api_key=api_key)
+    return _client
 
-client = OpenAI(api_key=api_key)
 
-def chat_completion(messages, model="gpt-4o-mini", temperature=0.7):
+def chat_completion(messages, model="gpt-4o-mini", temperature=0.7, response_format=None):
     """
     messages: list of dicts like:
         [
             {"role": "system", "content": "You are a helpful assistant."},
             {"role": "user", "content": "Hello!"}
         ]
+    response_format: e.g. {"type": "json_object"} to request JSON output
     """
 
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temperature,
-    )
+    cache = get_default_cache()
+    if cache is not None:
+        key = cache.key(model, temperature, messages, response_format)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
 
-    return response.choices[0].message.content
+    options = {"response_format": response_format} if response_format else {}
+    with span("llm.request", model=model) as s:
+        if s.recording:
+            s.set(tokens=sum(count_tokens(message["content"], model) for message in messages))
+        response = get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            **options,
+        )
+        reply = response.choices[0].message.content
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            s.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
 
-def get_LLM_alignment(task: str, vocab_set: str, ground_truth: str, prediction: str) -> str:
-    if task == "word":
-        content = get_word_prompt(vocab_set, ground_truth, prediction)
-    elif task == "letter":
-        content = get_letter_prompt(vocab_set, ground_truth, prediction)
-    else:
-        raise ValueError(f"Unknown task type: {task}")
-    
+    if cache is not None:
+        cache.put(key, model, reply)
+    return reply
+
+
+def get_alignment(task: str, vocab_set: str, ground_truth: str, prediction: str, lexicon=None) -> AlignmentReport:
+    """
+    Builds the per-word alignment table locally from an edit-distance traceback.
+    No network call; use get_LLM_alignment for a free-form explanation.
+    """
+    return align_phonemes(task, vocab_set, ground_truth, prediction, lexicon=lexicon)
+
+
+SYSTEM_MESSAGE = "You are a medical professional at UCSF Multitudes who is analyzing K-2 children's speech to assess their language proficiency."
+
+
+def get_LLM_messages(task: str, vocab_set: str, ground_truth: str, prediction: str, style: str = "full") -> list:
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": build_prompt(task, vocab_set, ground_truth, prediction, style)}
+    ]
+
+
+def get_LLM_conversations(task: str, vocab_set: str, ground_truth: str, prediction: str, style: str = "full",
+                          max_prompt_tokens=None, lexicon=None) -> list:
+    """
+    Message lists for one recording: a single one, or one per chunk when the
+    prompt would exceed max_prompt_tokens (see prompts.build_prompts).
+    """
+    prompts = build_prompts(task, vocab_set, ground_truth, prediction, style, max_prompt_tokens, lexicon)
+    return [
+        [{"role": "system", "content": SYSTEM_MESSAGE}, {"role": "user", "content": content}]
+        for content in prompts
+    ]
+
+
+def get_LLM_alignment(task: str, vocab_set: str, ground_truth: str, prediction: str, style: str = "full",
+                      max_prompt_tokens=None, lexicon=None) -> str:
+    conversations = get_LLM_conversations(task, vocab_set, ground_truth, prediction, style, max_prompt_tokens, lexicon)
+
+    print("Getting reply from OpenAI API...")
+    with span("llm.alignment", task=task, requests=len(conversations)):
+        replies = [chat_completion(messages) for messages in conversations]
+
+    return "\n\n".join(replies)
+
+
+def _query_entries(content: str) -> list:
     messages = [
-        {"role": "system", "content": "You are a medical professional at UCSF Multitudes who is analyzing K-2 children's speech to assess their language proficiency."},
+        {"role": "system", "content": SYSTEM_MESSAGE},
         {"role": "user", "content": content}
     ]
+    reply = chat_completion(messages, temperature=0, response_format={"type": "json_object"})
+    try:
+        return parse_reply(reply)
+    except ValueError:
+        return []
 
-    print("Getting reply from OpenAI API...")
-    reply = chat_completion(messages)
 
-    return reply
+def get_LLM_alignment_structured(task: str, vocab_set: str, ground_truth: str, prediction: str,
+                                 lexicon=None, max_requeries: int = 2) -> AlignmentReport:
+    """
+    Asks the LLM for the alignment as JSON (see structured_output.ALIGNMENT_SCHEMA)
+    instead of Markdown, and checks it locally.
+
+    Every word's ops must be consistent and minimal, and the words must
+    cover the reference and prediction exactly. When the reference can be
+    segmented locally (letter task, or word task with a lexicon), only the
+    words that fail are sent again; words still failing after max_requeries
+    fall back to the local alignment. Without word boundaries the whole
+    recording is re-queried, and a ValueError is raised if it never passes.
+
+    Returns:
+        AlignmentReport with WER recomputed from the returned ops, and the
+        phoneme error rate of the same ops (utils.metrics) as its per attribute
+    """
+    try:
+        expected = align_phonemes(task, vocab_set, ground_truth, prediction, lexicon=lexicon).words
+        ref = [phoneme for word in expected for phoneme in word.ref]
+    except ValueError:
+        if task not in ("word", "letter"):
+            raise
+        expected, ref = None, ground_truth.split()
+    hyp = prediction.split()
+
+    print("Getting structured reply from OpenAI API...")
+    entries = _query_entries(get_json_prompt(task, vocab_set, " ".join(ref), prediction))
+    problems = find_disagreements(entries, ref, hyp, expected)
+
+    for _ in range(max_requeries):
+        if not problems:
+            break
+        if expected is None:
+            entries = _query_entries(get_json_prompt(task, vocab_set, " ".join(ref), prediction))
+        else:
+            if len(entries) != len(expected):
+                entries = [None] * len(expected)
+            indices = sorted(problems)
+            print(f"Re-querying {len(indices)} of {len(expected)} words...")
+            words = [(expected[i].word, expected[i].ref, [p for p in expected[i].pred if p != EMPTY]) for i in indices]
+            retried = _query_entries(get_json_requery_prompt(task, words))
+            if len(retried) == len(indices):
+                for i, entry in zip(indices, retried):
+                    entries[i] = entry
+        problems = find_disagreements(entries, ref, hyp, expected)
+
+    if problems and expected is None:
+        raise ValueError(f"LLM alignment failed validation: {next(iter(problems.values()))}")
+
+    words = [expected[i] if i in problems else to_word_alignment(entry) for i, entry in enumerate(entries)]
+    report = AlignmentReport(words)
+    alignment = phoneme_alignment(words)
+    report.per = alignment.error_rate if alignment.ref else 0.0
+    return report
+
+
+async def align_many_async(items, client=None, return_exceptions=False, style="full",
+                           max_prompt_tokens=None, lexicon=None) -> list:
+    """
+    Async version of align_many, for callers already inside an event loop.
+    """
+    client = client or AsyncLLMClient()
+    per_item = [get_LLM_conversations(*item, style, max_prompt_tokens, lexicon) for item in items]
+    replies = await client.chat_completions(
+        [messages for conversations in per_item for messages in conversations],
+        return_exceptions=return_exceptions,
+    )
+
+    # Rejoin the replies of recordings that were split into several prompts
+    results, start = [], 0
+    for conversations in per_item:
+        parts = replies[start:start + len(conversations)]
+        start += len(conversations)
+        failed = next((part for part in parts if isinstance(part, BaseException)), None)
+        results.append(failed if failed is not None else "\n\n".join(parts))
+    return results
+
+
+def align_many(items, client=None, return_exceptions=False, style="full", max_prompt_tokens=None, lexicon=None) -> list:
+    """
+    Gets LLM alignments for many students concurrently.
+
+    Args:
+        items: Iterable of (task, vocab_set, ground_truth, prediction) tuples
+        client (AsyncLLMClient): Controls concurrency, rate limits, retries
+            and timeouts (default: AsyncLLMClient())
+        return_exceptions (bool): Return a failed item's exception in its
+            place instead of raising
+        style (str): Prompt layout, one of prompts.PROMPT_STYLES
+        max_prompt_tokens (int): Split recordings whose prompt is longer
+        lexicon (dict): Pronunciations used to split word-task recordings
+
+    Returns:
+        list[str]: Replies in the same order as items
+    """
+    return asyncio.run(align_many_async(items, client, return_exceptions, style, max_prompt_tokens, lexicon))
+
 
 def main():
+    parser = argparse.ArgumentParser(description="Align predicted phonemes with the ground truth.")
+    parser.add_argument("--explain", action="store_true", help="Also ask the LLM for a free-form alignment")
+    parser.add_argument("--prompt-style", default="full", choices=PROMPT_STYLES, help="Layout of the LLM prompt")
+    parser.add_argument("--max-prompt-tokens", type=int, default=None, help="Split prompts longer than this")
+    parser.add_argument("--structured", action="store_true",
+                        help="With --explain, ask for JSON and validate it instead of free-form Markdown")
+    parser.add_argument("--audio", default=None,
+                        help="Score this recording of the word example word by word instead of the fixed prediction")
+    parser.add_argument("--max-silence", type=float, default=3.0, help="With --audio, stop at a pause this long")
+    args = parser.parse_args()
+
     # WRE Example: "about, from, not, all, get, off, three, are, one, two, as, or, ask, had, up, ate, ran, back, help, red, run, but, his, hot, when, came, sit, six, who, yes"
     ground_truth_word = "AH B AW T F R AH M N AA T AO L NG EH T AO F TH R IY AA R OW AH N T UW AE Z AO R AE S K HH AE D AH P EY T R AE N B AE K HH EH L P R EH D R AH N B AH T HH IH Z HH AA T OW EH N K EY M S IH T S IH K S HH UW EY EH S" # From DWFST Mapping
     prediction_word = "AH B AW T F R AA M N AA T AA L G IH T AA F TH R IY AA R ER W AH N T UW AE S AA R AE S K HH AE D AH P EY T R AE N B AE K HH EH L P R EH D R AH N B AH T HH IH Z S HH AA T W AE N K EY N S IH T S IH K S HH UW Y EH S" # HuPER
     vocab_set_word = "who, ran, yes, hot, back, get, ate, from, one, two, ask, six, help, about, sit, not, up, came, red, but, his, all, three, or, when, are, off, run"
+    lexicon_word = {  # From DWFST Mapping
+        "about": "AH B AW T", "from": "F R AH M", "not": "N AA T", "all": "AO L", "get": "NG EH T",
+        "off": "AO F", "three": "TH R IY", "are": "AA R", "one": "OW AH N", "two": "T UW",
+        "as": "AE Z", "or": "AO R", "ask": "AE S K", "had": "HH AE D", "up": "AH P",
+        "ate": "EY T", "ran": "R AE N", "back": "B AE K", "help": "HH EH L P", "red": "R EH D",
+        "run": "R AH N", "but": "B AH T", "his": "HH IH Z", "hot": "HH AA T", "when": "OW EH N",
+        "came": "K EY M", "sit": "S IH T", "six": "S IH K S", "who": "HH UW", "yes": "EY EH S",
+    }
 
     # LNF Example: "H B U H X Y R"
     ground_truth_letter = "H B U H X Y R"
     prediction_letter = "EY S B IY Y UW EY CH EH K S W AY"
     vocab_set_letter = "Q B M Z A T H X L C P V G N E R S I U D W O Y F J K"
-    
-    text = get_LLM_alignment("word", ground_truth_word, prediction_word, vocab_set_word)
-    print(text)
+
+    if args.audio:
+        from utils.word_scoring import score_recording
+
+        report = score_recording(args.audio, "word", vocab_set_word, ground_truth_word, lexicon=lexicon_word,
+                                 max_silence=args.max_silence)
+        prediction_word = " ".join(phoneme for word in report.words for phoneme, _, _ in word.heard)
+        print(report.to_markdown())
+        latency = ", ".join(f"{name} {seconds:.3f} s" for name, seconds in report.latency.items())
+        print(f"\nPER = {100 * report.per:.1f}%; {latency}")
+    else:
+        report = get_alignment("word", vocab_set_word, ground_truth_word, prediction_word, lexicon=lexicon_word)
+        print(report.to_markdown())
+
+    if args.explain:
+        if args.structured:
+            llm_report = get_LLM_alignment_structured("word", vocab_set_word, ground_truth_word, prediction_word,
+                                                      lexicon=lexicon_word)
+            text = f"{llm_report.to_markdown()}\n\nPER = {100 * llm_report.per:.1f}%"
+        else:
+            text = get_LLM_alignment("word", vocab_set_word, ground_truth_word, prediction_word,
+                                     style=args.prompt_style, max_prompt_tokens=args.max_prompt_tokens,
+                                     lexicon=lexicon_word)
+        print(text)
 
 if __name__=="__main__":
-    main()
\ No newline at end of file
+    main()
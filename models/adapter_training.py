@@ -0,0 +1,232 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+import torch
+from transformers.modeling_outputs import BaseModelOutput
+from models.whisper_model import CHUNK_SECONDS, feature_config, load_features
+from utils.audio import duration_seconds
+from utils.feature_cache import FeatureCache, get_default_cache
+
+ACTIVATION_KIND = "whisper_adapter_input"
+
+
+class AdapterTrainer:
+    def __init__(self, model, processor, adapter, cache=None, language="en", task="transcribe",
+                 learning_rate=1e-3, batch_size=8, accumulation_steps=4, cache_dtype=np.float16, seed=0):
+        """
+        Trains the Whisper adapter with the rest of the model frozen.
+
+        Everything below the adapter (the log-Mel front end and every encoder
+        layer) is frozen, so its output for a clip never changes. It is
+        computed once per clip and stored in a FeatureCache as a memory-mapped
+        .npy file; each epoch then only runs the adapter, the final encoder
+        layer norm and the decoder loss. Gradients are accumulated over
+        accumulation_steps mini-batches of batch_size clips per optimizer step.
+
+        Args:
+            model, processor, adapter: As returned by load_whisper_with_adapter
+            cache (FeatureCache): Where activations are stored (default: the
+                BAIR_FEATURE_CACHE cache, else a directory under the system temp dir)
+            language (str): Language code of the references
+            task (str): 'transcribe' or 'translate'
+            learning_rate (float): AdamW learning rate for the adapter
+            batch_size (int): Clips per forward/backward pass
+            accumulation_steps (int): Mini-batches per optimizer step
+            cache_dtype: Storage dtype of cached activations (float16 halves
+                disk and page-cache use; training runs in float32)
+            seed (int): Seed for the per-epoch shuffle
+        """
+        self.model = model
+        self.processor = processor
+        self.adapter = adapter
+        self.cache = cache or get_default_cache() or FeatureCache(
+            os.path.join(tempfile.gettempdir(), "bair_adapter_activations"))
+        self.language = language
+        self.task = task
+        self.batch_size = batch_size
+        self.accumulation_steps = accumulation_steps
+        self.cache_dtype = cache_dtype
+        self.device = next(model.parameters()).device
+        self.optimizer = torch.optim.AdamW(adapter.parameters(), lr=learning_rate)
+        self._rng = np.random.default_rng(seed)
+
+    def _cache_config(self) -> dict:
+        encoder = self.model.model.encoder
+        return {
+            "model": self.model.config._name_or_path,
+            "layers": len(encoder.layers),
+            "dtype": np.dtype(self.cache_dtype).name,
+            **feature_config(self.processor),
+        }
+
+    def _input_features(self, audio_paths) -> torch.Tensor:
+        features = [np.asarray(load_features(self.processor, path)) for path in audio_paths]
+        return torch.tensor(np.stack(features)).to(self.device)
+
+    def _frozen_activations(self, input_features) -> torch.Tensor:
+        """
+        Output of the frozen encoder layers, i.e. the adapter's input,
+        captured with a pre-hook while the encoder runs.
+        """
+        captured = []
+        handle = self.adapter.register_forward_pre_hook(lambda module, args: captured.append(args[0]))
+        try:
+            with torch.no_grad():
+                self.model.model.encoder(input_features)
+        finally:
+            handle.remove()
+        return captured[0]
+
+    def cache_activations(self, audio_paths) -> list:
+        """
+        Frozen-encoder activations of every clip ([frames, d_model] each,
+        memory-mapped), computing only the ones not cached yet.
+        """
+        config = self._cache_config()
+        keys = [self.cache.key(path, ACTIVATION_KIND, **config) for path in audio_paths]
+        activations = [self.cache.get(ACTIVATION_KIND, key) for key in keys]
+
+        missing = [i for i, array in enumerate(activations) if array is None]
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            hidden = self._frozen_activations(self._input_features([audio_paths[i] for i in batch]))
+            for i, array in zip(batch, hidden.cpu().numpy().astype(self.cache_dtype)):
+                self.cache.put(ACTIVATION_KIND, keys[i], array)
+                activations[i] = self.cache.get(ACTIVATION_KIND, keys[i])
+        return activations
+
+    def _labels(self, texts) -> list:
+        """
+        Decoder targets: prefix tokens, text and end of text, without the
+        start-of-transcript token the model prepends when shifting labels.
+        """
+        tokenizer = self.processor.tokenizer
+        tokenizer.set_prefix_tokens(language=self.language, task=self.task)
+        start_id = self.model.config.decoder_start_token_id
+        labels = []
+        for ids in tokenizer(list(texts)).input_ids:
+            labels.append(ids[1:] if ids and ids[0] == start_id else ids)
+        return labels
+
+    def _pad_labels(self, labels) -> torch.Tensor:
+        length = max(len(ids) for ids in labels)
+        padded = torch.full((len(labels), length), -100, dtype=torch.long)
+        for row, ids in enumerate(labels):
+            padded[row, :len(ids)] = torch.tensor(ids)
+        return padded.to(self.device)
+
+    def loss_from_activations(self, activations, labels) -> torch.Tensor:
+        """
+        Decoder loss with the adapter applied to cached frozen activations;
+        equal (up to the cache dtype) to running the full model.
+        """
+        hidden = self.model.model.encoder.layer_norm(self.adapter(activations))
+        return self.model(encoder_outputs=BaseModelOutput(last_hidden_state=hidden), labels=labels).loss
+
+    def loss_from_features(self, input_features, labels) -> torch.Tensor:
+        """
+        The same loss with a full forward pass (no activation cache).
+        """
+        return self.model(input_features=input_features, labels=labels).loss
+
+    def train(self, audio_paths, texts, epochs=1, use_cache=True, log=print) -> list:
+        """
+        Trains the adapter on (audio, reference text) pairs. Clips longer
+        than Whisper's 30-second window are skipped, since their features
+        would be truncated but their references would not.
+
+        Args:
+            audio_paths (list[str]): Training clips
+            texts (list[str]): Reference transcript of each clip
+            epochs (int): Passes over the data
+            use_cache (bool): Train on cached frozen activations; False runs
+                the full model every step (the slow baseline)
+            log (callable): Called with a summary line per epoch (None: silent)
+
+        Returns:
+            list[dict]: Per epoch: mean loss, seconds, optimizer steps. With
+            use_cache the one-off caching time is reported as epoch 0.
+        """
+        pairs = [(path, text) for path, text in zip(audio_paths, texts) if duration_seconds(path) <= CHUNK_SECONDS]
+        if len(pairs) < len(audio_paths) and log:
+            log(f"Skipping {len(audio_paths) - len(pairs)} clip(s) longer than {CHUNK_SECONDS} s")
+        if not pairs:
+            raise ValueError("No training clips")
+        paths = [path for path, _ in pairs]
+        labels = self._labels([text for _, text in pairs])
+
+        history = []
+        if use_cache:
+            start = time.perf_counter()
+            activations = self.cache_activations(paths)
+            history.append({"epoch": 0, "seconds": time.perf_counter() - start, "cached_clips": len(paths)})
+            if log:
+                log(f"cached activations of {len(paths)} clip(s) in {history[-1]['seconds']:.2f} s")
+
+        self.model.eval()  # frozen layers: no dropout
+        self.adapter.train()
+        for epoch in range(1, epochs + 1):
+            start = time.perf_counter()
+            order = self._rng.permutation(len(paths))
+            batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+            losses, steps = [], 0
+            self.optimizer.zero_grad()
+            for number, batch in enumerate(batches, 1):
+                batch_labels = self._pad_labels([labels[i] for i in batch])
+                if use_cache:
+                    stacked = torch.from_numpy(np.stack([activations[i] for i in batch]).astype(np.float32))
+                    loss = self.loss_from_activations(stacked.to(self.device), batch_labels)
+                else:
+                    loss = self.loss_from_features(self._input_features([paths[i] for i in batch]), batch_labels)
+                # Average over the accumulated mini-batches, weighting each by its size
+                (loss * len(batch) / (self.batch_size * self.accumulation_steps)).backward()
+                losses.append(loss.item())
+                if number % self.accumulation_steps == 0 or number == len(batches):
+                    self.optimizer.step()
+                    self.optimizer.zero_grad()
+                    steps += 1
+
+            history.append({"epoch": epoch, "loss": float(np.mean(losses)), "seconds": time.perf_counter() - start,
+                            "steps": steps})
+            if log:
+                log(f"epoch {epoch}: loss {history[-1]['loss']:.4f}, {history[-1]['seconds']:.2f} s, {steps} step(s)")
+        self.adapter.eval()
+        return history
+
+    def save(self, path):
+        torch.save(self.adapter.state_dict(), path)
+
+
+def main():
+    from evaluate import discover_pairs
+    from models.registry import registry
+    from models.whisper_model_with_adapter import ADAPTER_WEIGHTS_ENV
+
+    parser = argparse.ArgumentParser(description="Train the Whisper adapter on cached frozen-encoder activations.")
+    parser.add_argument("--audio-dir", default="data/audio")
+    parser.add_argument("--text-dir", default="data/text")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--accumulation-steps", type=int, default=4)
+    parser.add_argument("--learning-rate", type=float, default=1e-3)
+    parser.add_argument("--output", default="adapter.pt", help=f"Adapter weights (load with {ADAPTER_WEIGHTS_ENV})")
+    args = parser.parse_args()
+
+    pairs = discover_pairs(args.audio_dir, args.text_dir, "whisper_adapter")
+    model, processor, adapter = registry.get("whisper_adapter")
+    trainer = AdapterTrainer(model, processor, adapter, learning_rate=args.learning_rate,
+                             batch_size=args.batch_size, accumulation_steps=args.accumulation_steps)
+    trainer.train([audio for audio, _ in pairs], [Path(text).read_text().strip() for _, text in pairs], args.epochs)
+    trainer.save(args.output)
+    print(f"Saved adapter weights to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,655 @@
+import numpy as np
+import torch
+
+from utils.alignment import _pronunciations
+from utils.batching import length_sorted_batches
+from utils.tracing import span
+
+
+def ctc_logit_batches(model, processor, speeches, batch_size=8, device="cpu"):
+    """
+    Runs a CTC model over many 16 kHz clips in padded, length-sorted batches.
+
+    Args:
+        model: HuggingFace *ForCTC model
+        processor: Matching Wav2Vec2Processor
+        speeches: List of 1-D float arrays sampled at 16 kHz
+        batch_size (int): Maximum clips per forward pass
+        device (str): Device the model lives on
+
+    Yields:
+        (indices, logits, frame_lengths): indices into speeches for this batch,
+        logits of shape [batch, frames, vocab], and the number of valid
+        (non-padding) frames for each clip.
+    """
+    # Models with group-norm feature extractors (e.g. wav2vec2-base) are trained
+    # without attention masks and expect zero padding instead.
+    pass_attention_mask = processor.feature_extractor.return_attention_mask
+
+    for indices in length_sorted_batches([len(s) for s in speeches], batch_size):
+        audio_seconds = sum(len(speeches[i]) for i in indices) / 16000
+        with span("ctc.features", items=len(indices), audio_seconds=audio_seconds):
+            inputs = processor(
+                [speeches[i] for i in indices],
+                sampling_rate=16000,
+                return_tensors="pt",
+                padding=True,
+                return_attention_mask=True,
+            )
+            sample_lengths = inputs.attention_mask.sum(dim=-1)
+            if not pass_attention_mask:
+                del inputs["attention_mask"]
+            inputs = inputs.to(device)
+
+        with span("ctc.inference", items=len(indices), audio_seconds=audio_seconds), torch.no_grad():
+            logits = model(**inputs).logits
+
+        frame_lengths = model._get_feat_extract_output_lengths(sample_lengths).tolist()
+        yield indices, logits, frame_lengths
+
+
+class CTCDecoder:
+    def __init__(self, labels, blank_id, skip_tokens=(), word_delimiter=None, frame_seconds=0.02, clean_up=None):
+        """
+        Greedy CTC decoder that collapses repeats and drops blanks with tensor
+        ops over whole batches.
+
+        Args:
+            labels (list[str]): Token string for every output id
+            blank_id (int): CTC blank id (the tokenizer's pad token)
+            skip_tokens: Token strings to drop after collapsing (e.g. special tokens)
+            word_delimiter (str): For character models, the token that separates
+                words; decoded text joins characters and turns it into a space.
+                For phone models (None) decoded text joins tokens with spaces.
+            frame_seconds (float): Duration of one logit frame
+            clean_up (callable): Optional post-processing of decoded text
+        """
+        self.labels = list(labels)
+        self.blank_id = blank_id
+        self.word_delimiter = word_delimiter
+        self.frame_seconds = frame_seconds
+        self.clean_up = clean_up
+
+        # Lookup table of ids that produce output, built once per model
+        keep = torch.tensor([label not in skip_tokens for label in self.labels], dtype=torch.bool)
+        keep[blank_id] = False
+        self._keep = keep
+
+    @classmethod
+    def from_model(cls, model, processor, skip_tokens=(), use_id2label=False, **options):
+        """
+        Builds the decoder for a HuggingFace *ForCTC model and its processor.
+
+        With use_id2label, token strings come from model.config.id2label
+        (falling back to the tokenizer), as for phone recognizers like HuPER.
+        Otherwise the tokenizer's vocabulary is used and its word delimiter
+        is honoured, matching processor.batch_decode. Extra options are
+        passed to the constructor (e.g. beam_width for CTCBeamDecoder).
+        """
+        tokenizer = processor.tokenizer
+        vocab_size = model.config.vocab_size
+        id2label = model.config.id2label if use_id2label else {}
+        labels = [id2label.get(i) or tokenizer.convert_ids_to_tokens(i) for i in range(vocab_size)]
+
+        word_delimiter = None if use_id2label else getattr(tokenizer, "word_delimiter_token", None)
+        clean_up = tokenizer.clean_up_tokenization if getattr(tokenizer, "clean_up_tokenization_spaces", False) else None
+        frame_seconds = model.config.inputs_to_logits_ratio / processor.feature_extractor.sampling_rate
+
+        return cls(labels, tokenizer.pad_token_id, skip_tokens, word_delimiter, frame_seconds, clean_up, **options)
+
+    def decode(self, logits, frame_lengths=None):
+        """
+        Decodes a batch into tokens with their frame spans.
+
+        Args:
+            logits: [batch, frames, vocab] logits, or [batch, frames] argmax ids
+            frame_lengths (list[int]): Valid frames per item (default: all)
+
+        Returns:
+            list[list[tuple[str, int, int]]]: Per item, (token, start_frame,
+            end_frame) with end exclusive, covering the frames the token was emitted.
+        """
+        with span("ctc.greedy_decode", items=len(logits)):
+            return self._decode_batch(logits, frame_lengths)
+
+    def _decode_batch(self, logits, frame_lengths):
+        ids = logits.argmax(dim=-1) if logits.dim() == 3 else logits
+        batch, frames = ids.shape
+        device = ids.device
+        if frame_lengths is None:
+            lengths = torch.full((batch,), frames, device=device)
+        else:
+            lengths = torch.as_tensor(frame_lengths, device=device)
+
+        valid = torch.arange(frames, device=device).unsqueeze(0) < lengths.unsqueeze(1)
+        run_start = torch.ones_like(ids, dtype=torch.bool)
+        run_start[:, 1:] = ids[:, 1:] != ids[:, :-1]
+        rows, starts = (run_start & valid).nonzero(as_tuple=True)
+
+        # Each run ends where the next run in the same row starts, or at the row length
+        ends = lengths[rows].clone()
+        same_row = rows[1:] == rows[:-1]
+        ends[:-1] = torch.where(same_row, starts[1:], ends[:-1])
+
+        tokens = ids[rows, starts]
+        kept = self._keep.to(device)[tokens]
+        rows, starts, ends, tokens = rows[kept], starts[kept], ends[kept], tokens[kept]
+
+        decoded = [[] for _ in range(batch)]
+        for row, token, start, end in zip(rows.tolist(), tokens.tolist(), starts.tolist(), ends.tolist()):
+            decoded[row].append((self.labels[token], start, end))
+        return decoded
+
+    def to_text(self, spans):
+        """
+        Joins decoded tokens of one item into a string.
+        """
+        if self.word_delimiter is None:
+            return " ".join(token for token, _, _ in spans)
+        text = "".join(" " if token == self.word_delimiter else token for token, _, _ in spans).strip()
+        return self.clean_up(text) if self.clean_up else text
+
+    def decode_text(self, logits, frame_lengths=None):
+        return [self.to_text(spans) for spans in self.decode(logits, frame_lengths)]
+
+    def to_seconds(self, spans):
+        """
+        Converts frame spans to (token, start_seconds, end_seconds).
+        """
+        return [(token, start * self.frame_seconds, end * self.frame_seconds) for token, start, end in spans]
+
+
+class LexiconTrie:
+    def __init__(self, sequences, labels):
+        """
+        Prefix tree over the token sequences of a word bank (phoneme
+        pronunciations or spellings), in the output ids of a CTC model.
+
+        Args:
+            sequences: Token-string sequences, one per pronunciation
+            labels (list[str]): Token string for every output id
+
+        Tokens are matched case-insensitively. Sequences using a token the
+        model cannot emit are left out, and those tokens collected in missing.
+        """
+        index = {}
+        for token_id, label in enumerate(labels):
+            index.setdefault(label.upper(), token_id)
+
+        self.children = [{}]
+        self.word_end = [True]  # the root: between words
+        self.num_words = 0
+        self.missing = set()
+        self._tables = {}
+
+        for sequence in sequences:
+            ids = [index.get(token.upper()) for token in sequence]
+            if not ids:
+                continue
+            if None in ids:
+                self.missing.update(token for token, i in zip(sequence, ids) if i is None)
+                continue
+            node = 0
+            for token_id in ids:
+                child = self.children[node].get(token_id)
+                if child is None:
+                    child = len(self.children)
+                    self.children[node][token_id] = child
+                    self.children.append({})
+                    self.word_end.append(False)
+                node = child
+            self.word_end[node] = True
+            self.num_words += 1
+
+    @classmethod
+    def from_lexicon(cls, lexicon, labels, words=None):
+        """
+        Trie of the pronunciations of words (default: every lexicon entry),
+        for phone recognizers.
+        """
+        pronunciations = _pronunciations(lexicon)
+        if words is not None:
+            wanted = {word.lower() for word in words}
+            pronunciations = {word: prons for word, prons in pronunciations.items() if word in wanted}
+        return cls([pron for prons in pronunciations.values() for pron in prons], labels)
+
+    @classmethod
+    def from_spellings(cls, words, labels):
+        """
+        Trie of the spellings of words, for character models.
+        """
+        return cls([list(word) for word in words], labels)
+
+    def transitions(self, vocab_size, delimiter_id=None, open_vocabulary=False):
+        """
+        Dense [nodes + 1, vocab] table of the node reached by emitting each
+        token, -1 where the lexicon does not allow it. The extra last row is
+        the out-of-lexicon state used when open_vocabulary is set.
+
+        A word may follow a complete word directly (phone models) or after
+        delimiter_id (character models). Continuing the current word takes
+        precedence over starting a new one with the same token.
+        """
+        key = (vocab_size, delimiter_id, open_vocabulary)
+        if key in self._tables:
+            return self._tables[key]
+
+        oov = len(self.children)
+        roots = self.children[0]
+        table = np.full((oov + 1, vocab_size), oov if open_vocabulary else -1, dtype=np.int64)
+        for node, children in enumerate(self.children):
+            if self.word_end[node]:
+                if delimiter_id is None:
+                    for token_id, child in roots.items():
+                        table[node, token_id] = child
+                else:
+                    table[node, delimiter_id] = 0
+            for token_id, child in children.items():
+                table[node, token_id] = child
+
+        if open_vocabulary:
+            # Outside the lexicon, a bank word can start again at the next boundary
+            if delimiter_id is None:
+                for token_id, child in roots.items():
+                    table[oov, token_id] = child
+            else:
+                table[oov, delimiter_id] = 0
+        else:
+            table[oov] = -1
+
+        self._tables[key] = table
+        return table
+
+
+class CTCBeamDecoder(CTCDecoder):
+    def __init__(self, labels, blank_id, skip_tokens=(), word_delimiter=None, frame_seconds=0.02, clean_up=None,
+                 beam_width=16, token_min_logprob=-8.0, lexicon_weight=2.0, constrain=False):
+        """
+        CTC prefix beam search over log-probabilities, optionally guided by
+        a LexiconTrie of the words expected in the recording.
+
+        Args:
+            beam_width (int): Prefixes kept per frame
+            token_min_logprob (float): Tokens less likely than this in a frame
+                are not considered as extensions there
+            lexicon_weight (float): Log-score penalty for each token that leaves
+                the trie (biasing toward bank words). Penalizing the way out
+                rather than rewarding the way in avoids favoring insertions.
+            constrain (bool): Only allow outputs made entirely of trie words
+
+        Other arguments are as for CTCDecoder.
+        """
+        super().__init__(labels, blank_id, skip_tokens, word_delimiter, frame_seconds, clean_up)
+        self._configure(beam_width, token_min_logprob, lexicon_weight, constrain)
+
+    @classmethod
+    def from_decoder(cls, decoder, **options):
+        """
+        Beam search decoder over the same vocabulary as a greedy CTCDecoder.
+        """
+        beam = cls.__new__(cls)
+        beam.__dict__.update(decoder.__dict__)
+        beam._configure(**options)
+        return beam
+
+    def _configure(self, beam_width=16, token_min_logprob=-8.0, lexicon_weight=2.0, constrain=False):
+        self.beam_width = beam_width
+        self.token_min_logprob = token_min_logprob
+        self.lexicon_weight = lexicon_weight
+        self.constrain = constrain
+        self._keep_np = self._keep.numpy()
+        self._delimiter_id = self.labels.index(self.word_delimiter) if self.word_delimiter in self.labels else None
+
+    def lexicon_trie(self, words, lexicon=None):
+        """
+        Trie of a word bank in this decoder's vocabulary: pronunciations from
+        lexicon for phone models, spellings for character models.
+        """
+        if lexicon is not None:
+            trie = LexiconTrie.from_lexicon(lexicon, self.labels, words)
+        elif self.word_delimiter is not None:
+            trie = LexiconTrie.from_spellings(words, self.labels)
+        else:
+            raise ValueError("A lexicon is required to map words to phonemes for a phone model")
+        if trie.num_words == 0:
+            raise ValueError(f"No bank word can be spelled with the model's tokens (missing: {sorted(trie.missing)})")
+        return trie
+
+    def _tables(self, trie):
+        """
+        Transition table, per-transition score adjustment and which states may
+        end an utterance. Without a trie, a single state allows every token.
+        """
+        vocab_size = len(self.labels)
+        if trie is None:
+            return np.zeros((1, vocab_size), dtype=np.int64), np.zeros((1, vocab_size)), np.ones(1, dtype=bool)
+
+        table = trie.transitions(vocab_size, self._delimiter_id, open_vocabulary=not self.constrain)
+        oov = len(trie.children)
+        penalty = np.where(table == oov, -self.lexicon_weight, 0.0)
+        final = np.array(trie.word_end + [not self.constrain])
+        return table, penalty, final
+
+    def decode(self, logits, frame_lengths=None, trie=None):
+        """
+        Decodes a batch into tokens with their frame spans.
+
+        Args:
+            logits: [batch, frames, vocab] logits
+            frame_lengths (list[int]): Valid frames per item (default: all)
+            trie (LexiconTrie): Words to bias toward, or with constrain, to
+                restrict the output to
+
+        Returns:
+            list[list[tuple[str, int, int]]]: Per item, (token, start_frame,
+            end_frame) where a token runs from the frame it was first emitted
+            until the next token starts.
+        """
+        if logits.dim() != 3:
+            raise ValueError("Beam search needs [batch, frames, vocab] logits, not argmax ids")
+        with span("ctc.beam_decode", items=len(logits), beam_width=self.beam_width):
+            log_probs = torch.log_softmax(logits.float(), dim=-1).cpu().numpy()
+            batch, frames, _ = log_probs.shape
+            lengths = [frames] * batch if frame_lengths is None else list(frame_lengths)
+            tables = self._tables(trie)
+
+            return [self._search(log_probs[row, :length], *tables) for row, length in enumerate(lengths)]
+
+    def decode_text(self, logits, frame_lengths=None, trie=None):
+        return [self.to_text(spans) for spans in self.decode(logits, frame_lengths, trie)]
+
+    def _search(self, log_probs, table, penalty, final):
+        beam_width = self.beam_width
+        blank = self.blank_id
+
+        # Hypotheses share storage as a tree: prefix i is tokens[i] appended to parents[i]
+        parents, tokens, starts = [-1], [-1], [0]
+        children = {}
+
+        # Live beams: prefix id, lexicon state, last token, and log-probabilities
+        # of the prefix ending in blank (pb) or in its last token (pnb)
+        prefix = np.zeros(1, dtype=np.int64)
+        state = np.zeros(1, dtype=np.int64)
+        last = np.full(1, -1, dtype=np.int64)
+        pb = np.zeros(1)
+        pnb = np.full(1, -np.inf)
+
+        for frame, lp in enumerate(log_probs):
+            total = np.logaddexp(pb, pnb)
+
+            # Prefix unchanged: a blank, or a repeat of the last token
+            stay_pb = total + lp[blank]
+            stay_pnb = np.where(last >= 0, pnb + lp[np.maximum(last, 0)], -np.inf)
+
+            next_prefix, next_state, next_last = prefix.tolist(), state.tolist(), last.tolist()
+            next_pb, next_pnb = stay_pb.tolist(), stay_pnb.tolist()
+
+            candidates = np.flatnonzero(self._keep_np & (lp > self.token_min_logprob))
+            if len(candidates) > beam_width:
+                candidates = candidates[np.argpartition(lp[candidates], -beam_width)[-beam_width:]]
+
+            if len(candidates):
+                # Extend every beam by every candidate; a repeated token needs a blank in between
+                dest = table[state[:, None], candidates[None, :]]
+                base = np.where(candidates[None, :] == last[:, None], pb[:, None], total[:, None])
+                scores = base + lp[candidates] + penalty[state[:, None], candidates[None, :]]
+                scores[dest < 0] = -np.inf
+
+                k = min(beam_width, scores.size)
+                top = np.argpartition(scores, -k, axis=None)[-k:]
+                top = top[np.isfinite(scores.ravel()[top])]
+                rows, cols = np.unravel_index(top, scores.shape)
+
+                merged = {(p, s): i for i, (p, s) in enumerate(zip(next_prefix, next_state))}
+                for row, col, score in zip(rows.tolist(), cols.tolist(), scores[rows, cols].tolist()):
+                    token = int(candidates[col])
+                    child = children.get((next_prefix[row], token))
+                    if child is None:
+                        child = len(parents)
+                        children[(next_prefix[row], token)] = child
+                        parents.append(next_prefix[row])
+                        tokens.append(token)
+                        starts.append(frame)
+
+                    key = (child, int(dest[row, col]))
+                    i = merged.get(key)
+                    if i is None:
+                        merged[key] = len(next_pb)
+                        next_prefix.append(child)
+                        next_state.append(key[1])
+                        next_last.append(token)
+                        next_pb.append(-np.inf)
+                        next_pnb.append(score)
+                    else:
+                        next_pnb[i] = np.logaddexp(next_pnb[i], score)
+
+            prefix, state, last = np.array(next_prefix), np.array(next_state), np.array(next_last)
+            pb, pnb = np.array(next_pb), np.array(next_pnb)
+            if len(pb) > beam_width:
+                keep = np.argpartition(np.logaddexp(pb, pnb), -beam_width)[-beam_width:]
+                prefix, state, last, pb, pnb = prefix[keep], state[keep], last[keep], pb[keep], pnb[keep]
+
+        total = np.logaddexp(pb, pnb)
+        allowed = final[state]
+        if allowed.any():
+            total = np.where(allowed, total, -np.inf)
+        best = int(prefix[np.argmax(total)])
+
+        emitted = []
+        while best > 0:
+            emitted.append((tokens[best], starts[best]))
+            best = parents[best]
+        emitted.reverse()
+
+        ends = [start for _, start in emitted[1:]] + [len(log_probs)]
+        return [(self.labels[token], start, end) for (token, start), end in zip(emitted, ends)]
+
+
+class AlignedPhone:
+    """
+    One reference phone placed in time by forced alignment.
+
+    log_posterior is the phone's mean log-probability over its frames. gop
+    (goodness of pronunciation) is its mean log-probability ratio against the
+    most likely phone in each frame: 0 when it was the best phone throughout,
+    more negative the more another phone was preferred. best is the phone
+    most likely over the same frames.
+    """
+    __slots__ = ("phone", "start", "end", "log_posterior", "gop", "best")
+
+    def __init__(self, phone: str, start: float, end: float, log_posterior: float, gop: float, best: str):
+        self.phone = phone
+        self.start = start
+        self.end = end
+        self.log_posterior = log_posterior
+        self.gop = gop
+        self.best = best
+
+    def correct(self, threshold: float = -1.0) -> bool:
+        return self.gop >= threshold
+
+    def __repr__(self):
+        return (f"AlignedPhone({self.phone!r}, {self.start:.2f}-{self.end:.2f} s, "
+                f"gop={self.gop:.2f}, best={self.best!r})")
+
+
+class CTCForcedAligner(CTCDecoder):
+    def __init__(self, labels, blank_id, skip_tokens=(), word_delimiter=None, frame_seconds=0.02, clean_up=None,
+                 band=100):
+        """
+        CTC forced alignment: the most likely (Viterbi) path of a known token
+        sequence through the log-probabilities of a CTC model.
+
+        Clips are aligned together as one batch, frame by frame. With band,
+        each frame only considers states within band states of the diagonal
+        from the first to the last reference token, so back-pointers take
+        frames x (2 * band + 1) bytes instead of frames x states. A clip with no
+        path inside the band is realigned with a four times wider one; a narrow
+        band can also settle for a slightly worse path than the full search.
+
+        Args:
+            band (int): Half-width of the search band in CTC states (two per
+                token); None searches every state in every frame
+
+        Other arguments are as for CTCDecoder.
+        """
+        super().__init__(labels, blank_id, skip_tokens, word_delimiter, frame_seconds, clean_up)
+        self._configure(band)
+
+    @classmethod
+    def from_decoder(cls, decoder, **options):
+        """
+        Forced aligner over the same vocabulary as a greedy CTCDecoder.
+        """
+        aligner = cls.__new__(cls)
+        aligner.__dict__.update(decoder.__dict__)
+        aligner._configure(**options)
+        return aligner
+
+    def _configure(self, band=100):
+        self.band = band
+        self._index = {}
+        for token_id, label in enumerate(self.labels):
+            if self._keep[token_id]:
+                self._index.setdefault(label.upper(), token_id)
+
+    def token_ids(self, tokens):
+        """
+        Output ids of reference tokens, matched case-insensitively.
+        """
+        missing = sorted({token for token in tokens if token.upper() not in self._index})
+        if missing:
+            raise ValueError(f"The model cannot emit reference token(s) {missing}")
+        return [self._index[token.upper()] for token in tokens]
+
+    def align(self, logits, references, frame_lengths=None):
+        """
+        Aligns each item of a batch to its reference tokens.
+
+        Args:
+            logits: [batch, frames, vocab] logits
+            references: Per item, the reference tokens (e.g. ARPAbet phonemes)
+            frame_lengths (list[int]): Valid frames per item (default: all)
+
+        Returns:
+            list[list[AlignedPhone]]: Per item, one AlignedPhone per reference
+            token, or None when the clip has too few frames for its reference
+        """
+        if logits.dim() != 3:
+            raise ValueError("Forced alignment needs [batch, frames, vocab] logits, not argmax ids")
+        with span("ctc.forced_align", items=len(logits), band=self.band):
+            log_probs = torch.log_softmax(logits.float(), dim=-1).cpu().numpy()
+            batch, frames, _ = log_probs.shape
+            lengths = [frames] * batch if frame_lengths is None else [int(length) for length in frame_lengths]
+            targets = [self.token_ids(reference) for reference in references]
+
+            paths = [None] * batch
+            pending, band = list(range(batch)), self.band
+            while pending:
+                found = self._viterbi(log_probs[pending], [targets[i] for i in pending],
+                                      [lengths[i] for i in pending], band)
+                for i, path in zip(pending, found):
+                    paths[i] = path
+                longest = max(2 * len(targets[i]) + 1 for i in pending)
+                if band is None or 2 * band + 1 >= longest:
+                    break
+                pending = [i for i in pending if paths[i] is None]
+                band = band * 4 if 8 * band + 1 < longest else None
+
+            return [None if path is None else self._phones(log_probs[i, :lengths[i]], targets[i], path)
+                    for i, path in enumerate(paths)]
+
+    def _viterbi(self, log_probs, targets, frame_lengths, band):
+        """
+        Best path per item as an array of CTC states (even: blank, odd:
+        reference token (state - 1) // 2), or None when there is none.
+        """
+        batch, frames, vocab = log_probs.shape
+        num_states = np.array([2 * len(target) + 1 for target in targets])
+        lengths = np.array(frame_lengths)
+        states = int(num_states.max())
+        rows = np.arange(batch)[:, None]
+
+        # Extended reference: blank, token, blank, token, ..., blank
+        extended = np.full((batch, states), self.blank_id, dtype=np.int64)
+        for row, target in enumerate(targets):
+            extended[row, 1:2 * len(target):2] = target
+        # A token may be entered from two states back unless it repeats the previous token
+        skip = np.zeros((batch, states), dtype=bool)
+        skip[:, 2:] = (extended[:, 2:] != self.blank_id) & (extended[:, 2:] != extended[:, :-2])
+
+        width = states if band is None else min(states, 2 * band + 1)
+        offsets = np.arange(width)
+        last_low = np.maximum(num_states - width, 0)
+        span_frames = np.maximum(lengths - 1, 1)
+
+        # Scores of the previous frame, with two -inf columns in front for the moves into states 0 and 1.
+        # Band cells are read and written through flat indices, which is much faster than 2-D fancy indexing.
+        alpha = np.full((batch, states + 2), -np.inf)
+        alpha_base, state_base, vocab_base = rows * (states + 2) + 2, rows * states, rows * vocab
+        pointers = np.zeros((frames, batch, width), dtype=np.int8)
+        lows = np.zeros((frames, batch), dtype=np.int64)
+        for frame in range(frames):
+            if band is None:
+                low = np.zeros(batch, dtype=np.int64)
+            else:
+                low = np.minimum(np.maximum(frame * (num_states - 1) // span_frames - band, 0), last_low)
+            index = low[:, None] + offsets
+            cells, flat = alpha_base + index, state_base + index
+            emission = log_probs[:, frame].take(extended.take(flat) + vocab_base)
+
+            if frame == 0:
+                best = np.where(index <= 1, 0.0, -np.inf)
+                pointer = 0
+            else:
+                stay, step = alpha.take(cells), alpha.take(cells - 1)
+                jump = np.where(skip.take(flat), alpha.take(cells - 2), -np.inf)
+                best = np.maximum(np.maximum(stay, step), jump)
+                pointer = np.where(stay == best, 0, np.where(step == best, 1, 2))
+
+            score = np.where(index < num_states[:, None], best + emission, -np.inf)
+            updated = np.full_like(alpha, -np.inf)
+            np.put(updated, cells, score)
+            alpha = np.where((frame < lengths)[:, None], updated, alpha)
+            pointers[frame] = pointer
+            lows[frame] = low
+
+        # The path ends in the last token or the blank after it
+        ends = np.stack([alpha[rows[:, 0], num_states + 1], alpha[rows[:, 0], num_states]], axis=-1)
+        final_score = ends.max(axis=-1)
+        state = num_states - 1 - ends.argmax(axis=-1)
+
+        path = np.zeros((batch, frames), dtype=np.int64)
+        for frame in range(frames - 1, -1, -1):
+            active = frame < lengths
+            path[active, frame] = state[active]
+            if frame:
+                move = pointers[frame, rows[:, 0], np.clip(state - lows[frame], 0, width - 1)]
+                state = np.where(active, state - move, state)
+
+        return [path[row, :lengths[row]] if np.isfinite(final_score[row]) and lengths[row] else None
+                for row in range(batch)]
+
+    def _phones(self, log_probs, target, path):
+        """
+        Times and goodness-of-pronunciation scores of each reference token
+        along an alignment path.
+        """
+        if not target:
+            return []
+        frames = np.flatnonzero(path % 2 == 1)
+        tokens = path[frames] // 2
+        _, firsts = np.unique(tokens, return_index=True)
+        lasts = np.append(firsts[1:], len(frames)) - 1
+
+        emitted = log_probs[frames][:, self._keep.numpy()]
+        emitted_ids = np.flatnonzero(self._keep.numpy())
+        target_lp = log_probs[frames, np.asarray(target)[tokens]]
+        counts = lasts - firsts + 1
+        log_posterior = np.add.reduceat(target_lp, firsts) / counts
+        gop = np.add.reduceat(target_lp - emitted.max(axis=1), firsts) / counts
+        best = emitted_ids[np.add.reduceat(emitted, firsts, axis=0).argmax(axis=1)]
+
+        return [AlignedPhone(self.labels[token_id], frames[first] * self.frame_seconds,
+                             (frames[last] + 1) * self.frame_seconds, float(lp), float(g), self.labels[b])
+                for token_id, first, last, lp, g, b in zip(target, firsts, lasts, log_posterior, gop, best)]
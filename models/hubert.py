@@ -4,16 +4,24 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 import torch
-import torchaudio
-import soundfile as sf
 from transformers import HubertForCTC, Wav2Vec2Processor
+from models.ctc import CTCBeamDecoder, CTCDecoder, ctc_logit_batches
+from models.inference import get_inference_mode, optimize_model
+from models.registry import registry
+from utils.alignment import parse_vocab_set
+from utils.audio import load_audio
+from utils.batching import load_concurrently
 from utils.metrics import compute_wer, compute_cer
+from utils.tracing import span
 
 
 class HubertTranscriber:
-    def __init__(self, model_name="facebook/hubert-large-ls960-ft", device=None):
+    def __init__(self, model_name="facebook/hubert-large-ls960-ft", device=None, inference_mode=None):
         """
         Initialize HuBERT model + processor.
+
+        inference_mode: One of models.inference.INFERENCE_MODES (default:
+        BAIR_INFERENCE_MODE, else fp32)
         """
 
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
@@ -26,54 +34,103 @@ class HubertTranscriber:
 
         self.model.eval()
 
+        self.decoder = CTCDecoder.from_model(self.model, self.processor)
+
+        self.inference_mode = inference_mode or get_inference_mode("hubert")
+        self.model = optimize_model(self.model, self.inference_mode, name="hubert",
+                                    attention_mask=self.processor.feature_extractor.return_attention_mask)
+
     def _load_audio(self, audio_path):
         """
         Loads and resamples audio to 16kHz mono.
         """
-        speech, sr = sf.read(audio_path)
+        return load_audio(audio_path)
 
-        if not isinstance(speech, torch.Tensor):
-            speech = torch.tensor(speech)
+    def _decode(self, logits, frame_lengths=None, beam_width=None, vocab_set=None):
+        """
+        Greedy decoding by default; with beam_width, prefix beam search biased
+        toward the spellings of the words in vocab_set.
+        """
+        if not beam_width:
+            return self.decoder.decode_text(logits, frame_lengths)
+        decoder = CTCBeamDecoder.from_decoder(self.decoder, beam_width=beam_width)
+        trie = decoder.lexicon_trie(parse_vocab_set(vocab_set)) if vocab_set else None
+        return decoder.decode_text(logits, frame_lengths, trie)
 
-        # Stereo → mono
-        if len(speech.shape) > 1:
-            speech = torch.mean(speech, dim=1)
+    def transcribe(self, audio_path, beam_width=None, vocab_set=None):
+        """
+        Transcribe audio file using HuBERT.
+        """
+        return self.transcribe_waveform(self._load_audio(audio_path), beam_width, vocab_set)
 
-        # Resample if needed
-        if sr != 16000:
-            resampler = torchaudio.transforms.Resample(sr, 16000)
-            speech = resampler(speech)
+    def transcribe_waveform(self, speech, beam_width=None, vocab_set=None):
+        """
+        Transcribe an already decoded 16 kHz mono waveform using HuBERT.
+        """
+        audio_seconds = len(speech) / 16000
+        with span("hubert.features", audio_seconds=audio_seconds):
+            inputs = self.processor(
+                speech,
+                sampling_rate=16000,
+                return_tensors="pt",
+                padding=True
+            ).to(self.device)
+
+        with span("hubert.inference", audio_seconds=audio_seconds), torch.no_grad():
+            logits = self.model(**inputs).logits
 
-        return speech.numpy()
+        transcription = self._decode(logits, beam_width=beam_width, vocab_set=vocab_set)[0]
 
-    def transcribe(self, audio_path):
+        return transcription
+
+    def transcribe_batch(self, audio_paths, batch_size=8, num_workers=4, beam_width=None, vocab_set=None):
         """
-        Transcribe audio file using HuBERT.
+        Transcribe many audio files using HuBERT.
+
+        Audio is loaded on a thread pool, clips are grouped by length to
+        minimize padding, and each group runs as one padded forward pass.
+
+        Args:
+            audio_paths (list[str]): Paths to audio files
+            batch_size (int): Maximum clips per forward pass
+            num_workers (int): Threads used to load audio
+            beam_width (int): Use CTC prefix beam search with this many beams
+            vocab_set (str): Word bank to bias the beam search toward
+
+        Returns:
+            list[str]: Transcriptions in input order
         """
-        speech = self._load_audio(audio_path)
+        speeches = load_concurrently(self._load_audio, audio_paths, num_workers)
 
-        inputs = self.processor(
-            speech,
-            sampling_rate=16000,
-            return_tensors="pt",
-            padding=True
-        ).to(self.device)
+        transcriptions = [None] * len(speeches)
+        batches = ctc_logit_batches(self.model, self.processor, speeches, batch_size, self.device)
+        for indices, logits, frame_lengths in batches:
+            texts = self._decode(logits, frame_lengths, beam_width, vocab_set)
+            for i, text in zip(indices, texts):
+                transcriptions[i] = text
 
-        with torch.no_grad():
-            logits = self.model(**inputs).logits
+        return transcriptions
 
-        predicted_ids = torch.argmax(logits, dim=-1)
-        transcription = self.processor.batch_decode(predicted_ids)[0]
 
-        return transcription
+registry.register("hubert", HubertTranscriber)
 
 
 # Convenience wrapper
 def transcribe_with_hubert(audio_path):
-    transcriber = HubertTranscriber()
+    transcriber = registry.get("hubert")
     return transcriber.transcribe(audio_path)
 
 
+def transcribe_waveform_with_hubert(speech):
+    transcriber = registry.get("hubert")
+    return transcriber.transcribe_waveform(speech)
+
+
+def transcribe_batch_with_hubert(audio_paths, batch_size=8):
+    transcriber = registry.get("hubert")
+    return transcriber.transcribe_batch(audio_paths, batch_size=batch_size)
+
+
 # Optional: allow running directly
 if __name__ == "__main__":
     task = "multitudes_WRE_grizzlybear_short"
@@ -1,54 +1,150 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
 import torch
-import torchaudio
 from transformers import Wav2Vec2Processor, Wav2Vec2ForCTC, WavLMForCTC
-import soundfile as sf
+from models.ctc import CTCBeamDecoder, CTCDecoder, CTCForcedAligner, ctc_logit_batches
+from models.inference import get_inference_mode, optimize_model
+from models.registry import registry
+from utils.alignment import parse_vocab_set
+from utils.audio import load_audio
+from utils.batching import load_concurrently
+from utils.tracing import span
 
 repo_id = "huper29/huper_recognizer"
-processor = Wav2Vec2Processor.from_pretrained(repo_id)
-model = WavLMForCTC.from_pretrained(repo_id)
-model.eval()
+SPECIAL_TOKENS = {"<PAD>", "<UNK>", "<BOS>", "<EOS>", "|"}
 
 
-def transcribe_audio(audio_path: str) -> str:
+def load_huper(inference_mode=None):
+    """
+    Loads the HuPER WavLM recognizer, its processor and a greedy phone decoder.
+    Called once by the model registry. inference_mode is one of
+    models.inference.INFERENCE_MODES (default: BAIR_INFERENCE_MODE, else fp32).
+    """
+    print("Loading model:", repo_id)
+    processor = Wav2Vec2Processor.from_pretrained(repo_id)
+    model = WavLMForCTC.from_pretrained(repo_id)
+    model.eval()
+    decoder = CTCDecoder.from_model(model, processor, skip_tokens=SPECIAL_TOKENS, use_id2label=True)
+    model = optimize_model(model, inference_mode or get_inference_mode("huper"), name="huper",
+                           attention_mask=processor.feature_extractor.return_attention_mask)
+    return model, processor, decoder
+
+
+registry.register("huper", load_huper)
+
+
+def transcribe_audio(audio_path: str, return_spans: bool = False, beam_width: int = None,
+                     vocab_set: str = None, lexicon=None, constrain: bool = False):
     """
     Transcribe an audio file to phonemes using the Huper WavLM model.
 
     Args:
         audio_path (str): Path to the audio file.
+        return_spans (bool): Also return when each phoneme was emitted.
+        beam_width (int): Use CTC prefix beam search with this many beams
+            instead of greedy decoding.
+        vocab_set (str): Word or letter bank to bias the beam search toward;
+            needs lexicon ({word: pronunciation(s)}, e.g. LETTER_LEXICON).
+        constrain (bool): Only output phonemes of bank words.
 
     Returns:
-        str: Space-separated string of predicted phonemes.
+        str: Space-separated string of predicted phonemes. With return_spans,
+        (phonemes, spans) where spans lists (phoneme, start_seconds, end_seconds).
     """
+    return transcribe_waveform(load_audio(audio_path), return_spans, beam_width, vocab_set, lexicon, constrain)
 
-    waveform, sr = sf.read(audio_path)
-    waveform = torch.tensor(waveform, dtype=torch.float32)
 
-    if waveform.ndim > 1:
-        waveform = waveform.mean(dim=1, keepdim=True)  # shape: [samples, 1]
+def transcribe_waveform(waveform, return_spans: bool = False, beam_width: int = None,
+                        vocab_set: str = None, lexicon=None, constrain: bool = False):
+    """
+    transcribe_audio for an already decoded 16 kHz mono waveform.
+    """
+    model, processor, decoder = registry.get("huper")
+
+    audio_seconds = len(waveform) / 16000
+    with span("huper.features", audio_seconds=audio_seconds):
+        inputs = processor(waveform, sampling_rate=16000, return_tensors="pt")
+    with span("huper.inference", audio_seconds=audio_seconds), torch.no_grad():
+        logits = model(**inputs).logits
 
-    waveform = waveform.T  # shape: [1, samples]
+    if beam_width:
+        decoder = CTCBeamDecoder.from_decoder(decoder, beam_width=beam_width, constrain=constrain)
+        trie = decoder.lexicon_trie(parse_vocab_set(vocab_set), lexicon) if vocab_set else None
+        spans = decoder.decode(logits, trie=trie)[0]
+    else:
+        spans = decoder.decode(logits)[0]
+    phonemes = decoder.to_text(spans)
 
-    if sr != 16000:
-        resampler = torchaudio.transforms.Resample(sr, 16000)
-        waveform = resampler(waveform)
+    if return_spans:
+        return phonemes, decoder.to_seconds(spans)
+    return phonemes
 
-    inputs = processor(waveform.squeeze().numpy(), sampling_rate=16000, return_tensors="pt")
-    with torch.no_grad():
-        logits = model(**inputs).logits
 
-    pred_ids = torch.argmax(logits, dim=-1)[0].tolist()
-    blank_id = processor.tokenizer.pad_token_id
+def transcribe_batch(audio_paths, batch_size: int = 8, num_workers: int = 4):
+    """
+    Transcribe many audio files to phonemes with greedy decoding.
+
+    Audio is loaded on a thread pool, clips are grouped by length to
+    minimize padding, and each group runs as one padded forward pass.
 
-    phone_tokens = []
-    prev = None
-    for token_id in pred_ids:
-        if token_id != blank_id and token_id != prev:
-            token = model.config.id2label.get(token_id, processor.tokenizer.convert_ids_to_tokens(token_id))
-            if token not in {"<PAD>", "<UNK>", "<BOS>", "<EOS>", "|"}:
-                phone_tokens.append(token)
-        prev = token_id
+    Args:
+        audio_paths (list[str]): Paths to audio files
+        batch_size (int): Maximum clips per forward pass
+        num_workers (int): Threads used to load audio
 
-    return " ".join(phone_tokens)
+    Returns:
+        list[str]: Space-separated phonemes per file, in input order
+    """
+    model, processor, decoder = registry.get("huper")
+    speeches = load_concurrently(load_audio, audio_paths, num_workers)
+
+    transcriptions = [None] * len(speeches)
+    for indices, logits, frame_lengths in ctc_logit_batches(model, processor, speeches, batch_size):
+        for i, text in zip(indices, decoder.decode_text(logits, frame_lengths)):
+            transcriptions[i] = text
+    return transcriptions
+
+
+def align_waveforms(waveforms, references, batch_size: int = 8, band: int = 100):
+    """
+    Forced alignment of known phonemes to 16 kHz mono waveforms.
+
+    Instead of recognizing what was said, finds where each reference phoneme
+    was said and how well it matches (goodness of pronunciation), from the
+    same single forward pass. Clips are run and aligned in padded batches.
+
+    Args:
+        waveforms: 1-D float arrays sampled at 16 kHz
+        references: Per waveform, the expected phonemes as a list or a
+            space-separated string
+        batch_size (int): Maximum clips per forward pass
+        band (int): Viterbi search band in CTC states (None: unbanded),
+            see models.ctc.CTCForcedAligner
+
+    Returns:
+        list[list[AlignedPhone]]: Per waveform, one AlignedPhone per reference
+        phoneme (times in seconds), or None when the clip is too short for it
+    """
+    model, processor, decoder = registry.get("huper")
+    aligner = CTCForcedAligner.from_decoder(decoder, band=band)
+    references = [reference.split() if isinstance(reference, str) else list(reference) for reference in references]
+
+    alignments = [None] * len(waveforms)
+    for indices, logits, frame_lengths in ctc_logit_batches(model, processor, waveforms, batch_size):
+        found = aligner.align(logits, [references[i] for i in indices], frame_lengths)
+        for i, phones in zip(indices, found):
+            alignments[i] = phones
+    return alignments
+
+
+def align_audio(audio_path: str, reference, band: int = 100):
+    """
+    Forced alignment of reference phonemes to an audio file (see align_waveforms).
+    """
+    return align_waveforms([load_audio(audio_path)], [reference], band=band)[0]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,174 @@
+import hashlib
+import os
+from pathlib import Path
+from types import SimpleNamespace
+
+import torch
+
+# fp32: eager PyTorch (the default). int8: dynamic int8 quantization of
+# Linear layers. compile: torch.compile. torchscript / onnx: the CTC forward
+# pass traced to TorchScript or exported to ONNX Runtime.
+INFERENCE_MODES = ("fp32", "int8", "compile", "torchscript", "onnx")
+
+# Modes that replace the model with a traced graph of its forward pass, so
+# they cannot run Whisper's generate()
+EXPORT_MODES = ("torchscript", "onnx")
+
+# e.g. "int8" for every backend, or "int8,whisper=compile" to override one
+MODE_ENV = "BAIR_INFERENCE_MODE"
+ONNX_DIR_ENV = "BAIR_ONNX_DIR"
+DEFAULT_ONNX_DIR = "~/.cache/bair/onnx"
+
+
+def get_inference_mode(backend: str) -> str:
+    """
+    The inference mode configured for a backend in BAIR_INFERENCE_MODE
+    (default: fp32).
+    """
+    mode, overrides = "fp32", {}
+    for part in os.environ.get(MODE_ENV, "").split(","):
+        name, _, value = part.strip().rpartition("=")
+        if not value:
+            continue
+        if name:
+            overrides[name] = value
+        else:
+            mode = value
+    mode = overrides.get(backend, mode)
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"Unknown inference mode for {backend}: {mode} (expected one of {', '.join(INFERENCE_MODES)})")
+    return mode
+
+
+def optimize_model(model, mode: str, name: str = "model", attention_mask: bool = True, generate: bool = False):
+    """
+    Prepares a model for CPU inference in the given mode.
+
+    Args:
+        model: HuggingFace model in eval mode
+        mode (str): One of INFERENCE_MODES
+        name (str): Backend name, used for the exported ONNX file
+        attention_mask (bool): Whether the model is called with an attention
+            mask (the processor's return_attention_mask); fixes the inputs of
+            the traced graph
+        generate (bool): The model is used through generate() (Whisper),
+            which only int8 and compile support
+
+    Returns:
+        A model called like the original: int8 and compile return the
+        (modified) HuggingFace model; torchscript and onnx return an
+        ExportedCTCModel.
+    """
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"Unknown inference mode: {mode}")
+    if mode == "fp32":
+        return model
+    if next(model.parameters()).device.type != "cpu":
+        raise ValueError(f"The {mode} inference mode is for CPU; {name} is on {next(model.parameters()).device}")
+    if generate and mode in EXPORT_MODES:
+        raise ValueError(f"{name} decodes with generate(), which {mode} does not support; use int8 or compile")
+
+    if mode == "int8":
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    if mode == "compile":
+        # Compiling forward (not wrapping the module) keeps generate(), config
+        # and the helper methods the decoders use
+        model.forward = torch.compile(model.forward, dynamic=True)
+        return model
+    return ExportedCTCModel(model, mode, name, attention_mask)
+
+
+class _Logits(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_values, attention_mask=None):
+        return self.model(input_values, attention_mask=attention_mask).logits
+
+
+def model_digest(model) -> str:
+    """
+    Short hash of a model's config and weights, identifying its exported graph.
+    """
+    digest = hashlib.sha256(model.config.to_json_string().encode())
+    for key, tensor in model.state_dict().items():
+        digest.update(key.encode())
+        digest.update(tensor.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy())
+    return digest.hexdigest()[:16]
+
+
+class ExportedCTCModel:
+    def __init__(self, model, mode: str, name: str, attention_mask: bool = True):
+        """
+        A *ForCTC model's forward pass traced to TorchScript or exported to
+        ONNX Runtime, with the parts of the HuggingFace interface that
+        ctc_logit_batches and the transcribers use: model(**inputs).logits,
+        config and _get_feat_extract_output_lengths.
+
+        The graph is traced once from a dummy batch, with dynamic batch and
+        length dimensions. ONNX files are written to BAIR_ONNX_DIR (default
+        ~/.cache/bair/onnx) and reused by later runs of the same weights:
+        the file name includes a hash of the config and state dict, so a
+        changed checkpoint is exported again.
+        """
+        self.config = model.config
+        self.mode = mode
+        self.attention_mask = attention_mask
+        self._output_lengths = type(model)._get_feat_extract_output_lengths
+
+        generator = torch.Generator().manual_seed(0)
+        example = [torch.randn(2, 16000, generator=generator)]
+        names = ["input_values"]
+        if attention_mask:
+            mask = torch.ones(2, 16000, dtype=torch.long)
+            mask[1, 12000:] = 0
+            example.append(mask)
+            names.append("attention_mask")
+
+        with torch.no_grad():
+            if mode == "torchscript":
+                self._traced = torch.jit.trace(_Logits(model), tuple(example), strict=False, check_trace=False)
+            elif mode == "onnx":
+                self._session = self._export_onnx(model, name, example, names)
+            else:
+                raise ValueError(f"Not an export mode: {mode}")
+
+    def _export_onnx(self, model, name, example, names):
+        import onnxruntime
+
+        onnx_dir = Path(os.environ.get(ONNX_DIR_ENV, DEFAULT_ONNX_DIR)).expanduser()
+        path = onnx_dir / f"{name}-{model_digest(model)}{'' if self.attention_mask else '-nomask'}.onnx"
+        if not path.exists():
+            onnx_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            axes = {input_name: {0: "batch", 1: "samples"} for input_name in names}
+            axes["logits"] = {0: "batch", 1: "frames"}
+            # The TorchScript-based exporter: torch.export cannot trace the
+            # data-dependent masking in the HuggingFace speech encoders
+            torch.onnx.export(_Logits(model), tuple(example), str(tmp_path), input_names=names,
+                              output_names=["logits"], dynamic_axes=axes, opset_version=17, dynamo=False)
+            os.replace(tmp_path, path)
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = torch.get_num_threads()  # respect per-worker thread caps
+        return onnxruntime.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, input_values, attention_mask=None, **kwargs):
+        inputs = [input_values]
+        if self.attention_mask:
+            if attention_mask is None:
+                attention_mask = torch.ones(input_values.shape, dtype=torch.long)
+            inputs.append(attention_mask.long())  # processors return int32 masks; the graph was traced with int64
+
+        if self.mode == "torchscript":
+            with torch.no_grad():
+                logits = self._traced(*inputs)
+        else:
+            feed = dict(zip(("input_values", "attention_mask"), (x.cpu().numpy() for x in inputs)))
+            logits = torch.from_numpy(self._session.run(["logits"], feed)[0])
+        return SimpleNamespace(logits=logits)
+
+    def _get_feat_extract_output_lengths(self, input_lengths):
+        # Depends only on the config's conv kernels and strides
+        return self._output_lengths(self, input_lengths)
@@ -0,0 +1,204 @@
+import importlib
+import threading
+import time
+from collections import OrderedDict
+
+from utils.tracing import span
+
+# Module that registers each backend and its audio_path -> text function.
+# Modules are imported on first request, so registry.get("hubert") works
+# without importing models/hubert.py first.
+BACKENDS = {
+    "whisper": ("models.whisper_model", "transcribe_audio"),
+    "whisper_adapter": ("models.whisper_model_with_adapter", "transcribe_audio"),
+    "hubert": ("models.hubert", "transcribe_with_hubert"),
+    "wav2vec2": ("models.wav2vec2", "transcribe_with_wav2vec2"),
+    "huper": ("models.huper", "transcribe_audio"),
+}
+
+# Batched list-of-paths -> list-of-texts functions, where a backend has one
+BATCH_BACKENDS = {
+    "whisper": ("models.whisper_model", "transcribe_batch"),
+    "whisper_adapter": ("models.whisper_model_with_adapter", "transcribe_batch"),
+    "hubert": ("models.hubert", "transcribe_batch_with_hubert"),
+    "wav2vec2": ("models.wav2vec2", "transcribe_batch_with_wav2vec2"),
+    "huper": ("models.huper", "transcribe_batch"),
+}
+
+# Functions taking a decoded 16 kHz waveform instead of a path, so several
+# backends can share one decode of the same clip
+WAVEFORM_BACKENDS = {
+    "whisper": ("models.whisper_model", "transcribe_waveform"),
+    "whisper_adapter": ("models.whisper_model_with_adapter", "transcribe_waveform"),
+    "hubert": ("models.hubert", "transcribe_waveform_with_hubert"),
+    "wav2vec2": ("models.wav2vec2", "transcribe_waveform_with_wav2vec2"),
+    "huper": ("models.huper", "transcribe_waveform"),
+}
+
+
+def get_transcribe_function(name):
+    """
+    Returns the audio_path -> transcription function of a backend.
+    """
+    if name not in BACKENDS:
+        raise KeyError(f"Unknown model backend: {name}")
+    module_name, function_name = BACKENDS[name]
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def get_batch_transcribe_function(name):
+    """
+    Returns a list-of-paths -> list-of-transcriptions function for a backend,
+    looping over the single-file function for backends without batching.
+    """
+    if name in BATCH_BACKENDS:
+        module_name, function_name = BATCH_BACKENDS[name]
+        return getattr(importlib.import_module(module_name), function_name)
+    transcribe = get_transcribe_function(name)
+    return lambda audio_paths: [transcribe(path) for path in audio_paths]
+
+
+def get_waveform_transcribe_function(name):
+    """
+    Returns the waveform -> transcription function of a backend.
+    """
+    if name not in WAVEFORM_BACKENDS:
+        raise KeyError(f"Unknown model backend: {name}")
+    module_name, function_name = WAVEFORM_BACKENDS[name]
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def estimate_bytes(obj, _seen=None) -> int:
+    """
+    Rough resident size of a loaded backend: parameters and buffers of every
+    torch module reachable through tuples, lists, dicts or object attributes.
+    """
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if hasattr(obj, "parameters") and hasattr(obj, "buffers"):
+        total = 0
+        for tensor in list(obj.parameters()) + list(obj.buffers()):
+            if tensor.data_ptr() not in seen:
+                seen.add(tensor.data_ptr())
+                total += tensor.numel() * tensor.element_size()
+        return total
+    if isinstance(obj, (tuple, list)):
+        return sum(estimate_bytes(item, seen) for item in obj)
+    if isinstance(obj, dict):
+        return sum(estimate_bytes(item, seen) for item in obj.values())
+    if hasattr(obj, "__dict__"):
+        return sum(estimate_bytes(item, seen) for item in vars(obj).values())
+    return 0
+
+
+class ModelRegistry:
+    def __init__(self, max_models=None, max_bytes=None):
+        """
+        Process-wide cache of loaded backends.
+
+        Args:
+            max_models (int): Keep at most this many backends resident
+            max_bytes (int): Keep the estimated total size under this budget
+
+        Least recently used backends are evicted first; the backend being
+        requested is never evicted, even if it alone exceeds the budget.
+        """
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self._loaders = {}
+        self._loaded = OrderedDict()  # name -> (backend, size in bytes)
+        self._stats = {}
+        self._lock = threading.RLock()
+        self._load_locks = {}
+
+    def register(self, name, loader):
+        """
+        Registers a zero-argument callable that loads a backend.
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks.setdefault(name, threading.Lock())
+            self._stats.setdefault(name, {"loads": 0, "hits": 0, "load_seconds": 0.0, "bytes": 0})
+
+    def configure(self, max_models=None, max_bytes=None):
+        with self._lock:
+            self.max_models = max_models
+            self.max_bytes = max_bytes
+            self._evict(keep=None)
+
+    def get(self, name):
+        """
+        Returns the loaded backend, loading it on first use.
+        """
+        with self._lock:
+            if name in self._loaded:
+                self._loaded.move_to_end(name)
+                self._stats[name]["hits"] += 1
+                return self._loaded[name][0]
+            if name not in self._loaders and name in BACKENDS:
+                importlib.import_module(BACKENDS[name][0])
+            if name not in self._loaders:
+                raise KeyError(f"Unknown model backend: {name}")
+            load_lock = self._load_locks[name]
+
+        # Load outside the registry lock so other backends stay available
+        with load_lock:
+            with self._lock:
+                if name in self._loaded:
+                    self._loaded.move_to_end(name)
+                    self._stats[name]["hits"] += 1
+                    return self._loaded[name][0]
+
+            start = time.perf_counter()
+            with span("model.load", backend=name):
+                backend = self._loaders[name]()
+            elapsed = time.perf_counter() - start
+            size = estimate_bytes(backend)
+
+            with self._lock:
+                self._loaded[name] = (backend, size)
+                stats = self._stats[name]
+                stats["loads"] += 1
+                stats["load_seconds"] += elapsed
+                stats["bytes"] = size
+                self._evict(keep=name)
+            return backend
+
+    def is_loaded(self, name) -> bool:
+        return name in self._loaded
+
+    def unload(self, name):
+        with self._lock:
+            self._loaded.pop(name, None)
+
+    def clear(self):
+        with self._lock:
+            self._loaded.clear()
+
+    def stats(self) -> dict:
+        """
+        Per-backend counters: loads, cache hits, total load time and size.
+        """
+        with self._lock:
+            return {name: dict(stats, loaded=name in self._loaded) for name, stats in self._stats.items()}
+
+    def _evict(self, keep):
+        def over_budget():
+            if self.max_models is not None and len(self._loaded) > self.max_models:
+                return True
+            if self.max_bytes is not None and sum(size for _, size in self._loaded.values()) > self.max_bytes:
+                return True
+            return False
+
+        while over_budget():
+            victim = next((name for name in self._loaded if name != keep), None)
+            if victim is None:
+                break
+            print("Evicting model:", victim)
+            del self._loaded[victim]
+
+
+registry = ModelRegistry()
@@ -1,8 +1,20 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
 import torch
 import torch.nn as nn
 from transformers import WhisperForConditionalGeneration, WhisperProcessor
-import soundfile as sf
+from models.inference import get_inference_mode, optimize_model
+from models.registry import registry
+from utils.audio import TARGET_SR, duration_seconds, iter_audio_blocks, load_audio, waveform_blocks
+from utils.batching import load_concurrently
+from utils.feature_cache import get_default_cache
 from utils.metrics import compute_cer, compute_wer
+from utils.tracing import span
 
 # WhisperForConditionalGeneration: Hugging Face Transformers model class for OpenAI's Whisper seq-to-seq ASR model (audio -> text). It wraps the encoder-decoder network and exposes generate() for transcription/translation.
 # WhisperProcessor: Paired pre/post-processing class. Bundles a feature extractor (audio -> log-Mel features) and a tokenizer (text <--> ids), so you can call it to prepare inputs and decode outputs.
@@ -10,9 +22,62 @@ from utils.metrics import compute_cer, compute_wer
 model_name = "openai/whisper-base"
 device = "cuda" if torch.cuda.is_available() else "cpu"
 
-print(f"Loading {model_name} on {device}...")
-model = WhisperForConditionalGeneration.from_pretrained(model_name).to(device)
-processor = WhisperProcessor.from_pretrained(model_name)
+
+def load_whisper(inference_mode=None):
+    """
+    Loads Whisper and its processor. Called once by the model registry.
+    inference_mode is fp32, int8 or compile (default: BAIR_INFERENCE_MODE, else fp32).
+    """
+    print(f"Loading {model_name} on {device}...")
+    model = WhisperForConditionalGeneration.from_pretrained(model_name).to(device)
+    model = optimize_model(model, inference_mode or get_inference_mode("whisper"), name="whisper", generate=True)
+    processor = WhisperProcessor.from_pretrained(model_name)
+    return model, processor
+
+
+registry.register("whisper", load_whisper)
+
+
+# Whisper's feature extractor pads or truncates every input to 30 seconds
+CHUNK_SECONDS = 30
+
+
+def feature_config(processor) -> dict:
+    """
+    Feature extractor settings that determine the log-Mel features (feature cache key).
+    """
+    fe = processor.feature_extractor
+    return {
+        "feature_size": fe.feature_size,
+        "sampling_rate": fe.sampling_rate,
+        "n_fft": fe.n_fft,
+        "hop_length": fe.hop_length,
+        "chunk_length": fe.chunk_length,
+        "padding_value": fe.padding_value,
+    }
+
+
+def extract_features(processor, waveform):
+    """
+    Whisper log-Mel input_features ([n_mels, frames]) of a 16 kHz waveform.
+    """
+    with span("whisper.features", audio_seconds=len(waveform) / 16000):
+        return processor(waveform, sampling_rate=16000, return_tensors="np").input_features[0]
+
+
+def load_features(processor, audio_path: str):
+    """
+    Whisper log-Mel input_features of an audio file. With the feature cache
+    enabled, cached clips skip both audio decoding and feature extraction.
+    """
+    cache = get_default_cache()
+    if cache is None:
+        return extract_features(processor, load_audio(audio_path))
+    return cache.get_or_compute(
+        audio_path, "whisper_log_mel",
+        lambda: extract_features(processor, load_audio(audio_path)),
+        **feature_config(processor),
+    )
 
 
 def transcribe_audio(audio_path: str, language: str="en", task: str="transcribe") -> str:
@@ -27,37 +92,23 @@ def transcribe_audio(audio_path: str, language: str="en", task: str="transcribe"
     Returns:
         str: Transcribed text
     """
-    waveform, sr = sf.read(audio_path)
+    audio_seconds = duration_seconds(audio_path)
+    if audio_seconds > CHUNK_SECONDS:
+        # Whisper would silently drop everything after 30 seconds
+        return transcribe_long_audio(audio_path, language, task)
 
-    if len(waveform.shape) > 1:
-        waveform = waveform.mean(axis=1)
+    model, processor = registry.get("whisper")
 
-    target_sr = 16000
-    if sr != target_sr:
-        waveform_tensor = torch.tensor(waveform, dtype=torch.float32).unsqueeze(0).unsqueeze(0)
-        waveform_tensor = torch.nn.functional.interpolate(
-            waveform_tensor,
-            scale_factor=target_sr / sr,
-            mode="linear",
-            align_corners=False,
-        )
-        waveform = waveform_tensor.squeeze(0).squeeze(0).cpu().numpy()
-        sr = target_sr
+    features = load_features(processor, audio_path)
+    input_features = torch.tensor(np.asarray(features)).unsqueeze(0).to(device)
 
-    inputs = processor(
-        waveform,
-        sampling_rate=sr,
-        return_tensors="pt"
-    )
-
-    input_features = inputs.input_features.to(device)
-
-    with torch.no_grad():
+    with span("whisper.generate", items=1, audio_seconds=audio_seconds) as s, torch.no_grad():
         generated_ids = model.generate(
             input_features,
             language=language,
             task=task
         )
+        s.set(generated_tokens=generated_ids.shape[-1])
 
     transcription = processor.batch_decode(
         generated_ids,
@@ -67,6 +118,220 @@ def transcribe_audio(audio_path: str, language: str="en", task: str="transcribe"
     return transcription
 
 
+def transcribe_waveform(waveform, language: str="en", task: str="transcribe", backend: str="whisper") -> str:
+    """
+    Transcribes an already decoded 16 kHz mono waveform (see utils.audio.load_audio).
+    """
+    if len(waveform) > CHUNK_SECONDS * TARGET_SR:
+        return transcribe_long_audio(None, language, task, backend=backend, waveform=waveform)
+
+    model, processor = registry.get(backend)[:2]
+    input_features = torch.tensor(extract_features(processor, waveform)).unsqueeze(0).to(device)
+
+    with span(f"{backend}.generate", items=1, audio_seconds=len(waveform) / TARGET_SR) as s, torch.no_grad():
+        generated_ids = model.generate(input_features, language=language, task=task)
+        s.set(generated_tokens=generated_ids.shape[-1])
+
+    return processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
+
+
+def generate_batch(model, processor, features, audio_seconds, language="en", task="transcribe",
+                   batch_size=8, num_beams=1, max_new_tokens=None, device=device):
+    """
+    Runs Whisper generation over many clips.
+
+    Log-Mel features of each batch are stacked into one tensor, generated with
+    a single generate() call and decoded with processor.batch_decode.
+
+    Args:
+        model: Whisper model (with or without adapter)
+        processor: Matching WhisperProcessor
+        features (list): Log-Mel input_features per clip (see extract_features)
+        audio_seconds (list[float]): Duration of each clip, for the real-time factor
+        language (str): Language code (default 'en')
+        task (str): 'transcribe' or 'translate'
+        batch_size (int): Clips per generate() call
+        num_beams (int): Beam size (1 = greedy)
+        max_new_tokens (int): Cap on generated tokens per clip
+        device (str): Device the model lives on
+
+    Returns:
+        (list[str], list[dict]): Transcriptions in input order, and per-batch
+        stats with latency in seconds and real-time factor (latency / audio seconds).
+    """
+    transcriptions = []
+    stats = []
+    generate_kwargs = {"language": language, "task": task, "num_beams": num_beams}
+    if max_new_tokens is not None:
+        generate_kwargs["max_new_tokens"] = max_new_tokens
+
+    for start in range(0, len(features), batch_size):
+        batch = features[start:start + batch_size]
+        batch_start = time.perf_counter()
+
+        input_features = torch.tensor(np.stack(batch)).to(device)
+        batch_seconds = sum(audio_seconds[start:start + batch_size])
+
+        with span("whisper.generate", items=len(batch), audio_seconds=batch_seconds) as s, torch.no_grad():
+            generated_ids = model.generate(input_features, **generate_kwargs)
+            s.set(generated_tokens=generated_ids.numel())
+
+        transcriptions.extend(processor.batch_decode(generated_ids, skip_special_tokens=True))
+
+        latency = time.perf_counter() - batch_start
+        stats.append({
+            "batch": len(stats),
+            "size": len(batch),
+            "audio_seconds": batch_seconds,
+            "latency_seconds": latency,
+            "rtf": latency / batch_seconds if batch_seconds else float("nan"),
+        })
+
+    return transcriptions, stats
+
+
+def transcribe_batch(audio_paths, language: str="en", task: str="transcribe", batch_size: int=8,
+                     num_beams: int=1, max_new_tokens=None, num_workers: int=4, return_stats: bool=False,
+                     backend: str="whisper"):
+    """
+    Transcribes many audio files using Whisper, batch_size files per generate() call.
+
+    Clips longer than CHUNK_SECONDS, which Whisper would cut at 30 seconds,
+    go through transcribe_long_audio one by one instead (their windows are
+    still generated batch_size at a time) and get a stats entry of their own.
+
+    Args:
+        audio_paths (list[str]): Paths to audio files
+        language (str): Language code (default 'en')
+        task (str): 'transcribe' or 'translate'
+        batch_size (int): Clips per generate() call
+        num_beams (int): Beam size (1 = greedy)
+        max_new_tokens (int): Cap on generated tokens per clip (short clips)
+        num_workers (int): Threads used to load audio
+        return_stats (bool): Also return per-batch latency and real-time factor
+        backend (str): Registry name of the Whisper model to use
+
+    Returns:
+        list[str]: Transcriptions in input order (plus stats if return_stats)
+    """
+    model, processor = registry.get(backend)[:2]
+    durations = [duration_seconds(path) for path in audio_paths]
+    short = [i for i, seconds in enumerate(durations) if seconds <= CHUNK_SECONDS]
+    features = load_concurrently(lambda i: load_features(processor, audio_paths[i]), short, num_workers)
+    texts, stats = generate_batch(
+        model, processor, features, [durations[i] for i in short], language, task, batch_size, num_beams,
+        max_new_tokens
+    )
+
+    transcriptions = [None] * len(audio_paths)
+    for i, text in zip(short, texts):
+        transcriptions[i] = text
+    for i, seconds in enumerate(durations):
+        if seconds <= CHUNK_SECONDS:
+            continue
+        start = time.perf_counter()
+        transcriptions[i] = transcribe_long_audio(audio_paths[i], language, task, batch_size=batch_size,
+                                                  num_beams=num_beams, backend=backend)
+        latency = time.perf_counter() - start
+        stats.append({"batch": len(stats), "size": 1, "audio_seconds": seconds, "latency_seconds": latency,
+                      "rtf": latency / seconds, "long": True})
+
+    if return_stats:
+        return transcriptions, stats
+    return transcriptions
+
+
+def _normalize_word(word):
+    return "".join(c for c in word.lower() if c.isalnum())
+
+
+def merge_overlap(previous_words, next_words, max_overlap_words):
+    """
+    Number of leading words of next_words that repeat the tail of previous_words.
+
+    Tries every overlap length up to max_overlap_words and keeps the one with
+    the most position-wise matches (ignoring case and punctuation), requiring
+    at least half of the overlapping words to match.
+    """
+    best_k, best_matches = 0, 0
+    limit = min(len(previous_words), len(next_words), max_overlap_words)
+    for k in range(1, limit + 1):
+        tail = previous_words[-k:]
+        matches = sum(_normalize_word(a) == _normalize_word(b) for a, b in zip(tail, next_words[:k]))
+        if matches * 2 >= k and matches >= best_matches:
+            best_k, best_matches = k, matches
+    return best_k
+
+
+def transcribe_stream(audio_path: str, language: str="en", task: str="transcribe",
+                      chunk_seconds: float=CHUNK_SECONDS, overlap_seconds: float=5, batch_size: int=4,
+                      num_beams: int=1, backend: str="whisper", waveform=None):
+    """
+    Transcribes audio of any length in overlapping 30-second windows.
+
+    Windows are read lazily and transcribed batch_size at a time, so memory
+    stays bounded regardless of recording length. Words repeated across the
+    overlap are dropped from the later window.
+
+    Args:
+        audio_path (str): Path to audio file
+        language (str): Language code (default 'en')
+        task (str): 'transcribe' or 'translate'
+        chunk_seconds (float): Window length (at most 30 seconds)
+        overlap_seconds (float): Audio shared by consecutive windows
+        batch_size (int): Windows per generate() call
+        num_beams (int): Beam size (1 = greedy)
+        backend (str): Registry name of the Whisper model to use
+        waveform (np.ndarray): Already decoded 16 kHz audio to use instead
+            of reading audio_path
+
+    Yields:
+        dict: {"start", "end", "text"} per window, start/end in seconds
+    """
+    model, processor = registry.get(backend)[:2]
+    # Children read slowly; four words per second bounds the repeated span
+    max_overlap_words = int(overlap_seconds * 4) + 1
+    previous_words = []
+    previous_end = 0.0
+
+    def flush(chunks):
+        nonlocal previous_words, previous_end
+        texts, _ = generate_batch(
+            model, processor,
+            [extract_features(processor, w) for _, _, w in chunks],
+            [end - start for start, end, _ in chunks],
+            language, task, batch_size=len(chunks), num_beams=num_beams
+        )
+        for (start, end, _), text in zip(chunks, texts):
+            words = text.split()
+            skip = merge_overlap(previous_words, words, max_overlap_words)
+            segment = {"start": max(start, previous_end), "end": end, "text": " ".join(words[skip:])}
+            previous_words = words
+            previous_end = end
+            yield segment
+
+    pending = []
+    if waveform is not None:
+        chunks = waveform_blocks(waveform, chunk_seconds, overlap_seconds)
+    else:
+        chunks = iter_audio_blocks(audio_path, chunk_seconds, overlap_seconds)
+    for chunk in chunks:
+        pending.append(chunk)
+        if len(pending) == batch_size:
+            yield from flush(pending)
+            pending = []
+    if pending:
+        yield from flush(pending)
+
+
+def transcribe_long_audio(audio_path: str, language: str="en", task: str="transcribe", **kwargs) -> str:
+    """
+    Transcribes audio of any length, joining the streamed windows.
+    """
+    segments = transcribe_stream(audio_path, language, task, **kwargs)
+    return " ".join(segment["text"] for segment in segments if segment["text"])
+
+
 if __name__=="__main__":
     task = "multitudes_WRE_grizzlybear_short"
     # task = "multitudes_WRE_grizzlybear"
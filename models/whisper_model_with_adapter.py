@@ -1,13 +1,20 @@
+import os
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+import numpy as np
 import torch
 import torch.nn as nn
 from transformers import WhisperForConditionalGeneration, WhisperProcessor
-import soundfile as sf
+from models.registry import registry
+from models.whisper_model import CHUNK_SECONDS, load_features, transcribe_long_audio
+from models.whisper_model import transcribe_batch as whisper_transcribe_batch
+from models.whisper_model import transcribe_waveform as whisper_transcribe_waveform
+from utils.audio import duration_seconds
 from utils.metrics import compute_cer, compute_wer
+from utils.tracing import span
 
 # --- Adapter class --- #
 class Adapter(nn.Module):
@@ -23,33 +30,68 @@ class Adapter(nn.Module):
 model_name = "openai/whisper-base"
 device = "cuda" if torch.cuda.is_available() else "cpu"
 
-print(f"Loading {model_name} on {device}...")
-model = WhisperForConditionalGeneration.from_pretrained(model_name).to(device)  # loads pretrained Whisper model for seq-to-seq transcription
-processor = WhisperProcessor.from_pretrained(model_name)  # loads feature extractor + tokenizer (process audio, decode generated tokens)
+# Adapter weights saved by models/adapter_training.py, loaded when set
+ADAPTER_WEIGHTS_ENV = "BAIR_ADAPTER_WEIGHTS"
 
-# Freeze all original Whisper parameters
-for param in model.parameters():  # for every parameter in Whisper
-    param.requires_grad = False  # stops gradients from being computed (weights not updated during training)
-print("All original Whisper parameters frozen.")
 
-# --- Add adapter to last encoder layer --- #
-encoder_hidden_size = model.config.d_model  # hidden size of whisper's encoder
-adapter = Adapter(encoder_hidden_size, adapter_size=64).to(device)  # create the adapter
+def _apply_adapter(output, adapter):
+    """
+    Runs the adapter on an encoder layer's hidden states, whatever the layer
+    returns: a tensor (transformers 5), a tuple (transformers 4) or a ModelOutput.
+    """
+    if isinstance(output, torch.Tensor):
+        return adapter(output)
+    if isinstance(output, (tuple, list)):
+        return (adapter(output[0]),) + tuple(output[1:])
+    key = next(iter(output.keys()))
+    output[key] = adapter(output[key])
+    return output
+
+
+def attach_adapter(model, adapter):
+    """
+    Makes the last encoder layer of a Whisper model pass its output through adapter.
+    """
+    last_layer = model.model.encoder.layers[-1]  # get last encoder layer in Whisper
+    original_forward = last_layer.forward
 
-last_layer = model.model.encoder.layers[-1]  # get last encoder layer in Whisper
+    def forward_with_adapter(x, *args, **kwargs):
+        return _apply_adapter(original_forward(x, *args, **kwargs), adapter)
 
-original_forward = last_layer.forward
+    last_layer.forward = forward_with_adapter
 
-def forward_with_adapter(x, *args, **kwargs):
-    output = original_forward(x, *args, **kwargs)
-    hidden_states = output[0]
-    hidden_states = adapter(hidden_states)
-    return (hidden_states,) + output[1:]
 
-last_layer.forward = forward_with_adapter
+def load_whisper_with_adapter(adapter_size=64):
+    """
+    Loads Whisper, freezes it and adds an adapter to the last encoder layer.
+    Called once by the model registry.
+    """
+    print(f"Loading {model_name} on {device}...")
+    model = WhisperForConditionalGeneration.from_pretrained(model_name).to(device)  # loads pretrained Whisper model for seq-to-seq transcription
+    processor = WhisperProcessor.from_pretrained(model_name)  # loads feature extractor + tokenizer (process audio, decode generated tokens)
 
-trainable_params = sum(p.numel() for p in adapter.parameters() if p.requires_grad)  # returns total number of trainable params in adapter
-print(f"Adapter added. Number of trainable parameters: {trainable_params}")
+    # Freeze all original Whisper parameters
+    for param in model.parameters():  # for every parameter in Whisper
+        param.requires_grad = False  # stops gradients from being computed (weights not updated during training)
+    print("All original Whisper parameters frozen.")
+
+    # --- Add adapter to last encoder layer --- #
+    encoder_hidden_size = model.config.d_model  # hidden size of whisper's encoder
+    adapter = Adapter(encoder_hidden_size, adapter_size=adapter_size).to(device)  # create the adapter
+    weights_path = os.environ.get(ADAPTER_WEIGHTS_ENV)
+    if weights_path:
+        adapter.load_state_dict(torch.load(weights_path, map_location=device))
+        print(f"Loaded adapter weights from {weights_path}")
+
+    attach_adapter(model, adapter)
+
+    trainable_params = sum(p.numel() for p in adapter.parameters() if p.requires_grad)  # returns total number of trainable params in adapter
+    print(f"Adapter added. Number of trainable parameters: {trainable_params}")
+
+    return model, processor, adapter
+
+
+registry.register("whisper_adapter", load_whisper_with_adapter)
 
 # --- Transcription Function --- #
 def transcribe_audio(audio_path: str, language: str="en", task: str="transcribe") -> str:
@@ -64,38 +106,23 @@ def transcribe_audio(audio_path: str, language: str="en", task: str="transcribe"
     Returns:
         str: Transcribed text
     """
-    waveform, sr = sf.read(audio_path)
-
-    if len(waveform.shape) > 1:
-        waveform = waveform.mean(axis=1)
-
-    target_sr = 16000
-    if sr != target_sr:
-        waveform_tensor = torch.tensor(waveform, dtype=torch.float32).unsqueeze(0).unsqueeze(0)
-        waveform_tensor = torch.nn.functional.interpolate(
-            waveform_tensor,
-            scale_factor=target_sr / sr,
-            mode="linear",
-            align_corners=False,
-        )
-        waveform = waveform_tensor.squeeze(0).squeeze(0).cpu().numpy()
-        sr = target_sr
+    audio_seconds = duration_seconds(audio_path)
+    if audio_seconds > CHUNK_SECONDS:
+        # Whisper would silently drop everything after 30 seconds
+        return transcribe_long_audio(audio_path, language, task, backend="whisper_adapter")
 
-    inputs = processor(
-        waveform,
-        sampling_rate=sr,
-        return_tensors="pt",
-        padding=True
-    )
+    model, processor, _ = registry.get("whisper_adapter")
 
-    input_features = inputs.input_features.to(device)
+    features = load_features(processor, audio_path)
+    input_features = torch.tensor(np.asarray(features)).unsqueeze(0).to(device)
 
-    with torch.no_grad():
+    with span("whisper_adapter.generate", items=1, audio_seconds=audio_seconds) as s, torch.no_grad():
         generated_ids = model.generate(
             input_features,
             language=language,
             task=task
         )
+        s.set(generated_tokens=generated_ids.shape[-1])
 
     transcription = processor.batch_decode(
         generated_ids,
@@ -105,6 +132,37 @@ def transcribe_audio(audio_path: str, language: str="en", task: str="transcribe"
     return transcription
 
 
+def transcribe_waveform(waveform, language: str="en", task: str="transcribe") -> str:
+    """
+    Transcribes an already decoded 16 kHz mono waveform using Whisper + adapter.
+    """
+    return whisper_transcribe_waveform(waveform, language, task, backend="whisper_adapter")
+
+
+def transcribe_batch(audio_paths, language: str="en", task: str="transcribe", batch_size: int=8,
+                     num_beams: int=1, max_new_tokens=None, num_workers: int=4, return_stats: bool=False):
+    """
+    Transcribes many audio files using Whisper + adapter, batch_size files per
+    generate() call; clips over 30 seconds are transcribed in windows (see
+    models.whisper_model.transcribe_batch).
+
+    Args:
+        audio_paths (list[str]): Paths to audio files
+        language (str): Language code (default 'en')
+        task (str): 'transcribe' or 'translate'
+        batch_size (int): Clips per generate() call
+        num_beams (int): Beam size (1 = greedy)
+        max_new_tokens (int): Cap on generated tokens per clip (short clips)
+        num_workers (int): Threads used to load audio
+        return_stats (bool): Also return per-batch latency and real-time factor
+
+    Returns:
+        list[str]: Transcriptions in input order (plus stats if return_stats)
+    """
+    return whisper_transcribe_batch(audio_paths, language, task, batch_size, num_beams, max_new_tokens,
+                                    num_workers, return_stats, backend="whisper_adapter")
+
+
 if __name__=="__main__":
     task = "multitudes_WRE_grizzlybear_short"
     # task = "multitudes_WRE_grizzlybear"
@@ -0,0 +1,339 @@
+import argparse
+import hashlib
+import json
+import os
+from multiprocessing import Process
+from pathlib import Path
+from typing import Dict, Optional
+
+from evaluate import PHONEME_BACKENDS, discover_pairs, score
+from models.registry import BACKENDS
+
+REDIS_URL_ENV = "BAIR_REDIS_URL"
+DEFAULT_REDIS_URL = "redis://localhost:6379/0"
+
+# One queue per stage, so each stage gets its own pool of workers
+STAGES = ("transcribe", "score", "align")
+QUEUE_PREFIX = "bair-"
+TRANSCRIPTION_KEY = "bair:transcription:{backend}:{digest}"
+RESULT_KEY = "bair:result:{request_id}"
+
+# How long rq keeps finished jobs; while a job is kept, resubmitting the same
+# clip returns it instead of enqueueing new work
+JOB_RESULT_TTL = 7 * 24 * 3600
+
+_fake_server = None
+
+
+def get_connection(url: Optional[str] = None, fake: bool = False):
+    """
+    Redis connection for the pipeline: url, else BAIR_REDIS_URL, else a
+    local Redis. fake=True uses an in-process fakeredis server instead
+    (shared by every fake connection in this process).
+    """
+    if fake:
+        import fakeredis
+
+        global _fake_server
+        if _fake_server is None:
+            _fake_server = fakeredis.FakeServer()
+        return fakeredis.FakeRedis(server=_fake_server)
+    from redis import Redis
+
+    return Redis.from_url(url or os.environ.get(REDIS_URL_ENV, DEFAULT_REDIS_URL))
+
+
+def get_queues(connection) -> Dict[str, "Queue"]:
+    from rq import Queue
+
+    return {stage: Queue(QUEUE_PREFIX + stage, connection=connection) for stage in STAGES}
+
+
+def audio_digest(audio_path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(audio_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def job_ids(digest: str, backend: str, reference: Optional[str], task: Optional[str] = None,
+            vocab_set: Optional[str] = None, llm: bool = False, lexicon: Optional[dict] = None) -> Dict[str, str]:
+    """
+    Deterministic job IDs. The transcription depends only on the audio and
+    the backend, so it is shared by every request for the same recording;
+    scoring and alignment also depend on the reference, the task and the lexicon.
+    """
+    fields = [digest, backend, reference, task, vocab_set, llm] + ([lexicon] if lexicon is not None else [])
+    request = json.dumps(fields, sort_keys=True)
+    request_id = hashlib.sha256(request.encode()).hexdigest()[:40]
+    return {
+        "request": request_id,
+        "transcribe": f"transcribe-{backend}-{digest[:40]}",
+        "score": f"score-{request_id}",
+        "align": f"align-{request_id}",
+    }
+
+
+def _enqueue_once(queue, job_id, func, args, depends_on=None, retries=0, replace=False):
+    """
+    Enqueues func unless a job with this ID is already queued, running or
+    finished. With replace, only a finished job is kept (used when the job
+    it depends on was re-enqueued). Returns the job and whether it was newly
+    enqueued.
+    """
+    from rq import Retry
+    from rq.exceptions import NoSuchJobError
+    from rq.job import Job, JobStatus
+
+    try:
+        job = Job.fetch(job_id, connection=queue.connection)
+        status = job.get_status()
+        if status == JobStatus.FINISHED or not replace and status not in (
+                JobStatus.FAILED, JobStatus.STOPPED, JobStatus.CANCELED):
+            return job, False
+        job.delete()
+    except NoSuchJobError:
+        pass
+    job = queue.enqueue_call(func, args=args, job_id=job_id, depends_on=depends_on, result_ttl=JOB_RESULT_TTL,
+                             retry=Retry(max=retries) if retries else None)
+    return job, True
+
+
+def submit(connection, audio_path: str, backend: str, reference: Optional[str] = None,
+           task: Optional[str] = None, vocab_set: Optional[str] = None, llm: bool = False,
+           lexicon: Optional[dict] = None) -> dict:
+    """
+    Queues one recording through the stages: transcription, then scoring
+    against the reference (if given), then per-word alignment (if task and
+    vocab_set are given; phoneme backends only, with the reference as the
+    ground-truth phonemes). Submitting the same request again reuses its
+    jobs, so a retried upload is not transcribed twice.
+
+    Args:
+        connection: Redis connection (see get_connection)
+        audio_path (str): Audio file readable by the workers
+        backend (str): One of models.registry.BACKENDS
+        reference (str): Reference text, or phonemes for phoneme backends
+        task (str): 'word' or 'letter', to align the phonemes per word
+        vocab_set (str): Word or letter bank for the alignment
+        llm (bool): Align with the LLM (get_LLM_alignment) instead of locally
+        lexicon (dict): {word: pronunciation(s)} for the word bank; required
+            for local word-task alignment (the letter task has a default)
+
+    Returns:
+        dict: The request ID, the job ID of each stage and the stages newly
+        enqueued (empty when everything was already submitted)
+    """
+    if backend not in BACKENDS:
+        raise KeyError(f"Unknown model backend: {backend}")
+    align = task is not None and vocab_set is not None
+    if align and (backend not in PHONEME_BACKENDS or reference is None):
+        raise ValueError("Alignment needs a phoneme backend and a phoneme reference")
+    if align and task == "word" and lexicon is None and not llm:
+        raise ValueError("The word task needs a pronunciation lexicon to align locally")
+
+    digest = audio_digest(audio_path)
+    ids = job_ids(digest, backend, reference, task, vocab_set, llm, lexicon)
+    queues = get_queues(connection)
+    connection.hset(RESULT_KEY.format(request_id=ids["request"]), mapping={
+        "clip": Path(audio_path).name, "backend": backend, "audio_digest": digest,
+    })
+
+    stages = [("transcribe", transcribe_stage, (audio_path, backend, digest), 1)]
+    if reference is not None:
+        stages.append(("score", score_stage, (ids["request"], backend, digest, reference), 0))
+    if align:
+        # LLM calls fail transiently more often than local work
+        stages.append(("align", align_stage,
+                       (ids["request"], backend, digest, task, vocab_set, reference, llm, lexicon), 3 if llm else 0))
+
+    jobs, enqueued, transcribe_job = {}, [], None
+    for stage, func, stage_args, retries in stages:
+        # A resubmitted transcription drops its dependents, so re-create them too
+        job, new = _enqueue_once(queues[stage], ids[stage], func, stage_args, depends_on=transcribe_job,
+                                 retries=retries, replace=bool(enqueued))
+        transcribe_job = transcribe_job or job
+        jobs[stage] = job.id
+        if new:
+            enqueued.append(stage)
+    return {"request": ids["request"], "jobs": jobs, "enqueued": enqueued}
+
+
+def _connection():
+    from rq import get_current_job
+
+    return get_current_job().connection
+
+
+def _transcription(connection, backend, digest) -> str:
+    value = connection.get(TRANSCRIPTION_KEY.format(backend=backend, digest=digest))
+    if value is None:
+        raise RuntimeError(f"No {backend} transcription stored for audio {digest[:12]}")
+    return value.decode()
+
+
+def transcribe_stage(audio_path: str, backend: str, digest: str) -> str:
+    """
+    Worker side of the transcribe queue. The stored transcription is reused
+    if an earlier attempt already finished.
+    """
+    from models.registry import get_transcribe_function
+
+    connection = _connection()
+    key = TRANSCRIPTION_KEY.format(backend=backend, digest=digest)
+    stored = connection.get(key)
+    if stored is not None:
+        return stored.decode()
+    transcription = get_transcribe_function(backend)(audio_path)
+    connection.set(key, transcription, ex=JOB_RESULT_TTL)
+    return transcription
+
+
+def score_stage(request_id: str, backend: str, digest: str, reference: str) -> dict:
+    connection = _connection()
+    hypothesis = _transcription(connection, backend, digest)
+    scores = score(backend, reference, hypothesis)
+    connection.hset(RESULT_KEY.format(request_id=request_id), mapping={
+        "reference": reference, "transcription": hypothesis, "scores": json.dumps(scores),
+    })
+    return scores
+
+
+def align_stage(request_id: str, backend: str, digest: str, task: str, vocab_set: str, ground_truth: str,
+                llm: bool = False, lexicon: Optional[dict] = None) -> str:
+    from main import get_alignment, get_LLM_alignment
+
+    connection = _connection()
+    prediction = _transcription(connection, backend, digest)
+    if llm:
+        alignment = get_LLM_alignment(task, vocab_set, ground_truth, prediction, lexicon=lexicon)
+        fields = {"alignment": alignment}
+    else:
+        report = get_alignment(task, vocab_set, ground_truth, prediction, lexicon=lexicon)
+        alignment = report.to_markdown()
+        fields = {"alignment": alignment, "alignment_wer": report.wer}
+    connection.hset(RESULT_KEY.format(request_id=request_id), mapping=fields)
+    return alignment
+
+
+def get_result(connection, request_id: str) -> dict:
+    """
+    Everything stored so far for a request (clip, transcription, scores,
+    alignment), or an empty dict for an unknown request.
+    """
+    result = {k.decode(): v.decode() for k, v in connection.hgetall(RESULT_KEY.format(request_id=request_id)).items()}
+    if "scores" in result:
+        result["scores"] = json.loads(result["scores"])
+    if "alignment_wer" in result:
+        result["alignment_wer"] = float(result["alignment_wer"])
+    return result
+
+
+def stage_stats(connection) -> Dict[str, dict]:
+    """
+    Per-stage queue depth, finished/failed counts, mean job time and
+    throughput (finished jobs per second between the first start and the
+    last end), from rq's job registries.
+    """
+    from rq.job import Job
+
+    stats = {}
+    for stage, queue in get_queues(connection).items():
+        finished = [job for job in Job.fetch_many(queue.finished_job_registry.get_job_ids(), connection=connection)
+                    if job is not None and job.started_at and job.ended_at]
+        durations = [(job.ended_at - job.started_at).total_seconds() for job in finished]
+        summary = {
+            "queued": queue.count,
+            "deferred": queue.deferred_job_registry.count,
+            "finished": len(finished),
+            "failed": queue.failed_job_registry.count,
+        }
+        if finished:
+            span = (max(job.ended_at for job in finished) - min(job.started_at for job in finished)).total_seconds()
+            summary["mean_seconds"] = sum(durations) / len(durations)
+            summary["jobs_per_second"] = len(finished) / span if span > 0 else None
+        stats[stage] = summary
+    return stats
+
+
+def run_worker(stages=STAGES, connection=None, burst: bool = False, logging_level: str = "INFO"):
+    """
+    Processes jobs from the given stage queues until stopped (or, with
+    burst, until they are empty).
+
+    Jobs run in the worker process itself rather than rq's default forked
+    child, so a backend loaded by the model registry stays resident across
+    jobs instead of being reloaded for every clip.
+    """
+    from rq import SimpleWorker
+
+    connection = connection or get_connection()
+    queues = get_queues(connection)
+    SimpleWorker([queues[stage] for stage in stages], connection=connection).work(burst=burst, logging_level=logging_level)
+
+
+def _worker_process(stages, url, burst, logging_level):
+    run_worker(stages, get_connection(url), burst, logging_level)
+
+
+def start_workers(stage: str, count: int, url: Optional[str] = None, burst: bool = False,
+                  logging_level: str = "INFO"):
+    """
+    Starts count worker processes for one stage and waits for them.
+    """
+    processes = [Process(target=_worker_process, args=((stage,), url, burst, logging_level)) for _ in range(count)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue-based transcription -> scoring -> alignment pipeline.")
+    parser.add_argument("--redis-url", default=None, help=f"Defaults to ${REDIS_URL_ENV} or {DEFAULT_REDIS_URL}")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit_parser = commands.add_parser("submit", help="Queue every clip in audio-dir that has a reference")
+    submit_parser.add_argument("--backend", required=True, choices=sorted(BACKENDS))
+    submit_parser.add_argument("--audio-dir", default="data/audio")
+    submit_parser.add_argument("--text-dir", default="data/text")
+    submit_parser.add_argument("--task", choices=["word", "letter"], default=None)
+    submit_parser.add_argument("--vocab-set", default=None)
+    submit_parser.add_argument("--lexicon", default=None, help="JSON file {word: pronunciation(s)} (word task)")
+    submit_parser.add_argument("--llm", action="store_true", help="Align with the LLM instead of locally")
+
+    worker_parser = commands.add_parser("worker", help="Run workers for one stage")
+    worker_parser.add_argument("--stage", required=True, choices=STAGES)
+    worker_parser.add_argument("--count", type=int, default=1)
+    worker_parser.add_argument("--burst", action="store_true", help="Exit once the queue is empty")
+
+    commands.add_parser("status", help="Per-stage queue depth and throughput")
+    result_parser = commands.add_parser("result", help="Stored results of one request")
+    result_parser.add_argument("request_id")
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        start_workers(args.stage, args.count, args.redis_url, args.burst)
+        return
+
+    connection = get_connection(args.redis_url)
+    if args.command == "submit":
+        lexicon = None
+        if args.lexicon:
+            with open(args.lexicon) as f:
+                lexicon = json.load(f)
+        for audio_path, reference_path in discover_pairs(args.audio_dir, args.text_dir, args.backend):
+            reference = Path(reference_path).read_text().strip()
+            submitted = submit(connection, audio_path, args.backend, reference, args.task, args.vocab_set, args.llm,
+                               lexicon)
+            print(f"{Path(audio_path).name}: {submitted['request']} "
+                  f"({', '.join(submitted['enqueued']) or 'already submitted'})")
+    elif args.command == "status":
+        print(json.dumps(stage_stats(connection), indent=2))
+    else:
+        print(json.dumps(get_result(connection, args.request_id), indent=2))
+
+
+if __name__ == "__main__":
+    main()
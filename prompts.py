@@ -1,12 +1,25 @@
-def get_word_prompt(vocab_set_word, ground_truth_word, prediction_word):
-    return f"""
+from functools import lru_cache
+from typing import List, Optional
+
+from utils.alignment import EMPTY, align_phonemes
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Prompt layouts:
+#   full:    the original prompt, data first and the full few-shot example after it
+#   prefix:  the same text with the static instructions and example first, so
+#            providers that cache repeated prompt prefixes can reuse them
+#   compact: static part first with a short, unpadded few-shot example
+PROMPT_STYLES = ("full", "prefix", "compact")
+
+WORD_INSTRUCTIONS = """
 I want two tables:
 
 1. Table 1: Align the ground truth with the predicted phonemes for words in the word bank. 
 2. Table 2: Provide the Word Error Rate (WER) table according to this equation: (S + D + I) / N, where S = substitutions, D = deletions, I = insertions, N = total number of words in reference.
+"""
 
-WORD BANK: {vocab_set_word} GROUND TRUTH PHONEMES (REF): {ground_truth_word} PREDICTED PHONEMES (HYP): {prediction_word}
-
+WORD_EXAMPLE = """
 Few shot example: 
 Here is an example of the formatting response I want. 
 
@@ -90,13 +103,34 @@ So, WER = (# of incorrect words / total words) = 19 / 30 ≈ 63.3%
 End of example.
 """
 
+WORD_EXAMPLE_COMPACT = """
+Example response (abbreviated; give one row per word in the reference):
 
-def get_letter_prompt(vocab_set_letter, ground_truth_letter, prediction_letter):
-    return f"""
-Align the ground truth with the predicted phonemes for letters in the letter bank. 
+| Word | Ground truth (ref) | Pred (aligned) | Per-phoneme result |
+| - | - | - | - |
+| about | AH B AW T | AH B AH T | AH B **AW→AH** T |
+| from | F R AH M | F ∅ AH N | F **R→∅** AH **M→N** |
+| all | AO L | ∅ ∅ | **AO→∅ L→∅** |
+| two | T UW | T UW | T UW |
+| when | OW EH N | ∅ AE N | **OW→∅ EH→AE** N |
 
-LETTER BANK: {vocab_set_letter} GROUND TRUTH PHONEMES (REF): {ground_truth_letter} PREDICTED PHONEMES (HYP): {prediction_letter}
+Errors:
+| Word | Correct? | Error type |
+| - | - | - |
+| about | ❌ | AW→AH (sub) |
+| from | ❌ | R→∅ (deletion), M→N (sub) |
+| all | ❌ | AO→∅, L→∅ (deletions) |
+| two | ✅ | correct |
+| when | ❌ | OW→∅ (deletion), EH→AE (sub) |
+
+Total words = 5, Correct = 1, Incorrect = 4, WER = 4 / 5 = 80.0%
+"""
 
+LETTER_INSTRUCTIONS = """
+Align the ground truth with the predicted phonemes for letters in the letter bank. 
+"""
+
+LETTER_EXAMPLE = """
 Few shot example: 
 Here is an example of the formatting response I want. 
 
@@ -143,3 +177,172 @@ Here is an example of the formatting response I want.
 | K    | K EY               | K EY           | K EY               |
 | Z    | Z IY               | Z IY           | Z IY               |
 """
+
+LETTER_EXAMPLE_COMPACT = """
+Example response (abbreviated; give one row per letter in the reference):
+
+| Word | Ground truth (ref) | Pred (aligned) | Per-phoneme result |
+| - | - | - | - |
+| R | AA R | AA ∅ | AA **R→∅** |
+| A | EY | EY | EY |
+| N | EH N | ∅ ∅ | **EH→∅** **N→∅** |
+| O | OW | ∅ | **OW→∅** |
+| K | K EY | K EY | K EY |
+"""
+
+
+def get_word_prompt(vocab_set_word, ground_truth_word, prediction_word):
+    return f"""{WORD_INSTRUCTIONS}
+WORD BANK: {vocab_set_word} GROUND TRUTH PHONEMES (REF): {ground_truth_word} PREDICTED PHONEMES (HYP): {prediction_word}
+{WORD_EXAMPLE}"""
+
+
+def get_letter_prompt(vocab_set_letter, ground_truth_letter, prediction_letter):
+    return f"""{LETTER_INSTRUCTIONS}
+LETTER BANK: {vocab_set_letter} GROUND TRUTH PHONEMES (REF): {ground_truth_letter} PREDICTED PHONEMES (HYP): {prediction_letter}
+{LETTER_EXAMPLE}"""
+
+
+_TEMPLATES = {
+    "word": (WORD_INSTRUCTIONS, WORD_EXAMPLE, WORD_EXAMPLE_COMPACT, "WORD BANK", ", "),
+    "letter": (LETTER_INSTRUCTIONS, LETTER_EXAMPLE, LETTER_EXAMPLE_COMPACT, "LETTER BANK", " "),
+}
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """
+    Number of tokens text costs with model's tokenizer. Falls back to an
+    estimate of four characters per token when tiktoken is not installed.
+    """
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text))
+
+
+def build_prompt(task: str, vocab_set: str, ground_truth: str, prediction: str, style: str = "full") -> str:
+    """
+    Renders the alignment prompt for one recording in one of PROMPT_STYLES.
+    """
+    if task not in _TEMPLATES:
+        raise ValueError(f"Unknown task type: {task}")
+    if style not in PROMPT_STYLES:
+        raise ValueError(f"Unknown prompt style: {style}")
+
+    if style == "full":
+        prompt = get_word_prompt if task == "word" else get_letter_prompt
+        return prompt(vocab_set, ground_truth, prediction)
+
+    instructions, example, compact_example, bank_label, _ = _TEMPLATES[task]
+    example = compact_example if style == "compact" else example
+    data = f"{bank_label}: {vocab_set} GROUND TRUTH PHONEMES (REF): {ground_truth} PREDICTED PHONEMES (HYP): {prediction}"
+    return f"{instructions}{example}\nNow do the same for this recording.\n\n{data}\n"
+
+
+def build_prompts(task: str, vocab_set: str, ground_truth: str, prediction: str, style: str = "full",
+                  max_tokens: Optional[int] = None, lexicon=None, model: str = DEFAULT_MODEL) -> List[str]:
+    """
+    Renders the prompt, splitting the recording into several prompts when it
+    would exceed max_tokens.
+
+    The reference is segmented into words and the prediction divided between
+    them with the same alignment as utils.alignment, so consecutive words
+    (with the phonemes heard for them, insertions included) are packed into
+    chunks that each fit the budget. Each chunk's bank lists only its words.
+
+    Args:
+        task (str): 'word' or 'letter'
+        vocab_set (str): Word or letter bank
+        ground_truth (str): Reference phonemes (or bank entries)
+        prediction (str): Predicted phonemes
+        style (str): One of PROMPT_STYLES
+        max_tokens (int): Token budget per prompt (None: no limit)
+        lexicon (dict): Pronunciations used to find word boundaries; required
+            to split word-task recordings (see align_phonemes)
+        model (str): Model whose tokenizer counts tokens
+
+    Returns:
+        list[str]: One prompt, or one per chunk, in reading order
+    """
+    prompt = build_prompt(task, vocab_set, ground_truth, prediction, style)
+    if max_tokens is None or count_tokens(prompt, model) <= max_tokens:
+        return [prompt]
+
+    separator = _TEMPLATES[task][4]
+    fixed = count_tokens(build_prompt(task, "", "", "", style), model)
+    if fixed > max_tokens:
+        raise ValueError(f"max_tokens={max_tokens} is below the {fixed} tokens of the prompt's fixed text")
+
+    words = align_phonemes(task, vocab_set, ground_truth, prediction, lexicon=lexicon).words
+
+    def render(chunk):
+        bank = separator.join(dict.fromkeys(word.word for word in chunk))
+        ref = " ".join(phoneme for word in chunk for phoneme in word.ref)
+        hyp = " ".join(phoneme for word in chunk for phoneme in word.pred if phoneme != EMPTY)
+        return build_prompt(task, bank, ref, hyp, style)
+
+    prompts, chunk = [], []
+    for word in words:
+        if chunk and count_tokens(render(chunk + [word]), model) > max_tokens:
+            prompts.append(render(chunk))
+            chunk = []
+        # A single word over the budget still gets its own prompt
+        chunk.append(word)
+    if chunk:
+        prompts.append(render(chunk))
+    return prompts
+
+
+JSON_INSTRUCTIONS = """
+Align the predicted phonemes (HYP) with the ground truth phonemes (REF) of a child's reading, one entry per {unit} of the reference in reading order.
+
+Reply with JSON only, in this form:
+{{"words": [{{"word": ..., "ref": [...], "pred": [...], "ops": [...]}}, ...]}}
+
+- ref and pred are the aligned phonemes of the {unit}, with "∅" where one side has no phoneme.
+- ops has one code per position: "C" correct, "S" substitution, "D" deletion (pred is "∅"), "I" insertion (ref is "∅").
+- Use the fewest errors possible. Every REF phoneme and every HYP phoneme appears exactly once, in order.
+
+Example:
+{{"words": [{{"word": "about", "ref": ["AH", "B", "AW", "T"], "pred": ["AH", "B", "AH", "T"], "ops": ["C", "C", "S", "C"]}}, {{"word": "from", "ref": ["F", "R", "AH", "M"], "pred": ["F", "∅", "AH", "N"], "ops": ["C", "D", "C", "S"]}}, {{"word": "two", "ref": ["T", "UW"], "pred": ["T", "UW"], "ops": ["C", "C"]}}]}}
+"""
+
+
+def get_json_prompt(task, vocab_set, ground_truth, prediction):
+    """
+    Prompt for the structured (JSON) alignment of a whole recording.
+    """
+    if task not in _TEMPLATES:
+        raise ValueError(f"Unknown task type: {task}")
+    bank_label = _TEMPLATES[task][3]
+    instructions = JSON_INSTRUCTIONS.format(unit="word" if task == "word" else "letter")
+    return (f"{instructions}\n{bank_label}: {vocab_set} GROUND TRUTH PHONEMES (REF): {ground_truth} "
+            f"PREDICTED PHONEMES (HYP): {prediction}\n")
+
+
+def get_json_requery_prompt(task, words):
+    """
+    Prompt asking again for only some words, each with its own reference and
+    predicted phonemes.
+
+    Args:
+        task (str): 'word' or 'letter'
+        words: List of (word, ref_phonemes, pred_phonemes) with phonemes as lists
+    """
+    if task not in _TEMPLATES:
+        raise ValueError(f"Unknown task type: {task}")
+    instructions = JSON_INSTRUCTIONS.format(unit="word" if task == "word" else "letter")
+    lines = "\n".join(f"- {word}: REF: {' '.join(ref)} HYP: {' '.join(pred) or '(nothing)'}" for word, ref, pred in words)
+    return f"{instructions}\nAlign each of these separately, one entry each, in this order:\n{lines}\n"
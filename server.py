@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Union
+
+from fastapi import FastAPI, HTTPException, Request
+from pydantic import BaseModel
+
+from evaluate import score
+from models.registry import BACKENDS, get_batch_transcribe_function, registry
+from utils.alignment import align_phonemes
+from utils.batching import MicroBatcher
+from utils.metrics import compute_error_rates
+
+# Backends loaded at startup (comma-separated); others load on first request
+BACKENDS_ENV = "BAIR_SERVE_BACKENDS"
+MAX_BATCH_ENV = "BAIR_MAX_BATCH"
+MAX_WAIT_ENV = "BAIR_MAX_WAIT_MS"
+
+_batchers: Dict[str, MicroBatcher] = {}
+
+
+def get_batcher(backend: str) -> MicroBatcher:
+    """
+    The micro-batcher that groups concurrent requests for one backend.
+    """
+    if backend not in _batchers:
+        transcribe_batch = get_batch_transcribe_function(backend)
+        _batchers[backend] = MicroBatcher(
+            transcribe_batch,
+            max_batch_size=int(os.environ.get(MAX_BATCH_ENV, 8)),
+            max_wait_ms=float(os.environ.get(MAX_WAIT_ENV, 10)),
+        )
+    return _batchers[backend]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    names = [name.strip() for name in os.environ.get(BACKENDS_ENV, "").split(",") if name.strip()]
+    for name in names:
+        if name not in BACKENDS:
+            raise KeyError(f"Unknown model backend: {name}")
+        # Load each model once, before the first request arrives
+        await asyncio.get_running_loop().run_in_executor(None, registry.get, name)
+        get_batcher(name)
+    yield
+    for batcher in _batchers.values():
+        await batcher.close()
+
+
+app = FastAPI(title="BAIR K-Function speech service", lifespan=lifespan)
+
+
+class ScoreRequest(BaseModel):
+    reference: str
+    hypothesis: str
+    unit: str = "word"  # word (WER), char (CER) or phoneme (PER)
+
+
+class AlignRequest(BaseModel):
+    task: str  # word or letter
+    vocab_set: str
+    ground_truth: str
+    prediction: str
+    lexicon: Optional[Dict[str, Union[str, list]]] = None
+
+
+@app.get("/health")
+def health():
+    return {
+        "models": registry.stats(),
+        "batchers": {name: batcher.stats() for name, batcher in _batchers.items()},
+    }
+
+
+def _write_temp(audio: bytes) -> str:
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+        f.write(audio)
+        return f.name
+
+
+@app.post("/transcribe/{backend}")
+async def transcribe(backend: str, request: Request, reference: Optional[str] = None):
+    """
+    Transcribes the audio file sent as the request body. With a reference
+    (text, or phonemes for huper), the transcription is also scored.
+    """
+    if backend not in BACKENDS:
+        raise HTTPException(status_code=404, detail=f"Unknown model backend: {backend}")
+    audio = await request.body()
+    if not audio:
+        raise HTTPException(status_code=400, detail="Send the audio file as the request body")
+
+    start = time.perf_counter()
+    path = await asyncio.to_thread(_write_temp, audio)
+    try:
+        transcription = await get_batcher(backend).submit(path)
+    except Exception as exc:
+        raise HTTPException(status_code=422, detail=f"Could not transcribe audio: {exc}")
+    finally:
+        os.unlink(path)
+
+    result = {
+        "backend": backend,
+        "transcription": transcription,
+        "latency_ms": round(1000 * (time.perf_counter() - start), 1),
+    }
+    if reference is not None:
+        result.update(score(backend, reference, transcription))
+    return result
+
+
+@app.post("/score")
+def score_text(body: ScoreRequest):
+    if not body.reference.strip():
+        raise HTTPException(status_code=400, detail="reference is empty")
+    try:
+        rate = compute_error_rates([(body.reference, body.hypothesis)], unit=body.unit)[0]
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"unit": body.unit, "error_rate": rate}
+
+
+@app.post("/align")
+def align(body: AlignRequest):
+    """
+    Local per-word phoneme alignment (the table the LLM prompt asks for).
+    """
+    try:
+        report = align_phonemes(body.task, body.vocab_set, body.ground_truth, body.prediction, body.lexicon)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {
+        "wer": report.wer,
+        "total": report.total,
+        "correct": report.num_correct,
+        "words": [
+            {"word": w.word, "ref": w.ref, "pred": w.pred, "correct": w.correct, "error_type": w.error_type}
+            for w in report.words
+        ],
+        "markdown": report.to_markdown(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the transcription backends over HTTP.")
+    parser.add_argument("--backends", default=os.environ.get(BACKENDS_ENV, ""),
+                        help="Comma-separated backends to load at startup, e.g. hubert,huper")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch", type=int, default=8, help="Most requests run together in one batch")
+    parser.add_argument("--max-wait-ms", type=float, default=10, help="Longest wait for a batch to fill")
+    args = parser.parse_args()
+
+    os.environ[BACKENDS_ENV] = args.backends
+    os.environ[MAX_BATCH_ENV] = str(args.max_batch)
+    os.environ[MAX_WAIT_ENV] = str(args.max_wait_ms)
+
+    import uvicorn
+
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
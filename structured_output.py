@@ -0,0 +1,155 @@
+import json
+import re
+from typing import Dict, List, Optional, Sequence
+
+from utils.alignment import EMPTY, WordAlignment
+from utils.metrics import Alignment, edit_distance
+
+OPS = ("C", "S", "D", "I")
+
+# Shape of the reply requested in JSON mode: one entry per reference word,
+# with aligned ref/pred phonemes ("∅" on the missing side) and one op each.
+ALIGNMENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "words": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "word": {"type": "string"},
+                    "ref": {"type": "array", "items": {"type": "string"}},
+                    "pred": {"type": "array", "items": {"type": "string"}},
+                    "ops": {"type": "array", "items": {"type": "string", "enum": list(OPS)}},
+                },
+                "required": ["word", "ref", "pred", "ops"],
+            },
+        },
+    },
+    "required": ["words"],
+}
+
+
+def parse_reply(text: str) -> List[dict]:
+    """
+    Extracts the word entries from a JSON-mode reply. Tolerates a Markdown
+    code fence around the JSON; raises ValueError if there is no valid
+    {"words": [...]} object.
+    """
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+    try:
+        data = json.loads(fenced.group(1) if fenced else text)
+    except json.JSONDecodeError as exc:
+        raise ValueError(f"Reply is not valid JSON: {exc}") from None
+    if not isinstance(data, dict) or not isinstance(data.get("words"), list):
+        raise ValueError('Reply does not contain a "words" list')
+    return data["words"]
+
+
+def check_entry(entry) -> Optional[str]:
+    """
+    Validates one word entry against ALIGNMENT_SCHEMA and the meaning of its
+    ops. Returns a description of the first problem, or None if it is valid.
+    """
+    if not isinstance(entry, dict):
+        return "entry is not an object"
+    for field in ("ref", "pred", "ops"):
+        if not isinstance(entry.get(field), list) or not all(isinstance(x, str) for x in entry[field]):
+            return f"{field} is not a list of strings"
+    if not isinstance(entry.get("word"), str):
+        return "word is not a string"
+
+    ref, pred, ops = entry["ref"], entry["pred"], entry["ops"]
+    if not len(ref) == len(pred) == len(ops):
+        return "ref, pred and ops have different lengths"
+    for r, p, op in zip(ref, pred, ops):
+        if op not in OPS:
+            return f"unknown op {op!r}"
+        r, p = r.upper(), p.upper()
+        if op == "C" and (r != p or r == EMPTY):
+            return f"C op on {r}→{p}"
+        if op == "S" and (r == p or EMPTY in (r, p)):
+            return f"S op on {r}→{p}"
+        if op == "D" and (r == EMPTY or p != EMPTY):
+            return f"D op on {r}→{p}"
+        if op == "I" and (r != EMPTY or p == EMPTY):
+            return f"I op on {r}→{p}"
+
+    # The ops must be a minimum-cost alignment of the word's phonemes
+    claimed = sum(op != "C" for op in ops)
+    minimal = edit_distance(_phonemes(ref), _phonemes(pred))
+    if claimed != minimal:
+        return f"{claimed} errors claimed but the minimum is {minimal}"
+    return None
+
+
+def _phonemes(aligned: Sequence[str]) -> List[str]:
+    return [p.upper() for p in aligned if p != EMPTY]
+
+
+def to_word_alignment(entry: dict) -> WordAlignment:
+    word = WordAlignment(entry["word"], _phonemes(entry["ref"]))
+    word.pred = [p.upper() for p in entry["pred"]]
+    word.ops = [(op, None if r == EMPTY else r.upper(), None if p == EMPTY else p.upper())
+                for op, r, p in zip(entry["ops"], entry["ref"], entry["pred"])]
+    return word
+
+
+def find_disagreements(entries: List, ground_truth: Sequence[str], prediction: Sequence[str],
+                       expected: Optional[List[WordAlignment]] = None) -> Dict[int, str]:
+    """
+    Indices of word entries that cannot be accepted, with the reason.
+
+    Each entry must be valid on its own (check_entry). Together, the entries
+    must cover the reference and the prediction exactly, in order. When the
+    local alignment (expected) is available, each entry must also cover the
+    same reference phonemes as its word; prediction phonemes may move
+    between neighbouring words, but if the whole prediction is not covered,
+    the entries whose phonemes differ from the local alignment are blamed.
+    Without expected, a reply with no entries that should have some is
+    reported under index -1.
+    """
+    problems = {}
+    for index, entry in enumerate(entries):
+        problem = check_entry(entry)
+        if problem:
+            problems[index] = problem
+
+    if expected is None:
+        valid = [entry for index, entry in enumerate(entries) if index not in problems]
+        ref_covered = [p for entry in valid for p in _phonemes(entry["ref"])] == [p.upper() for p in ground_truth]
+        pred_covered = [p for entry in valid for p in _phonemes(entry["pred"])] == [p.upper() for p in prediction]
+        if not problems and not (ref_covered and pred_covered):
+            # Without word boundaries there is no way to tell which entry is wrong;
+            # with no entries at all, -1 stands for the whole reply
+            problem = "entries do not cover the reference and prediction"
+            problems.update({index: problem for index in range(len(entries))} or {-1: problem})
+        return problems
+
+    if len(entries) != len(expected):
+        return {index: f"expected {len(expected)} words, got {len(entries)}" for index in range(len(expected))}
+
+    for index, (entry, word) in enumerate(zip(entries, expected)):
+        if index not in problems and _phonemes(entry["ref"]) != word.ref:
+            problems[index] = f"reference phonemes differ from {' '.join(word.ref)}"
+
+    # Entries being re-queried will get the local alignment's prediction phonemes
+    preds = [_phonemes(word.pred) if index in problems else _phonemes(entry["pred"])
+             for index, (entry, word) in enumerate(zip(entries, expected))]
+    if [p for pred in preds for p in pred] != [p.upper() for p in prediction]:
+        for index, (entry, word) in enumerate(zip(entries, expected)):
+            if index not in problems and preds[index] != _phonemes(word.pred):
+                problems[index] = "prediction phonemes do not line up with the recording"
+    return problems
+
+
+def phoneme_alignment(words: List[WordAlignment]) -> Alignment:
+    """
+    The passage-level utils.metrics Alignment implied by the per-word ops,
+    e.g. for its phoneme error rate.
+    """
+    ops = "".join(op for word in words for op, _, _ in word.ops)
+    ref = [p for word in words for p in word.ref]
+    hyp = [p for word in words for p in word.pred if p != EMPTY]
+    return Alignment(ref, hyp, ops)
+
@@ -0,0 +1,304 @@
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from utils.metrics import align
+
+EMPTY = "∅"
+
+# ARPAbet pronunciations of the letter names (CMU Pronouncing Dictionary)
+LETTER_LEXICON = {
+    "A": ["EY"],
+    "B": ["B IY"],
+    "C": ["S IY"],
+    "D": ["D IY"],
+    "E": ["IY"],
+    "F": ["EH F"],
+    "G": ["JH IY"],
+    "H": ["EY CH"],
+    "I": ["AY"],
+    "J": ["JH EY"],
+    "K": ["K EY"],
+    "L": ["EH L"],
+    "M": ["EH M"],
+    "N": ["EH N"],
+    "O": ["OW"],
+    "P": ["P IY"],
+    "Q": ["K Y UW"],
+    "R": ["AA R"],
+    "S": ["EH S"],
+    "T": ["T IY"],
+    "U": ["Y UW"],
+    "V": ["V IY"],
+    "W": ["D AH B AH L Y UW"],
+    "X": ["EH K S"],
+    "Y": ["W AY"],
+    "Z": ["Z IY"],
+}
+
+UNKNOWN_WORD = "?"
+
+# Segmentation costs: words from the bank are free, other lexicon words are
+# cheap, and phonemes no lexicon entry explains are the most expensive.
+_BANK_WORD_COST = 0
+_LEXICON_WORD_COST = 1
+_UNKNOWN_PHONEME_COST = 2
+
+Lexicon = Dict[str, Union[str, Sequence[str]]]
+
+
+def parse_vocab_set(vocab_set: str) -> List[str]:
+    """
+    Splits a comma- or space-separated word/letter bank into its entries.
+    """
+    return [entry for entry in re.split(r"[,\s]+", vocab_set.strip()) if entry]
+
+
+def _pronunciations(lexicon: Lexicon) -> Dict[str, List[Tuple[str, ...]]]:
+    """
+    Normalizes a lexicon to {lowercase word: [phoneme tuples]}.
+    """
+    normalized = {}
+    for word, prons in lexicon.items():
+        if isinstance(prons, str):
+            prons = [prons]
+        normalized[word.lower()] = [tuple(p.upper().split()) for p in prons]
+    return normalized
+
+
+def segment_reference(ref_phonemes: Sequence[str], lexicon: Lexicon, bank: Iterable[str] = ()) -> List[Tuple[str, List[str]]]:
+    """
+    Splits a flat reference phoneme sequence into words.
+
+    Finds the cheapest cover of the sequence by lexicon pronunciations,
+    preferring words from the bank. Runs of phonemes no entry explains are
+    returned as a single UNKNOWN_WORD segment.
+
+    Args:
+        ref_phonemes: Reference phonemes
+        lexicon: {word: pronunciation or list of pronunciations}
+        bank: Words expected in the recording
+
+    Returns:
+        list[tuple[str, list[str]]]: (word, phonemes) in reading order
+    """
+    ref = [p.upper() for p in ref_phonemes]
+    prons = _pronunciations(lexicon)
+    bank_words = {w.lower() for w in bank}
+    display = {w.lower(): w for w in lexicon}
+    display.update({w.lower(): w for w in bank})
+
+    candidates = {}  # first phoneme -> [(word, phonemes, cost)]
+    for word, word_prons in prons.items():
+        cost = _BANK_WORD_COST if word in bank_words else _LEXICON_WORD_COST
+        for pron in word_prons:
+            if pron:
+                candidates.setdefault(pron[0], []).append((word, pron, cost))
+
+    n = len(ref)
+    inf = (float("inf"), 0)
+    best = [inf] * (n + 1)  # (cost, number of segments) to cover ref[:i]
+    back = [None] * (n + 1)  # (start, word or None)
+    best[0] = (0, 0)
+
+    for i in range(n):
+        if best[i] == inf:
+            continue
+        cost, segments = best[i]
+
+        step = (cost + _UNKNOWN_PHONEME_COST, segments + 1)
+        if step < best[i + 1]:
+            best[i + 1], back[i + 1] = step, (i, None)
+
+        for word, pron, word_cost in candidates.get(ref[i], ()):
+            end = i + len(pron)
+            if end <= n and tuple(ref[i:end]) == pron:
+                step = (cost + word_cost, segments + 1)
+                if step < best[end]:
+                    best[end], back[end] = step, (i, word)
+
+    result = []
+    i = n
+    while i > 0:
+        start, word = back[i]
+        if word is None and result and result[-1][0] == UNKNOWN_WORD:
+            result[-1] = (UNKNOWN_WORD, ref[start:i] + result[-1][1])
+        else:
+            result.append((UNKNOWN_WORD if word is None else display[word], ref[start:i]))
+        i = start
+    result.reverse()
+    return result
+
+
+class WordAlignment:
+    """
+    One row of the alignment table: a reference word and what was heard.
+    """
+    __slots__ = ("word", "ref", "pred", "ops")
+
+    def __init__(self, word: str, ref: List[str]):
+        self.word = word
+        self.ref = ref
+        self.pred = []  # aligned prediction, EMPTY for deleted phonemes
+        self.ops = []  # (op, ref_phoneme, hyp_phoneme) from the edit-distance traceback
+
+    @property
+    def correct(self) -> bool:
+        return all(op == "C" for op, _, _ in self.ops)
+
+    @property
+    def result(self) -> str:
+        """
+        Per-phoneme result, with errors in bold as REF→HYP.
+        """
+        parts = []
+        for op, ref_phoneme, hyp_phoneme in self.ops:
+            if op == "C":
+                parts.append(ref_phoneme)
+            else:
+                parts.append(f"**{ref_phoneme or EMPTY}→{hyp_phoneme or EMPTY}**")
+        return " ".join(parts)
+
+    @property
+    def errors(self) -> List[str]:
+        labels = {"S": "sub", "D": "deletion", "I": "insertion"}
+        return [f"{ref_phoneme or EMPTY}→{hyp_phoneme or EMPTY} ({labels[op]})"
+                for op, ref_phoneme, hyp_phoneme in self.ops if op != "C"]
+
+    @property
+    def error_type(self) -> str:
+        return ", ".join(self.errors) or "correct"
+
+
+class AlignmentReport:
+    """
+    Per-word alignment of predicted phonemes against the reference, with
+    word-level WER = (# incorrect words) / (total words).
+    """
+
+    def __init__(self, words: List[WordAlignment]):
+        self.words = words
+
+    @property
+    def total(self) -> int:
+        return len(self.words)
+
+    @property
+    def num_correct(self) -> int:
+        return sum(word.correct for word in self.words)
+
+    @property
+    def num_incorrect(self) -> int:
+        return self.total - self.num_correct
+
+    @property
+    def wer(self) -> float:
+        return self.num_incorrect / self.total if self.total else 0.0
+
+    def to_markdown(self) -> str:
+        """
+        Renders the same two tables the LLM prompt asks for.
+        """
+        def table(header, rows):
+            widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+            lines = [header, ["-" * w for w in widths]] + rows
+            return "\n".join(
+                "| " + " | ".join(str(cell).ljust(w) for cell, w in zip(line, widths)) + " |"
+                for line in lines
+            )
+
+        alignment = table(
+            ["Word", "Ground truth (ref)", "Pred (aligned)", "Per-phoneme result"],
+            [[w.word, " ".join(w.ref), " ".join(w.pred), w.result] for w in self.words],
+        )
+        errors = table(
+            ["Word", "Correct?", "Error type"],
+            [[w.word, "✅" if w.correct else "❌", w.error_type] for w in self.words],
+        )
+        summary = (
+            f"Total words = {self.total}\n\n"
+            f"Correct = {self.num_correct}\n\n"
+            f"Incorrect = {self.num_incorrect}\n\n"
+            f"So, WER = (# of incorrect words / total words) = "
+            f"{self.num_incorrect} / {self.total} ≈ {100 * self.wer:.1f}%"
+        )
+        return f"{alignment}\n\nErrors:\n{errors}\n\n{summary}"
+
+
+def align_segments(segments: List[Tuple[str, List[str]]], prediction: Sequence[str]) -> AlignmentReport:
+    """
+    Aligns predicted phonemes against segmented reference words.
+
+    The whole sequence is aligned in one edit-distance traceback; each
+    operation is then attributed to the word owning its reference phoneme.
+    Insertions go to the preceding word (or the first word at the start).
+    """
+    words = [WordAlignment(word, list(phonemes)) for word, phonemes in segments]
+    owner = [index for index, (_, phonemes) in enumerate(segments) for _ in phonemes]
+    ref = [phoneme for _, phonemes in segments for phoneme in phonemes]
+    hyp = [p.upper() for p in prediction]
+
+    if not words:
+        return AlignmentReport(words)
+
+    ref_index = 0
+    current = 0
+    for op, ref_phoneme, hyp_phoneme in align(ref, hyp):
+        if op != "I":
+            current = owner[ref_index]
+            ref_index += 1
+        word = words[current]
+        word.ops.append((op, ref_phoneme, hyp_phoneme))
+        word.pred.append(hyp_phoneme or EMPTY)
+
+    return AlignmentReport(words)
+
+
+def reference_segments(task: str, vocab_set: str, ground_truth: str,
+                       lexicon: Optional[Lexicon] = None) -> List[Tuple[str, List[str]]]:
+    """
+    The reference as (word, phonemes) segments in reading order.
+
+    Args:
+        task (str): 'word' or 'letter'
+        vocab_set (str): Word or letter bank
+        ground_truth (str): Reference, either as phonemes or as bank entries
+        lexicon (dict): {word: pronunciation(s)}; defaults to LETTER_LEXICON
+            for the letter task and is required for the word task
+    """
+    if task == "letter":
+        lexicon = lexicon or LETTER_LEXICON
+    elif task == "word":
+        if lexicon is None:
+            raise ValueError("The word task needs a pronunciation lexicon for the word bank")
+    else:
+        raise ValueError(f"Unknown task type: {task}")
+
+    bank = parse_vocab_set(vocab_set)
+    prons = _pronunciations(lexicon)
+    display = {w.lower(): w for w in bank}
+    tokens = ground_truth.split()
+
+    if tokens and all(t.lower() in display and t.lower() in prons for t in tokens):
+        # Reference given as bank entries, e.g. "H B U H X Y R"
+        return [(display[t.lower()], list(prons[t.lower()][0])) for t in tokens]
+    return segment_reference(tokens, lexicon, bank)
+
+
+def align_phonemes(task: str, vocab_set: str, ground_truth: str, prediction: str,
+                   lexicon: Optional[Lexicon] = None) -> AlignmentReport:
+    """
+    Local, deterministic replacement for the LLM alignment table.
+
+    Args:
+        task (str): 'word' or 'letter'
+        vocab_set (str): Word or letter bank
+        ground_truth (str): Reference, either as phonemes or as bank entries
+        prediction (str): Space-separated predicted phonemes
+        lexicon (dict): {word: pronunciation(s)}; defaults to LETTER_LEXICON
+            for the letter task and is required for the word task
+
+    Returns:
+        AlignmentReport
+    """
+    segments = reference_segments(task, vocab_set, ground_truth, lexicon)
+    return align_segments(segments, prediction.split())
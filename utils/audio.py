@@ -0,0 +1,224 @@
+import os
+import struct
+from functools import lru_cache
+
+import numpy as np
+import soundfile as sf
+import torch
+import torchaudio
+
+from utils.feature_cache import get_default_cache
+from utils.tracing import span
+
+TARGET_SR = 16000
+
+# WAV (format tag, bits per sample) whose samples can be memory-mapped as is:
+# numpy dtype and the scale soundfile uses to bring them to [-1, 1)
+_WAV_DTYPES = {(1, 16): ("<i2", 1 / 2 ** 15), (1, 32): ("<i4", 1 / 2 ** 31), (3, 32): ("<f4", None)}
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+@lru_cache(maxsize=16)
+def get_resampler(orig_sr: int, target_sr: int = TARGET_SR) -> torchaudio.transforms.Resample:
+    """
+    Windowed-sinc resampler for one (orig_sr, target_sr) pair.
+    Building the kernel is the expensive part, so it is built once per pair.
+    """
+    return torchaudio.transforms.Resample(orig_sr, target_sr)
+
+
+def to_mono(audio: np.ndarray) -> np.ndarray:
+    """
+    Averages [samples, channels] audio down to one float32 channel.
+    Mono float32 input is returned as-is.
+    """
+    audio = audio.astype(np.float32, copy=False)
+    if audio.ndim > 1:
+        channels = audio.shape[1]
+        # A matrix-vector product downmixes far faster than a strided mean(axis=1)
+        audio = audio @ np.full(channels, 1 / channels, dtype=np.float32) if channels > 1 else audio[:, 0]
+    return np.ascontiguousarray(audio)
+
+
+def resample(waveform: np.ndarray, orig_sr: int, target_sr: int = TARGET_SR) -> np.ndarray:
+    """
+    Resamples a mono float32 waveform with the cached resampler for (orig_sr, target_sr).
+    """
+    if orig_sr == target_sr:
+        return waveform
+    if not waveform.flags.writeable:
+        waveform = waveform.copy()  # torch.from_numpy needs a writable array (e.g. a mapped WAV)
+    with torch.no_grad():
+        resampled = get_resampler(orig_sr, target_sr)(torch.from_numpy(waveform))
+    return resampled.numpy()
+
+
+def map_wav(audio_path: str):
+    """
+    Memory-maps the samples of an uncompressed WAV file (16/32-bit PCM or
+    32-bit float) without reading them.
+
+    Returns:
+        (samples, sample_rate, scale): read-only [frames, channels] memmap
+        and the factor that brings its integers to [-1, 1) (None for
+        float), or None if the file is anything else
+    """
+    with open(audio_path, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            return None
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = chunk[:4], int.from_bytes(chunk[4:], "little")
+            if chunk_id == b"data":
+                offset = f.tell()
+                break
+            if chunk_id == b"fmt ":
+                fmt = f.read(size)
+                f.seek(size % 2, os.SEEK_CUR)
+            else:
+                f.seek(size + size % 2, os.SEEK_CUR)  # chunks are word-aligned
+
+    if fmt is None or len(fmt) < 16:
+        return None
+    tag, channels, sample_rate = struct.unpack("<HHI", fmt[:8])
+    bits = struct.unpack("<H", fmt[14:16])[0]
+    if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        tag = struct.unpack("<H", fmt[24:26])[0]  # first two bytes of the subformat GUID
+    if (tag, bits) not in _WAV_DTYPES or channels == 0:
+        return None
+
+    dtype, scale = _WAV_DTYPES[tag, bits]
+    # Streamed WAVs can leave the data size unset (0 or 0xFFFFFFFF)
+    available = os.path.getsize(audio_path) - offset
+    frames = min(size or available, available) // (channels * bits // 8)
+    if frames == 0:
+        return None
+    samples = np.memmap(audio_path, dtype=dtype, mode="r", offset=offset, shape=(frames, channels))
+    return samples, sample_rate, scale
+
+
+def decode_audio(audio_path: str, target_sr: int = TARGET_SR) -> np.ndarray:
+    """
+    Decodes and resamples an audio file, bypassing the feature cache.
+
+    PCM and float WAV files are memory-mapped instead of read whole: a mono
+    float32 file already at target_sr is returned as a read-only memmap, and
+    other layouts are converted straight from the mapped samples. Other
+    formats are decoded with soundfile.
+    """
+    mapped = map_wav(audio_path)
+    if mapped is None:
+        audio, sr = sf.read(audio_path, dtype="float32")
+    else:
+        samples, sr, scale = mapped
+        audio = samples if scale is None else np.multiply(samples, np.float32(scale), dtype=np.float32)
+    return resample(to_mono(audio), sr, target_sr)
+
+
+def load_audio(audio_path: str, target_sr: int = TARGET_SR) -> np.ndarray:
+    """
+    Loads an audio file as a mono float32 waveform at target_sr.
+
+    WAV files are memory-mapped (see decode_audio) and anything else is
+    decoded by soundfile straight to float32, so a 16 kHz mono float file is
+    returned without being read into memory first. Every backend uses this loader, so the
+    same clip yields identical model input everywhere. When the feature
+    cache is enabled, previously decoded clips are memory-mapped from disk.
+    """
+    with span("audio.load") as s:
+        cache = get_default_cache()
+        if cache is None:
+            waveform = decode_audio(audio_path, target_sr)
+        else:
+            waveform = cache.get_or_compute(
+                audio_path, "waveform", lambda: decode_audio(audio_path, target_sr), sample_rate=target_sr
+            )
+        s.set(audio_seconds=len(waveform) / target_sr)
+        return waveform
+
+
+def iter_audio_blocks(audio_path: str, block_seconds: float, overlap_seconds: float = 0,
+                      target_sr: int = TARGET_SR):
+    """
+    Streams an audio file in (optionally overlapping) windows without loading it whole.
+
+    Yields:
+        (start, end, waveform): window bounds in seconds and the mono float32
+        waveform at target_sr. Consecutive windows share overlap_seconds.
+    """
+    if not 0 <= overlap_seconds < block_seconds:
+        raise ValueError("overlap_seconds must be in [0, block_seconds)")
+
+    sr = sf.info(audio_path).samplerate
+    blocksize = int(block_seconds * sr)
+    overlap = int(overlap_seconds * sr)
+    hop = blocksize - overlap
+
+    blocks = sf.blocks(audio_path, blocksize=blocksize, overlap=overlap, dtype="float32")
+    for index, block in enumerate(blocks):
+        # The last block can lie entirely inside the previous window
+        if index > 0 and len(block) <= overlap:
+            break
+        start = index * hop / sr
+        yield start, start + len(block) / sr, resample(to_mono(block), sr, target_sr)
+
+
+def waveform_blocks(waveform: np.ndarray, block_seconds: float, overlap_seconds: float = 0,
+                    sample_rate: int = TARGET_SR):
+    """
+    The windows of iter_audio_blocks (same bounds), cut from an already decoded
+    waveform instead of reading and resampling the file block by block.
+    """
+    if not 0 <= overlap_seconds < block_seconds:
+        raise ValueError("overlap_seconds must be in [0, block_seconds)")
+
+    blocksize = int(block_seconds * sample_rate)
+    overlap = int(overlap_seconds * sample_rate)
+    hop = blocksize - overlap
+    for offset in range(0, max(len(waveform), 1), hop):
+        block = waveform[offset:offset + blocksize]
+        if offset > 0 and len(block) <= overlap:
+            break
+        start = offset / sample_rate
+        yield start, start + len(block) / sample_rate, block
+
+
+def duration_seconds(audio_path: str) -> float:
+    """
+    Length of an audio file, read from its header only.
+    """
+    return sf.info(audio_path).duration
+
+
+def speech_end(waveform: np.ndarray, max_silence: float, sample_rate: int = TARGET_SR,
+               threshold_db: float = -35.0, frame_seconds: float = 0.02) -> int:
+    """
+    Sample index where the speaker stopped: the start of the first silence
+    longer than max_silence seconds after speech began, or the end of the
+    waveform. Frames quieter than threshold_db below the loudest frame count
+    as silence; the cut keeps a quarter-second margin.
+    """
+    frame = int(frame_seconds * sample_rate)
+    frames = len(waveform) // frame
+    if frames == 0:
+        return len(waveform)
+    energy = np.square(waveform[:frames * frame].reshape(frames, frame), dtype=np.float64).mean(axis=1)
+    loudness = 10 * np.log10(energy + 1e-12)
+    voiced = loudness > loudness.max() + threshold_db
+
+    run = 0
+    started = False
+    limit = int(max_silence / frame_seconds)
+    for index, is_voiced in enumerate(voiced):
+        if is_voiced:
+            started, run = True, 0
+        elif started:
+            run += 1
+            if run > limit:
+                end = (index - run + 1) * frame + int(0.25 * sample_rate)
+                return min(end, len(waveform))
+    return len(waveform)
@@ -0,0 +1,115 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence
+
+
+def load_concurrently(loader: Callable, paths: Sequence[str], num_workers: Optional[int] = 4) -> List:
+    """
+    Applies loader to every path on a thread pool, returning results in input order.
+    Audio decoding and resampling release the GIL, so threads overlap well.
+    """
+    if not num_workers or num_workers <= 1 or len(paths) <= 1:
+        return [loader(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=min(num_workers, len(paths))) as pool:
+        return list(pool.map(loader, paths))
+
+
+def length_sorted_batches(lengths: Sequence[int], batch_size: int) -> List[List[int]]:
+    """
+    Groups item indices into batches of similar length to minimize padding.
+
+    Args:
+        lengths: Length of each item (e.g. number of samples)
+        batch_size (int): Maximum items per batch
+
+    Returns:
+        list[list[int]]: Indices into the original sequence, longest batch first
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be at least 1, got {batch_size}")
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+class MicroBatcher:
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]], max_batch_size: int = 8,
+                 max_wait_ms: float = 10.0):
+        """
+        Groups concurrent requests into batches for a model server.
+
+        The first waiting item opens a batch; it is run as soon as it holds
+        max_batch_size items or max_wait_ms has passed, whichever is first.
+        process_batch (a blocking function from a list of items to a list of
+        results) runs on a worker thread, one batch at a time, so the event
+        loop keeps accepting requests meanwhile.
+        """
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be at least 1, got {max_batch_size}")
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.items = 0
+        self._queue = None
+        self._worker = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    async def submit(self, item):
+        """
+        Queues one item and waits for its result. If the batch fails, its
+        items are retried individually and each gets its own result or
+        exception.
+        """
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._process(loop, batch)
+            except Exception:
+                # Retry one by one so a single bad item (e.g. a corrupt upload)
+                # only fails its own request
+                for entry in batch:
+                    try:
+                        await self._process(loop, [entry])
+                    except Exception as exc:
+                        if not entry[1].done():
+                            entry[1].set_exception(exc)
+            self.batches += 1
+            self.items += len(batch)
+
+    async def _process(self, loop, batch):
+        items = [item for item, _ in batch]
+        results = await loop.run_in_executor(self._executor, self.process_batch, items)
+        if len(results) != len(items):
+            raise RuntimeError(f"process_batch returned {len(results)} results for {len(items)} items")
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "items": self.items,
+                "mean_batch_size": self.items / self.batches if self.batches else 0.0}
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+        self._executor.shutdown(wait=False)
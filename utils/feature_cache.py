@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+# Set to a directory to cache decoded waveforms and Whisper features across runs
+CACHE_DIR_ENV = "BAIR_FEATURE_CACHE"
+CACHE_SIZE_ENV = "BAIR_FEATURE_CACHE_MB"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+class FeatureCache:
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Content-addressed cache of arrays derived from audio files.
+
+        Entries are keyed by a hash of the audio file's bytes plus the kind of
+        feature and its configuration (e.g. target sample rate, feature
+        extractor settings), stored as .npy files and returned memory-mapped.
+        When the cache grows past max_bytes, least recently used entries are
+        deleted.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._digests = {}  # (path, size, mtime) -> file hash, so a run hashes each file once
+        self._total_bytes = None  # scanned lazily, then kept up to date on writes
+        self._lock = threading.Lock()
+
+    def file_digest(self, audio_path: str) -> str:
+        stat = os.stat(audio_path)
+        memo_key = (os.path.realpath(audio_path), stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(memo_key)
+        if digest is None:
+            hasher = hashlib.sha256()
+            with open(audio_path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    hasher.update(block)
+            digest = hasher.hexdigest()
+            self._digests[memo_key] = digest
+        return digest
+
+    def key(self, audio_path: str, kind: str, **config) -> str:
+        payload = json.dumps({"kind": kind, "config": config}, sort_keys=True, default=str)
+        return hashlib.sha256(f"{self.file_digest(audio_path)}:{payload}".encode()).hexdigest()
+
+    def _path(self, kind: str, key: str) -> Path:
+        return self.cache_dir / kind / key[:2] / f"{key}.npy"
+
+    def get(self, kind: str, key: str) -> Optional[np.ndarray]:
+        path = self._path(kind, key)
+        try:
+            array = np.load(path, mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            return None
+        os.utime(path)  # mark as recently used
+        return array
+
+    def put(self, kind: str, key: str, array: np.ndarray):
+        path = self._path(kind, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so readers never see a partial array
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(array))
+        size = tmp_path.stat().st_size
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self.size_bytes()
+            else:
+                self._total_bytes += size
+            over_budget = self.max_bytes is not None and self._total_bytes > self.max_bytes
+        if over_budget:
+            self._evict()
+
+    def get_or_compute(self, audio_path: str, kind: str, compute: Callable[[], np.ndarray], **config) -> np.ndarray:
+        """
+        Returns the cached array for (audio file, kind, config), computing and
+        storing it on a miss.
+        """
+        key = self.key(audio_path, kind, **config)
+        array = self.get(kind, key)
+        if array is not None:
+            with self._lock:
+                self.hits += 1
+            return array
+
+        with self._lock:
+            self.misses += 1
+        array = compute()
+        self.put(kind, key, array)
+        return array
+
+    def size_bytes(self) -> int:
+        return sum(path.stat().st_size for path in self.cache_dir.rglob("*.npy"))
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for path in self.cache_dir.rglob("*.npy"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+            self._total_bytes = total
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+_default_cache = None
+_default_cache_checked = False
+
+
+def get_default_cache() -> Optional[FeatureCache]:
+    """
+    The process-wide cache, configured from BAIR_FEATURE_CACHE (a directory)
+    and BAIR_FEATURE_CACHE_MB. Returns None when caching is not enabled.
+    """
+    global _default_cache, _default_cache_checked
+    if not _default_cache_checked:
+        _default_cache_checked = True
+        cache_dir = os.environ.get(CACHE_DIR_ENV)
+        if cache_dir:
+            max_mb = os.environ.get(CACHE_SIZE_ENV)
+            max_bytes = int(float(max_mb) * 1024 ** 2) if max_mb else DEFAULT_MAX_BYTES
+            _default_cache = FeatureCache(cache_dir, max_bytes)
+    return _default_cache
+
+
+def set_default_cache(cache: Optional[FeatureCache]):
+    """
+    Enables (or with None, disables) the process-wide cache.
+    """
+    global _default_cache, _default_cache_checked
+    _default_cache = cache
+    _default_cache_checked = True
@@ -1,88 +1,293 @@
-def compute_wer(reference: str, hypothesis: str) -> int:
+from typing import Dict, Hashable, Iterable, List, Sequence, Tuple
+
+from utils.tracing import span, traced
+
+
+def _pattern_masks(tokens: Sequence[Hashable]) -> Dict[Hashable, int]:
     """
-    Computes WER = (S + D + I) / N
+    Builds the per-token match bitmasks used by the bit-parallel Levenshtein.
+    Bit i of masks[t] is set when tokens[i] == t.
     """
-    ref_words = reference.lower().split()
-    hyp_words = hypothesis.lower().split()
+    masks = {}
+    bit = 1
+    for token in tokens:
+        masks[token] = masks.get(token, 0) | bit
+        bit <<= 1
+    return masks
 
-    dp = [[0] * (len(hyp_words) + 1) for _ in range(len(ref_words) + 1)]
 
-    for i in range(len(ref_words) + 1):
-        dp[i][0] = i
-    for j in range(len(hyp_words) + 1):
-        dp[0][j] = j
+def _bitparallel_distance(masks: Dict[Hashable, int], m: int, text: Sequence[Hashable]) -> int:
+    """
+    Levenshtein distance between a pattern of length m (given by its match
+    bitmasks) and text, using Hyyrö's bit-vector formulation of Myers' algorithm.
+    Each text token costs a constant number of big-int operations on m-bit words.
+    """
+    if m == 0:
+        return len(text)
 
-    # Fill matrix (Levenshtein distance)
-    for i in range(1, len(ref_words) + 1):
-        for j in range(1, len(hyp_words) + 1):
-            if ref_words[i - 1] == hyp_words[j - 1]:
-                dp[i][j] = dp[i - 1][j - 1]
-            else:
-                substitute = dp[i - 1][j - 1] + 1
-                insert = dp[i][j - 1] + 1
-                delete = dp[i - 1][j] + 1
-                dp[i][j] = min(substitute, insert, delete)
+    full = (1 << m) - 1
+    last = 1 << (m - 1)
+    vp = full  # vertical positive deltas
+    vn = 0  # vertical negative deltas
+    dist = m
 
-    wer = dp[len(ref_words)][len(hyp_words)] / len(ref_words)
-    return wer
+    for token in text:
+        eq = masks.get(token, 0)
+        d0 = ((((eq & vp) + vp) ^ vp) | eq | vn) & full
+        hp = vn | (~(d0 | vp) & full)
+        hn = d0 & vp
+        if hp & last:
+            dist += 1
+        elif hn & last:
+            dist -= 1
+        hp = (hp << 1) | 1
+        hn = hn << 1
+        vp = (hn | ~(d0 | hp)) & full
+        vn = hp & d0 & full
 
+    return dist
 
-def compute_cer(reference, hypothesis):
+
+def edit_distance(ref_tokens: Sequence[Hashable], hyp_tokens: Sequence[Hashable]) -> int:
     """
-    Computes Character Error Rate (CER)
-    CER = (S + D + I) / N
+    Levenshtein distance (S + D + I) between two token sequences.
+
+    The shorter sequence is used as the bit-parallel pattern, so memory is
+    O(min(N, M)) bits and time is O(max(N, M) * min(N, M) / word size).
+    """
+    if len(hyp_tokens) < len(ref_tokens):
+        ref_tokens, hyp_tokens = hyp_tokens, ref_tokens
+    return _bitparallel_distance(_pattern_masks(ref_tokens), len(ref_tokens), hyp_tokens)
+
+
+class Alignment:
+    """
+    Result of aligning a hypothesis against a reference.
+
+    ops is a compact string with one code per aligned position: 'C' (correct),
+    'S' (substitution), 'D' (deletion) or 'I' (insertion). The aligned token
+    pairs are rebuilt from ops on demand, with None on the missing side.
     """
-    ref_chars = list(reference.lower())
-    hyp_chars = list(hypothesis.lower())
+    __slots__ = ("ref", "hyp", "ops", "substitutions", "deletions", "insertions")
+
+    def __init__(self, ref: Sequence[Hashable], hyp: Sequence[Hashable], ops: str):
+        self.ref = ref
+        self.hyp = hyp
+        self.ops = ops
+        self.substitutions = ops.count("S")
+        self.deletions = ops.count("D")
+        self.insertions = ops.count("I")
 
-    dp = [[0] * (len(hyp_chars) + 1) for _ in range(len(ref_chars) + 1)]
+    @property
+    def hits(self) -> int:
+        return self.ops.count("C")
 
-    # Initialize
-    for i in range(len(ref_chars) + 1):
-        dp[i][0] = i
-    for j in range(len(hyp_chars) + 1):
-        dp[0][j] = j
+    @property
+    def distance(self) -> int:
+        return self.substitutions + self.deletions + self.insertions
 
-    # Fill DP matrix
-    for i in range(1, len(ref_chars) + 1):
-        for j in range(1, len(hyp_chars) + 1):
-            if ref_chars[i - 1] == hyp_chars[j - 1]:
-                dp[i][j] = dp[i - 1][j - 1]
+    @property
+    def error_rate(self) -> float:
+        return self.distance / len(self.ref)
+
+    @property
+    def pairs(self) -> List[Tuple[object, object]]:
+        """
+        Aligned (ref_token, hyp_token) pairs, e.g. ('AW', 'AH') or ('R', None).
+        """
+        pairs = []
+        i = j = 0
+        for op in self.ops:
+            if op == "I":
+                pairs.append((None, self.hyp[j]))
+                j += 1
+            elif op == "D":
+                pairs.append((self.ref[i], None))
+                i += 1
             else:
-                substitute = dp[i - 1][j - 1] + 1
-                insert = dp[i][j - 1] + 1
-                delete = dp[i - 1][j] + 1
-                dp[i][j] = min(substitute, insert, delete)
+                pairs.append((self.ref[i], self.hyp[j]))
+                i += 1
+                j += 1
+        return pairs
+
+    def __iter__(self):
+        """
+        Iterates (op, ref_token, hyp_token) triples.
+        """
+        for op, (ref_token, hyp_token) in zip(self.ops, self.pairs):
+            yield op, ref_token, hyp_token
+
+    def __repr__(self):
+        return (f"Alignment(S={self.substitutions}, D={self.deletions}, "
+                f"I={self.insertions}, N={len(self.ref)})")
 
-    cer = dp[len(ref_chars)][len(hyp_chars)] / len(ref_chars)
-    return cer
 
+# Backpointer codes for the alignment DP
+_DIAG, _UP, _LEFT = 0, 1, 2
 
-def compute_per(reference_phonemes: str, hypothesis_phonemes: str) -> float:
+
+def align(ref_tokens: Sequence[Hashable], hyp_tokens: Sequence[Hashable]) -> Alignment:
+    """
+    Minimum-cost alignment of two token sequences.
+
+    Costs are kept in two rows and the traceback in one byte per cell, so the
+    S/D/I counts, ops and aligned pairs come out of a single DP pass. Ties
+    prefer a match/substitution, then a deletion, then an insertion.
+    """
+    n, m = len(ref_tokens), len(hyp_tokens)
+    width = m + 1
+    back = bytearray(b"\x02" * width) + bytearray((n + 1) * width - width)
+    prev = list(range(width))
+
+    for i in range(1, n + 1):
+        row = [i] + [0] * m
+        base = i * width
+        back[base] = _UP
+        ref_token = ref_tokens[i - 1]
+        for j in range(1, width):
+            if ref_token == hyp_tokens[j - 1]:
+                row[j] = prev[j - 1]
+                continue  # back[base + j] is already _DIAG
+            diag = prev[j - 1]
+            up = prev[j]
+            left = row[j - 1]
+            if diag <= up and diag <= left:
+                row[j] = diag + 1
+            elif up <= left:
+                row[j] = up + 1
+                back[base + j] = _UP
+            else:
+                row[j] = left + 1
+                back[base + j] = _LEFT
+        prev = row
+
+    ops = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        step = back[i * width + j]
+        if step == _DIAG:
+            i -= 1
+            j -= 1
+            ops.append("C" if ref_tokens[i] == hyp_tokens[j] else "S")
+        elif step == _UP:
+            i -= 1
+            ops.append("D")
+        else:
+            j -= 1
+            ops.append("I")
+    return Alignment(ref_tokens, hyp_tokens, "".join(reversed(ops)))
+
+
+def confusion_counts(alignments: Iterable[Alignment]) -> Dict[Tuple[object, object], int]:
+    """
+    Counts (ref_token, hyp_token) pairs over many alignments, e.g. per-phoneme
+    confusions. Deletions and insertions use None on the missing side.
+    """
+    counts = {}
+    for alignment in alignments:
+        for pair in alignment.pairs:
+            counts[pair] = counts.get(pair, 0) + 1
+    return counts
+
+
+def _word_tokens(text: str) -> List[str]:
+    return text.lower().split()
+
+
+def _char_tokens(text: str) -> List[str]:
+    return list(text.lower())
+
+
+_TOKENIZERS = {
+    "word": _word_tokens,
+    "char": _char_tokens,
+    "phoneme": _word_tokens,
+}
+
+
+def _score(ref_tokens, hyp_tokens, return_alignment):
+    if return_alignment:
+        alignment = align(ref_tokens, hyp_tokens)
+        return alignment.distance / len(ref_tokens), alignment
+    return edit_distance(ref_tokens, hyp_tokens) / len(ref_tokens)
+
+
+@traced("metrics.wer")
+def compute_wer(reference: str, hypothesis: str, return_alignment: bool = False):
+    """
+    Computes WER = (S + D + I) / N
+
+    With return_alignment=True, returns (wer, Alignment) from the same DP pass.
+    """
+    ref_words = _word_tokens(reference)
+    hyp_words = _word_tokens(hypothesis)
+
+    return _score(ref_words, hyp_words, return_alignment)
+
+
+@traced("metrics.cer")
+def compute_cer(reference, hypothesis, return_alignment: bool = False):
+    """
+    Computes Character Error Rate (CER)
+    CER = (S + D + I) / N
+
+    With return_alignment=True, returns (cer, Alignment) from the same DP pass.
+    """
+    ref_chars = _char_tokens(reference)
+    hyp_chars = _char_tokens(hypothesis)
+
+    return _score(ref_chars, hyp_chars, return_alignment)
+
+
+@traced("metrics.per")
+def compute_per(reference_phonemes: str, hypothesis_phonemes: str, return_alignment: bool = False):
     """
     Computes Phoneme Error Rate (PER) = (S + D + I) / N
     reference_phonemes and hypothesis_phonemes should be space-separated phonemes
+
+    With return_alignment=True, returns (per, Alignment) from the same DP pass.
     """
-    ref_phonemes = reference_phonemes.lower().split()
-    hyp_phonemes = hypothesis_phonemes.lower().split()
-
-    # Initialize DP matrix
-    dp = [[0] * (len(hyp_phonemes) + 1) for _ in range(len(ref_phonemes) + 1)]
-    for i in range(len(ref_phonemes) + 1):
-        dp[i][0] = i
-    for j in range(len(hyp_phonemes) + 1):
-        dp[0][j] = j
-
-    # Fill DP matrix (Levenshtein distance)
-    for i in range(1, len(ref_phonemes) + 1):
-        for j in range(1, len(hyp_phonemes) + 1):
-            if ref_phonemes[i - 1] == hyp_phonemes[j - 1]:
-                dp[i][j] = dp[i - 1][j - 1]
-            else:
-                substitute = dp[i - 1][j - 1] + 1
-                insert = dp[i][j - 1] + 1
-                delete = dp[i - 1][j] + 1
-                dp[i][j] = min(substitute, insert, delete)
+    ref_phonemes = _word_tokens(reference_phonemes)
+    hyp_phonemes = _word_tokens(hypothesis_phonemes)
+
+    return _score(ref_phonemes, hyp_phonemes, return_alignment)
+
+
+def compute_error_rates(pairs: Iterable[Tuple[str, str]], unit: str = "word", return_alignment: bool = False) -> List:
+    """
+    Scores many (reference, hypothesis) pairs in one call.
+
+    Args:
+        pairs: Iterable of (reference, hypothesis) strings
+        unit (str): 'word' (WER), 'char' (CER) or 'phoneme' (PER)
+        return_alignment (bool): Return (rate, Alignment) tuples instead of rates
+
+    Returns:
+        list: One error rate per pair, identical to calling
+        compute_wer / compute_cer / compute_per on each pair.
+
+    The reference bitmasks are built once per distinct reference, so scoring
+    a whole classroom reading the same passage only pays for the hypotheses.
+    """
+    if unit not in _TOKENIZERS:
+        raise ValueError(f"Unknown unit: {unit}")
+    tokenize = _TOKENIZERS[unit]
+
+    with span("metrics.error_rates", unit=unit) as s:
+        if return_alignment:
+            scored = [_score(tokenize(r), tokenize(h), True) for r, h in pairs]
+            s.set(items=len(scored))
+            return scored
 
-    per = dp[len(ref_phonemes)][len(hyp_phonemes)] / len(ref_phonemes)
-    return per
+        pattern_cache = {}
+        rates = []
+        for reference, hypothesis in pairs:
+            cached = pattern_cache.get(reference)
+            if cached is None:
+                ref_tokens = tokenize(reference)
+                cached = (_pattern_masks(ref_tokens), len(ref_tokens))
+                pattern_cache[reference] = cached
+            masks, n = cached
+            rates.append(_bitparallel_distance(masks, n, tokenize(hypothesis)) / n)
+        s.set(items=len(rates))
+        return rates
@@ -0,0 +1,103 @@
+from typing import Hashable, List, Optional, Sequence
+
+# Backpointer codes for the slot alignment DP
+_DIAG, _UP, _LEFT = 0, 1, 2
+
+
+def _align_to_slots(slots: List[List[Optional[Hashable]]], tokens: Sequence[Hashable]) -> str:
+    """
+    Minimum-cost alignment of a token sequence against a slot network, where
+    a token matches a slot for free if any earlier hypothesis put it there.
+
+    Returns:
+        str: Ops over slots and tokens: M (slot and token), D (slot only),
+        I (token only, i.e. a new slot)
+    """
+    n, m = len(slots), len(tokens)
+    width = m + 1
+    back = bytearray(b"\x02" * width) + bytearray((n + 1) * width - width)
+    prev = list(range(width))
+
+    for i in range(1, n + 1):
+        row = [i] + [0] * m
+        base = i * width
+        back[base] = _UP
+        slot = slots[i - 1]
+        for j in range(1, width):
+            diag = prev[j - 1] + (0 if tokens[j - 1] in slot else 1)
+            up = prev[j] + 1
+            left = row[j - 1] + 1
+            if diag <= up and diag <= left:
+                row[j] = diag
+            elif up <= left:
+                row[j] = up
+                back[base + j] = _UP
+            else:
+                row[j] = left
+                back[base + j] = _LEFT
+        prev = row
+
+    ops = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        step = back[i * width + j]
+        if step == _DIAG:
+            i, j = i - 1, j - 1
+            ops.append("M")
+        elif step == _UP:
+            i -= 1
+            ops.append("D")
+        else:
+            j -= 1
+            ops.append("I")
+    return "".join(reversed(ops))
+
+
+def rover(hypotheses: Sequence[Sequence[Hashable]], weights: Sequence[float] = None) -> List[Hashable]:
+    """
+    ROVER-style combination of several token sequences (words or phonemes).
+
+    The hypotheses are aligned one after another into a network of slots,
+    each holding one token (or None for a deletion) per hypothesis; the
+    output keeps the highest-weighted token of every slot and drops slots
+    won by None. Ties go to the earlier hypothesis, so pass the most
+    trusted backend first.
+
+    Args:
+        hypotheses: One token sequence per system
+        weights: Vote weight per system (default: 1 each)
+
+    Returns:
+        list: The voted token sequence
+    """
+    if not hypotheses:
+        return []
+    weights = list(weights) if weights is not None else [1.0] * len(hypotheses)
+    if len(weights) != len(hypotheses):
+        raise ValueError("One weight per hypothesis is required")
+
+    slots = [[token] for token in hypotheses[0]]
+    for count, tokens in enumerate(hypotheses[1:], 1):
+        merged, i, j = [], 0, 0
+        for op in _align_to_slots(slots, tokens):
+            if op == "M":
+                merged.append(slots[i] + [tokens[j]])
+                i, j = i + 1, j + 1
+            elif op == "D":
+                merged.append(slots[i] + [None])
+                i += 1
+            else:
+                merged.append([None] * count + [tokens[j]])
+                j += 1
+        slots = merged
+
+    output = []
+    for slot in slots:
+        votes = {}
+        for token, weight in zip(slot, weights):
+            votes[token] = votes.get(token, 0.0) + weight
+        # max() keeps the first maximum: the earliest hypothesis wins ties
+        winner = max(votes, key=votes.get)
+        if winner is not None:
+            output.append(winner)
+    return output
@@ -0,0 +1,306 @@
+import argparse
+import atexit
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Set to a .jsonl path to record spans from import time on; each process
+# appends its own spans, so pool workers can share one file
+TRACE_ENV = "BAIR_TRACE"
+
+# Numeric span attributes that are summed in summaries
+SUMMED_ATTRIBUTES = ("audio_seconds", "tokens", "items")
+
+_current = contextvars.ContextVar("bair_current_span", default=None)
+_ids = itertools.count(1)
+_tracer = None
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _NullSpan:
+    """
+    Returned by span() while tracing is off: entering, leaving and setting
+    attributes do nothing.
+    """
+    recording = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    recording = True
+
+    def __init__(self, tracer, name: str, attributes: dict):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.id = next(_ids)
+        self.parent = None
+
+    def set(self, **attributes):
+        """
+        Adds attributes, e.g. audio_seconds or tokens once they are known.
+        """
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        parent = _current.get()
+        self.parent = parent.id if parent is not None else None
+        self._token = _current.set(self)
+        self._start_ns = time.time_ns()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        _current.reset(self._token)
+        event = {
+            "name": self.name,
+            "id": self.id,
+            "parent": self.parent,
+            "start_us": self._start_ns // 1000,
+            "wall_seconds": wall,
+            "cpu_seconds": cpu,
+            "peak_rss_mb": _peak_rss_mb(),
+            "pid": os.getpid(),
+            "thread": threading.current_thread().name,
+            "tid": threading.get_ident(),
+            **self.attributes,
+        }
+        if exc_type is not None:
+            event["error"] = exc_type.__name__
+        self.tracer.record(event)
+        return False
+
+
+class Tracer:
+    def __init__(self, path: str = None, max_events: int = 100000):
+        """
+        Collects finished spans: the most recent max_events in memory and,
+        with path, every span appended to a JSON-lines file as it finishes.
+
+        CPU time is process CPU time (all threads, including torch's
+        intra-op threads) while the span was open; peak RSS is the process
+        high-water mark when the span ended.
+        """
+        self.path = path
+        self.events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+
+    def record(self, event: dict):
+        line = json.dumps(event, default=str) + "\n" if self.path else None
+        with self._lock:
+            self.events.append(event)
+            if line is None:
+                return
+            if self._file is None or self._pid != os.getpid():
+                # Reopen after a fork so each process writes whole lines of its own
+                self._file = open(self.path, "a", buffering=1)
+                self._pid = os.getpid()
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None and self._pid == os.getpid():
+                self._file.close()
+            self._file = None
+
+    def summary(self) -> dict:
+        return summarize(list(self.events))
+
+    def write_jsonl(self, path: str):
+        write_jsonl(list(self.events), path)
+
+    def write_chrome_trace(self, path: str):
+        write_chrome_trace(list(self.events), path)
+
+
+def enable(path: str = None, max_events: int = 100000) -> Tracer:
+    """
+    Starts recording spans (replacing any active tracer) and returns the tracer.
+    """
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+    _tracer = Tracer(path, max_events)
+    return _tracer
+
+
+def disable() -> Optional[Tracer]:
+    """
+    Stops recording; returns the tracer that was active, with its events.
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.close()
+    return tracer
+
+
+def is_enabled() -> bool:
+    return _tracer is not None
+
+
+def span(name: str, **attributes):
+    """
+    Context manager timing a block as a named span, nested under the span
+    open in the same thread or asyncio task.
+
+        with span("hubert.inference", audio_seconds=seconds) as s:
+            ...
+            s.set(frames=logits.shape[1])
+
+    While tracing is off this returns a shared no-op object, so leaving
+    spans in hot paths costs one function call and a global lookup.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return Span(tracer, name, attributes)
+
+
+def traced(name: str = None):
+    """
+    Decorator recording every call of a function as a span.
+    """
+    def decorate(function):
+        span_name = name or f"{function.__module__}.{function.__qualname__}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return function(*args, **kwargs)
+            with span(span_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def load_events(path: str) -> List[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_jsonl(events: Iterable[dict], path: str):
+    with open(path, "w") as f:
+        for event in events:
+            f.write(json.dumps(event, default=str) + "\n")
+
+
+def to_chrome_trace(events: Iterable[dict]) -> dict:
+    """
+    Spans as Chrome trace "complete" events, viewable in chrome://tracing or
+    Perfetto: one row per process and thread, attributes under args.
+    """
+    trace_events, threads = [], {}
+    for event in events:
+        threads[(event["pid"], event["tid"])] = event.get("thread")
+        args = {key: value for key, value in event.items()
+                if key not in ("name", "start_us", "wall_seconds", "pid", "tid", "thread")}
+        trace_events.append({
+            "name": event["name"],
+            "cat": event["name"].split(".")[0],
+            "ph": "X",
+            "ts": event["start_us"],
+            "dur": round(event["wall_seconds"] * 1e6),
+            "pid": event["pid"],
+            "tid": event["tid"],
+            "args": args,
+        })
+    for (pid, tid), thread in threads.items():
+        if thread:
+            trace_events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread}})
+    return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+
+def write_chrome_trace(events: Iterable[dict], path: str):
+    with open(path, "w") as f:
+        json.dump(to_chrome_trace(events), f)
+
+
+def summarize(events: Iterable[dict]) -> Dict[str, dict]:
+    """
+    Per span name: count, total and mean wall seconds, total CPU seconds,
+    the largest peak RSS seen and the sums of SUMMED_ATTRIBUTES.
+    """
+    summary = {}
+    for event in events:
+        stats = summary.setdefault(event["name"], {"count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                                                   "peak_rss_mb": None})
+        stats["count"] += 1
+        stats["wall_seconds"] += event["wall_seconds"]
+        stats["cpu_seconds"] += event["cpu_seconds"]
+        if event.get("peak_rss_mb") is not None:
+            stats["peak_rss_mb"] = max(stats["peak_rss_mb"] or 0, event["peak_rss_mb"])
+        for key in SUMMED_ATTRIBUTES:
+            if isinstance(event.get(key), (int, float)):
+                stats[key] = stats.get(key, 0) + event[key]
+        if event.get("error"):
+            stats["errors"] = stats.get("errors", 0) + 1
+    for stats in summary.values():
+        stats["mean_seconds"] = stats["wall_seconds"] / stats["count"]
+    return summary
+
+
+def format_summary(summary: Dict[str, dict]) -> str:
+    lines = [f"{'span':<28} {'count':>6} {'wall s':>9} {'mean ms':>9} {'CPU s':>8} {'peak MB':>8} "
+             f"{'audio s':>8} {'tokens':>8}"]
+    for name, stats in sorted(summary.items(), key=lambda item: -item[1]["wall_seconds"]):
+        peak = stats["peak_rss_mb"]
+        lines.append(f"{name:<28} {stats['count']:>6} {stats['wall_seconds']:>9.3f} "
+                     f"{stats['mean_seconds'] * 1000:>9.2f} {stats['cpu_seconds']:>8.3f} "
+                     f"{peak if peak is not None else float('nan'):>8.0f} {stats.get('audio_seconds', 0):>8.1f} "
+                     f"{stats.get('tokens', 0):>8}")
+    return "\n".join(lines)
+
+
+if os.environ.get(TRACE_ENV):
+    enable(os.environ[TRACE_ENV])
+    atexit.register(disable)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a span trace (BAIR_TRACE) or convert it to a Chrome trace.")
+    parser.add_argument("trace", help="JSON-lines trace file")
+    parser.add_argument("--chrome", default=None, help="Write a Chrome trace (chrome://tracing, Perfetto) here")
+    args = parser.parse_args()
+
+    events = load_events(args.trace)
+    print(format_summary(summarize(events)))
+    if args.chrome:
+        write_chrome_trace(events, args.chrome)
+        print(f"Wrote {len(events)} spans to {args.chrome}")
+
+
+if __name__ == "__main__":
+    main()
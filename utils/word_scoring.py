@@ -0,0 +1,310 @@
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from utils.alignment import EMPTY, LETTER_LEXICON, AlignmentReport, Lexicon, WordAlignment, reference_segments
+from utils.audio import TARGET_SR, load_audio, speech_end
+from utils.metrics import align
+from utils.tracing import span
+
+# (phoneme, start_seconds, end_seconds), as from huper.transcribe_waveform(return_spans=True)
+Span = Tuple[str, float, float]
+
+
+class WordScore(WordAlignment):
+    """
+    One target word scored on its own: the phonemes heard in its stretch of
+    the recording, when they were said, and their alignment to the word's
+    pronunciation.
+    """
+    __slots__ = ("heard", "start", "end")
+
+    def __init__(self, word: str, ref: List[str], heard: Sequence[Span] = ()):
+        super().__init__(word, ref)
+        self.heard = list(heard)
+        self.start = self.heard[0][1] if self.heard else None
+        self.end = self.heard[-1][2] if self.heard else None
+
+    @property
+    def attempted(self) -> bool:
+        return bool(self.heard)
+
+    @property
+    def num_errors(self) -> int:
+        return sum(op != "C" for op, _, _ in self.ops)
+
+    @property
+    def per(self) -> float:
+        return self.num_errors / len(self.ref) if self.ref else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "word": self.word,
+            "ref": " ".join(self.ref),
+            "heard": " ".join(phoneme for phoneme, _, _ in self.heard),
+            "start": self.start,
+            "end": self.end,
+            "per": self.per,
+            "correct": self.correct,
+            "errors": self.errors,
+        }
+
+
+class RecordingScore(AlignmentReport):
+    """
+    Per-word scores of one recording, with the recording's PER and where
+    the time went.
+    """
+
+    def __init__(self, words: List[WordScore], latency: Optional[dict] = None, audio_seconds: float = None,
+                 scored_seconds: float = None):
+        super().__init__(words)
+        self.latency = latency or {}
+        self.audio_seconds = audio_seconds
+        self.scored_seconds = scored_seconds
+
+    @property
+    def per(self) -> float:
+        phonemes = sum(len(word.ref) for word in self.words)
+        return sum(word.num_errors for word in self.words) / phonemes if phonemes else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "per": self.per,
+            "wer": self.wer,
+            "audio_seconds": self.audio_seconds,
+            "scored_seconds": self.scored_seconds,
+            "latency": self.latency,
+            "words": [word.to_dict() for word in self.words],
+        }
+
+
+def split_spans(segments: List[Tuple[str, List[str]]], spans: Sequence[Span]) -> List[List[Span]]:
+    """
+    Splits the decoded phoneme spans of a recording between the target words.
+
+    Heard phonemes are aligned to the reference once to find which word
+    each belongs to. A heard phoneme the reference does not explain (an
+    insertion) between two words goes to whichever neighbour it is closer
+    to in time, so a pause separates words instead of the reading order
+    alone.
+
+    Returns:
+        list[list[Span]]: The spans heard for each segment, in time order
+    """
+    owner = [index for index, (_, phonemes) in enumerate(segments) for _ in phonemes]
+    ref = [phoneme for _, phonemes in segments for phoneme in phonemes]
+    hyp = [phoneme.upper() for phoneme, _, _ in spans]
+    heard = [[] for _ in segments]
+    if not segments:
+        return heard
+
+    previous, pending = None, []  # last owning word; insertions waiting for the next owned phoneme
+
+    def assign(next_word, next_start):
+        for index in pending:
+            _, start, end = spans[index]
+            if previous is None:
+                word = next_word
+            elif next_word is None or previous == next_word:
+                word = previous
+            else:
+                gap_before = start - heard[previous][-1][2]
+                gap_after = next_start - end
+                word = previous if gap_before <= gap_after else next_word
+            heard[word].append(spans[index])
+        pending.clear()
+
+    i = j = 0
+    for op, _, _ in align(ref, hyp):
+        if op == "D":
+            i += 1
+        elif op == "I":
+            pending.append(j)
+            j += 1
+        else:
+            word = owner[i]
+            assign(word, spans[j][1])
+            heard[word].append(spans[j])
+            previous = word
+            i += 1
+            j += 1
+    assign(None if previous is not None else 0, None)
+    return heard
+
+
+def score_word(word: str, ref: List[str], heard: Sequence[Span]) -> WordScore:
+    """
+    Aligns the phonemes heard for one word against its pronunciation.
+    """
+    score = WordScore(word, ref, heard)
+    for op, ref_phoneme, hyp_phoneme in align(ref, [phoneme.upper() for phoneme, _, _ in heard]):
+        score.ops.append((op, ref_phoneme, hyp_phoneme))
+        score.pred.append(hyp_phoneme or EMPTY)
+    return score
+
+
+def score_words(segments: List[Tuple[str, List[str]]], spans: Sequence[Span], workers: int = 1,
+                scorer: Callable[[str, List[str], Sequence[Span]], WordScore] = score_word) -> List[WordScore]:
+    """
+    Scores every target word independently from its own heard spans.
+
+    Args:
+        segments: (word, reference phonemes) in reading order
+        spans: Decoded (phoneme, start, end) spans of the recording
+        workers (int): Threads for scorer, for scorers that wait on I/O or
+            release the GIL (the default edit-distance scorer is fast enough
+            to run inline)
+        scorer: (word, ref, heard) -> WordScore
+
+    Returns:
+        list[WordScore]: One per segment, in reading order
+    """
+    heard = split_spans(segments, spans)
+    with span("scoring.words", items=len(segments)):
+        jobs = [(word, list(phonemes), word_spans) for (word, phonemes), word_spans in zip(segments, heard)]
+        if workers > 1 and len(jobs) > 1:
+            with ThreadPoolExecutor(workers) as pool:
+                return list(pool.map(lambda job: scorer(*job), jobs))
+        return [scorer(*job) for job in jobs]
+
+
+def forced_word_scores(segments: List[Tuple[str, List[str]]], phones, threshold: float = -1.0) -> List[WordScore]:
+    """
+    Per-word verdicts from a forced alignment of the whole reference
+    (models.ctc.AlignedPhone per reference phoneme, or None if it failed).
+
+    A phoneme whose goodness of pronunciation is below threshold counts as a
+    substitution by the phoneme the model preferred over its frames, or as a
+    deletion when no other phoneme was preferred.
+    """
+    if phones is None:
+        return [score_word(word, list(ref), ()) for word, ref in segments]
+
+    scores = []
+    position = 0
+    for word, ref in segments:
+        word_phones = phones[position:position + len(ref)]
+        position += len(ref)
+        ops = []
+        for ref_phoneme, phone in zip(ref, word_phones):
+            if phone.correct(threshold):
+                ops.append(("C", ref_phoneme, ref_phoneme))
+            elif phone.best.upper() != ref_phoneme.upper():
+                ops.append(("S", ref_phoneme, phone.best.upper()))
+            else:
+                ops.append(("D", ref_phoneme, None))
+        heard = [(hyp_phoneme, phone.start, phone.end)
+                 for (_, _, hyp_phoneme), phone in zip(ops, word_phones) if hyp_phoneme]
+        score = WordScore(word, list(ref), heard)
+        score.ops = ops
+        score.pred = [hyp_phoneme or EMPTY for _, _, hyp_phoneme in ops]
+        scores.append(score)
+    return scores
+
+
+def score_recording(audio_path: str, task: str, vocab_set: str, ground_truth: str, lexicon: Lexicon = None,
+                    max_silence: Optional[float] = 3.0, beam_width: int = None, constrain: bool = False,
+                    workers: int = 1, forced: bool = False, gop_threshold: float = -1.0) -> RecordingScore:
+    """
+    Scores a recording word by word against the word or letter bank.
+
+    The audio is decoded once and cut at the first silence longer than
+    max_silence seconds (the reader stopped), so trailing silence is never
+    run through the model. HuPER's CTC frame spans then place each heard
+    phoneme in time, the spans are split between the target words and every
+    word is scored on its own phonemes. Words after the cut, or never heard,
+    score as deletions.
+
+    With forced, the reference phonemes are instead force-aligned to HuPER's
+    output and each is judged by its goodness of pronunciation
+    (forced_word_scores), with no free recognition at all.
+
+    Args:
+        audio_path (str): Recording
+        task (str): 'word' or 'letter'
+        vocab_set (str): Word or letter bank
+        ground_truth (str): Reference, as bank entries or phonemes
+        lexicon (dict): {word: pronunciation(s)}; LETTER_LEXICON by default
+            for the letter task, required for the word task
+        max_silence (float): Stop at a pause this long (None: score the whole clip)
+        beam_width (int): Decode with a bank-biased CTC beam search instead of greedy
+        constrain (bool): With beam_width, only output phonemes of bank words
+        workers (int): Threads for per-word scoring
+        forced (bool): Score by forced alignment instead of recognition
+        gop_threshold (float): With forced, lowest goodness of pronunciation
+            still counted as correct
+
+    Returns:
+        RecordingScore: Per-word PER and timing, recording PER and latency
+            in seconds (load, transcribe, scoring, total)
+    """
+    from models.huper import align_waveforms, transcribe_waveform
+
+    start = time.perf_counter()
+    segments = reference_segments(task, vocab_set, ground_truth, lexicon)
+    if task == "letter":
+        lexicon = lexicon or LETTER_LEXICON
+
+    waveform = load_audio(audio_path)
+    audio_seconds = len(waveform) / TARGET_SR
+    if max_silence is not None:
+        waveform = waveform[:speech_end(waveform, max_silence)]
+    loaded = time.perf_counter()
+
+    if forced:
+        reference = [phoneme for _, phonemes in segments for phoneme in phonemes]
+        phones = align_waveforms([waveform], [reference])[0]
+    else:
+        _, spans = transcribe_waveform(waveform, return_spans=True, beam_width=beam_width,
+                                       vocab_set=vocab_set if beam_width else None, lexicon=lexicon,
+                                       constrain=constrain)
+    transcribed = time.perf_counter()
+
+    words = forced_word_scores(segments, phones, gop_threshold) if forced else score_words(segments, spans, workers)
+    done = time.perf_counter()
+    latency = {"load": loaded - start, "transcribe": transcribed - loaded, "scoring": done - transcribed,
+               "total": done - start}
+    return RecordingScore(words, latency, audio_seconds, len(waveform) / TARGET_SR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a recording word by word from HuPER's CTC output.")
+    parser.add_argument("--audio", required=True)
+    parser.add_argument("--task", choices=["word", "letter"], required=True)
+    parser.add_argument("--vocab-set", required=True)
+    parser.add_argument("--ground-truth", required=True, help="Reference as bank entries or phonemes")
+    parser.add_argument("--lexicon", default=None, help="JSON file {word: pronunciation(s)} (word task)")
+    parser.add_argument("--max-silence", type=float, default=3.0, help="Stop at a pause this long (0: never)")
+    parser.add_argument("--beam-width", type=int, default=None)
+    parser.add_argument("--forced", action="store_true",
+                        help="Force-align the reference and judge each phoneme by goodness of pronunciation")
+    parser.add_argument("--gop-threshold", type=float, default=-1.0, help="With --forced, lowest GOP counted correct")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    lexicon = None
+    if args.lexicon:
+        with open(args.lexicon) as f:
+            lexicon = json.load(f)
+    report = score_recording(args.audio, args.task, args.vocab_set, args.ground_truth, lexicon,
+                             args.max_silence or None, args.beam_width, forced=args.forced,
+                             gop_threshold=args.gop_threshold)
+    if args.json:
+        print(json.dumps(report.to_dict(), indent=2))
+        return
+
+    print(f"{'word':<10} {'time (s)':>13} {'PER':>6}  heard / errors")
+    for word in report.words:
+        when = f"{word.start:5.2f}-{word.end:5.2f}" if word.attempted else "not heard"
+        heard = " ".join(phoneme for phoneme, _, _ in word.heard) or EMPTY
+        print(f"{word.word:<10} {when:>13} {word.per:>6.2f}  {heard} / {word.error_type}")
+    latency = ", ".join(f"{name} {seconds:.3f} s" for name, seconds in report.latency.items())
+    print(f"\nPER {report.per:.3f}, words wrong {report.num_incorrect}/{report.total}; "
+          f"scored {report.scored_seconds:.1f} of {report.audio_seconds:.1f} s; {latency}")
+
+
+if __name__ == "__main__":
+    main()